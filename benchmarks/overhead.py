@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the time and memory the runner adds on top of the commands it runs.
+
+Every scenario is a synthetic friggfile, from 1 to 1000 trivial tasks and tasks printing a lot of
+output. For each one the benchmark times loading the friggfile, running the tasks through
+Runner.run_tasks and formatting the summary, and compares the task runtime with spawning the same
+commands with frigg_runner.process.execute alone. The difference, divided by the number of tasks,
+is the overhead of the runner per task: scheduling, timings, output handling and bookkeeping.
+Peak memory is the largest amount of memory allocated by python while the tasks run, measured in
+a second run because tracing allocations slows the runner down.
+
+    PYTHONPATH=. python benchmarks/overhead.py [--jobs N] [--max-overhead MS]
+
+With --max-overhead the benchmark exits with 1 when the overhead per task of a scenario is above
+the limit, so it can guard the hot path in a build.
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from frigg_runner.process import execute
+from frigg_runner.runner import Runner
+from frigg_runner.tasks import parse_tasks
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+# Name, number of tasks and the command of every task
+SCENARIOS = [
+    ('1 task', 1, 'true'),
+    ('10 tasks', 10, 'true'),
+    ('100 tasks', 100, 'true'),
+    ('1000 tasks', 1000, 'true'),
+    ('large output', 10, 'seq 1 500000'),
+]
+
+# Minimum number of commands spawned for the baseline of a scenario
+BASELINE_RUNS = 20
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Hide everything the runner prints
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = sys.stderr = devnull
+        try:
+            yield
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+
+def write_friggfile(directory, count, command):
+    with open(os.path.join(directory, '.frigg.yml'), 'w') as file:
+        file.write('tasks:\n')
+        for index in range(count):
+            file.write('  - name: task-%s\n    command: "%s"\n' % (index, command))
+
+
+def measure_baseline(command, directory, count):
+    """
+    Mean time of spawning a command without the runner
+    """
+    runs = max(count, BASELINE_RUNS)
+    start = time.time()
+    for _ in range(runs):
+        execute(command, hide=True, cwd=directory).output.discard()
+    return (time.time() - start) / runs
+
+
+def measure_scenario(count, command, jobs, trace_memory=False):
+    """
+    Run the tasks of a scenario in a new project directory
+
+    :param count: Number of tasks
+    :param command: Command of every task
+    :param jobs: Number of concurrent tasks
+    :param trace_memory: Measure the peak memory instead of the runtimes
+    :return: Dictionary of the runtimes in seconds, or of the peak memory in bytes
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        write_friggfile(directory, count, command)
+        with quiet():
+            start = time.time()
+            runner = Runner(path=directory, jobs=jobs)
+            load_time = time.time() - start
+
+            tasks = parse_tasks(runner.config['tasks'])
+            if trace_memory:
+                tracemalloc.start()
+                try:
+                    runner.run_tasks(tasks, None, jobs=jobs, fail_fast=False)
+                    return {'memory': tracemalloc.get_traced_memory()[1]}
+                finally:
+                    tracemalloc.stop()
+                    runner.timings.close()
+
+            start = time.time()
+            task_results = runner.run_tasks(tasks, None, jobs=jobs, fail_fast=False)
+            run_time = time.time() - start
+
+            start = time.time()
+            runner.summarize(task_results, [])
+            summary_time = time.time() - start
+            runner.timings.close()
+
+        baseline = measure_baseline(command, directory, count)
+        return {
+            'load': load_time,
+            'run': run_time,
+            'summary': summary_time,
+            # Tasks running concurrently share the wall time of the spawns
+            'overhead': (run_time - baseline * count / float(jobs)) / count,
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the overhead of the runner.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of concurrent tasks.')
+    parser.add_argument('--max-overhead', type=float, default=None,
+                        help='Fail when the overhead per task is above this many milliseconds.')
+    arguments = parser.parse_args()
+
+    # Import what the first task needs up front, the startup time is measured by startup.py
+    measure_baseline('true', tempfile.gettempdir(), 1)
+
+    print('%s jobs' % arguments.jobs)
+    print('%-14s %9s %10s %10s %14s %10s' % ('scenario', 'load', 'run', 'summary',
+                                             'overhead/task', 'peak mem'))
+    success = True
+    for name, count, command in SCENARIOS:
+        result = measure_scenario(count, command, arguments.jobs)
+        memory = 'n/a'
+        if tracemalloc:
+            memory = measure_scenario(count, command, arguments.jobs, trace_memory=True)['memory']
+            memory = '%.2fMB' % (memory / 1024.0 / 1024)
+        print('%-14s %7.2fms %8.2fms %8.2fms %12.2fms %10s' % (
+            name, result['load'] * 1000, result['run'] * 1000, result['summary'] * 1000,
+            result['overhead'] * 1000, memory))
+        if arguments.max_overhead is not None and \
+                result['overhead'] * 1000 > arguments.max_overhead:
+            success = False
+
+    if not success:
+        print('The overhead per task is above %sms' % arguments.max_overhead)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the overhead of spawning a task.
+
+Compares the old way of running tasks, `cd <directory> && <command>` in bash attached to a
+pseudo-terminal, with frigg_runner.process.execute, which spawns simple commands directly in the
+working directory and only allocates a pty for tasks with visible output.
+
+    PYTHONPATH=. python benchmarks/spawn.py [number of tasks]
+"""
+import sys
+import tempfile
+import time
+
+from frigg_runner.process import SHELL, execute
+
+
+def legacy(command, directory):
+    return execute('cd %s && %s' % (directory, command), hide=True, pty=True)
+
+
+def direct(command, directory):
+    return execute(command, hide=True, pty=False, cwd=directory)
+
+
+def measure(function, command, directory, count):
+    start = time.time()
+    for _ in range(count):
+        result = function(command, directory)
+        result.output.discard()
+    return (time.time() - start) / count
+
+
+def main(count):
+    directory = tempfile.gettempdir()
+    print('Shell: %s, %s tasks per measurement' % (SHELL, count))
+    for command in ['true', 'echo "Hello"']:
+        legacy_time = measure(legacy, command, directory, count)
+        direct_time = measure(direct, command, directory, count)
+        print('%-16s cd && pty: %6.2fms   direct: %6.2fms   %4.1fx faster' % (
+            command, legacy_time * 1000, direct_time * 1000, legacy_time / direct_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the startup time of the runner.
+
+Times importing the command line module, an early exit on a missing working directory and a
+build of a friggfile with a single task, each in a new interpreter. The interpreters run in a
+temporary project directory and import frigg_runner from this checkout.
+
+    PYTHONPATH=. python benchmarks/startup.py [number of runs]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# The checkout containing frigg_runner
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(arguments, count, directory, exit_code=0):
+    """
+    Mean time of running python with the arguments
+
+    :raises RuntimeError: A run did not exit with the expected exit code, it did not measure what
+                          it should
+    """
+    # A relative PYTHONPATH would be resolved in the project directory
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [ROOT] + [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]))
+    start = time.time()
+    for _ in range(count):
+        process = subprocess.Popen([sys.executable] + arguments, cwd=directory, env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        if process.returncode != exit_code:
+            raise RuntimeError('%s exited with %s:\n%s' % (
+                ' '.join(arguments), process.returncode, output.decode('utf8', 'replace')))
+    return (time.time() - start) / count
+
+
+def main(count):
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, '.frigg.yml'), 'w') as file:
+            file.write('tasks:\n  - "true"\n')
+
+        print('%s runs per measurement' % count)
+        for name, arguments, exit_code in [
+            ('import', ['-c', 'import frigg_runner.cli'], 0),
+            ('missing path', ['-m', 'frigg_runner.cli', '--path', os.path.join(directory, 'x')],
+             1),
+            ('single task', ['-m', 'frigg_runner.cli'], 0),
+        ]:
+            print('%-14s %7.2fms' % (name, measure(arguments, count, directory, exit_code) * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
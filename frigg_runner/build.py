@@ -0,0 +1,60 @@
+# -*- coding: utf8 -*-
+from collections import namedtuple
+
+from .report import build_report
+
+# Types of the events of a running build
+TASK_STARTED = 'started'
+TASK_FINISHED = 'finished'
+
+# Event of a running build. task is the task name, result is the task result of finished tasks
+# and None for started tasks.
+Event = namedtuple('Event', ['type', 'task', 'result'])
+
+
+class BuildError(Exception):
+    """
+    The build can not run, like when the working directory is missing or the friggfile is invalid
+    """
+
+
+class BuildResult(object):
+    """
+    Results of a build run from python
+    """
+
+    def __init__(self, task_results, setup_task_results, coverage=None, wall_time=None,
+                 shard=None):
+        """
+        :param task_results: Results of the tasks, in friggfile order
+        :param setup_task_results: Results of the setup tasks
+        :param coverage: The coverage in percent, None if the friggfile has no coverage settings
+        :param wall_time: Seconds from the start to the end of the build
+        :param shard: Tuple of the shard index and the number of shards of a sharded build
+        """
+        self.task_results = task_results
+        self.setup_task_results = setup_task_results
+        self.coverage = coverage
+        self.wall_time = wall_time
+        self.shard = shard
+
+    def __repr__(self):
+        return '<BuildResult: %s>' % ('success' if self.success else 'fail')
+
+    @property
+    def failures(self):
+        """
+        Failed tasks, tasks skipped because of a failed dependency included
+        """
+        return [task_result for task_result in self.task_results if task_result.failed]
+
+    @property
+    def success(self):
+        return not self.failures
+
+    def report(self):
+        """
+        :return: (dict) The build report, like the one written by --report
+        """
+        return build_report(self.task_results, self.setup_task_results, coverage=self.coverage,
+                            wall_time=self.wall_time, shard=self.shard)
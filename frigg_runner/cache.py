@@ -0,0 +1,219 @@
+# -*- coding: utf8 -*-
+import hashlib
+import json
+import os
+import tempfile
+
+from . import __version__
+from .utils import CACHE_DIRECTORY, IGNORED_DIRECTORIES, FileSystemWrapper, find_files
+
+
+def hash_file(path):
+    """
+    Hash the contents of a file without reading it into memory at once
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    On-disk cache of successful task results.
+
+    Only tasks declaring inputs are cached. The cache key is a hash of the command, the contents
+    of every file matching the input globs outside of IGNORED_DIRECTORIES and the values of the
+    environment variables listed in the env setting of the task:
+
+        tasks:
+          - command: flake8
+            inputs:
+              - '*.py'
+              - setup.cfg
+            env:
+              - PYTHONPATH
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: The project directory, the cache is stored inside it
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, CACHE_DIRECTORY, 'results')
+
+    def key(self, task, env=None, environment=None):
+        """
+        Compute the cache key of a task
+
+        :param task: The task
+        :param env: Environment variables set for the task by the runner
+        :param environment: (dict) The environment the task runs in, defaults to os.environ
+        :return: The key as a hex string, None if the task can not be cached
+        """
+        if not task.inputs:
+            return None
+
+        digest = hashlib.sha1()
+        digest.update(task.command.encode('utf8'))
+        for path in find_files(self.directory, task.inputs, exclude=IGNORED_DIRECTORIES):
+            digest.update(('\0%s\0%s' % (path, hash_file(os.path.join(self.directory, path))))
+                          .encode('utf8'))
+        environment = dict(os.environ if environment is None else environment, **(env or {}))
+        for name in sorted(set(task.env).union(env or {})):
+            digest.update(('\0%s=%s' % (name, environment.get(name, ''))).encode('utf8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Load a cached result
+
+        :param key: Key from ResultCache.key
+        :return: (Result) The stored result with a cached_time attribute, None on a cache miss
+        """
+        try:
+            with open(os.path.join(self.path, '%s.json' % key), 'r') as file:
+                data = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        from invoke.runner import Result
+        result = Result(data['stdout'], data['stderr'], data['exited'], data['pty'])
+        result.cached_time = data['time']
+        return result
+
+    def set(self, key, result, time):
+        """
+        Store a result, the file is written atomically so concurrent builds never read a partial
+        cache entry. Nothing is stored when the cache can not be written.
+
+        :param key: Key from ResultCache.key
+        :param result: (Result) The task result
+        :param time: The runtime of the task in seconds
+        """
+        data = {
+            'stdout': result.stdout,
+            'stderr': result.stderr,
+            'exited': result.exited,
+            'pty': result.pty,
+            'time': time,
+        }
+        # The cache is an optimization, a project directory that can not be written to is built
+        # without it
+        temporary_path = None
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.path)
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(data, file)
+            os.rename(temporary_path, os.path.join(self.path, '%s.json' % key))
+        except (IOError, OSError):
+            if temporary_path and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+
+class RecordingFileSystemWrapper(FileSystemWrapper):
+    """
+    FileSystemWrapper remembering every file and directory frigg_settings looked at, with what
+    it found there. These are the dependencies of the settings in the SettingsCache.
+    """
+
+    def __init__(self):
+        self.dependencies = []
+
+    def list_files(self, path):
+        files = super(RecordingFileSystemWrapper, self).list_files(path)
+        self.dependencies.append(['list', path, sorted(files)])
+        return files
+
+    def read_file(self, path):
+        content = super(RecordingFileSystemWrapper, self).read_file(path)
+        self.dependencies.append(['read', path, hash_file(path)])
+        return content
+
+    def file_exist(self, path):
+        exists = super(RecordingFileSystemWrapper, self).file_exist(path)
+        self.dependencies.append(['exists', path, exists])
+        return exists
+
+
+def check_dependency(kind, path):
+    """
+    Look at a dependency of the settings again
+
+    :return: What RecordingFileSystemWrapper would record for it now
+    """
+    if kind == 'list':
+        return sorted(FileSystemWrapper().list_files(path))
+    if kind == 'read':
+        return hash_file(path) if os.path.isfile(path) else None
+    return FileSystemWrapper().file_exist(path)
+
+
+class SettingsCache(object):
+    """
+    On-disk cache of the settings built from the friggfile. Next to the friggfile, frigg_settings
+    reads tox.ini and looks at the files of the project to detect tasks. Every file it looked at
+    is stored with the settings, the cached settings are used as long as the content of the files
+    it read and the files it found are unchanged.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: The project directory, the cache is stored inside it
+        """
+        self.path = os.path.join(directory, CACHE_DIRECTORY, 'settings.json')
+
+    def get(self):
+        """
+        :return: (dict) The cached settings, None if there are none or they are outdated
+        """
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if data.get('version') != __version__:
+            return None
+        for kind, path, value in data['dependencies']:
+            if check_dependency(kind, path) != value:
+                return None
+        return data['settings']
+
+    def set(self, dependencies, settings):
+        """
+        Store settings, unless they do not survive a round trip through JSON or the cache can
+        not be written
+
+        :param dependencies: Dependencies from RecordingFileSystemWrapper
+        :param settings: The settings
+        """
+        # Settings built without looking at any file can not be checked later
+        if not dependencies:
+            return
+        try:
+            data = json.dumps({'version': __version__, 'dependencies': dependencies,
+                               'settings': settings})
+        except (TypeError, ValueError):
+            return
+        # Like mappings with numbers as keys, which come back with strings as keys
+        if json.loads(data)['settings'] != settings:
+            return
+
+        # The cache is an optimization, a project directory that can not be written to is built
+        # without it
+        directory = os.path.dirname(self.path)
+        temporary_path = None
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            descriptor, temporary_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(descriptor, 'w') as file:
+                file.write(data)
+            os.rename(temporary_path, self.path)
+        except (IOError, OSError):
+            if temporary_path and os.path.exists(temporary_path):
+                os.remove(temporary_path)
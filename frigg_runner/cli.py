@@ -1,8 +1,42 @@
 # -*- coding: utf-8 -*-
+import os
 
 import click
 
-from frigg_runner.runner import Runner
+from frigg_runner import __name__ as package_name
+from frigg_runner import __version__
+from frigg_runner.coverage import coverage_parsers, parse_coverage_file
+from frigg_runner.report import merge_reports, read_report, write_report
+from frigg_runner.runner import COVERAGE_ERRORS, Runner
+from frigg_runner.utils import exit_build, newline
+
+
+def parse_shard(ctx, param, value):
+    """
+    Parse a shard given as index/count, like 2/4
+    """
+    if value is None:
+        return None
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise click.BadParameter('The shard must be given as index/count, like 2/4')
+    if not 1 <= index <= count:
+        raise click.BadParameter('The shard index must be between 1 and %s' % count)
+    return index, count
+
+
+def check_log_compression(ctx, param, value):
+    """
+    zstd compression needs the optional zstandard package
+    """
+    if value == 'zstd':
+        try:
+            import zstandard  # noqa
+        except ImportError:
+            raise click.BadParameter('zstd compression needs the zstandard package, '
+                                     'pip install frigg-runner[zstd]')
+    return value
 
 
 @click.command()
@@ -13,9 +47,205 @@ from frigg_runner.runner import Runner
                                                  'friggfile lives.')
 @click.option('-s', '--setup', is_flag=True, default=False, help='Run tasks from setup_tasks '
                                                                  'list before the main tasks.')
-def main(**kwargs):
+@click.option('-j', '--jobs', default=1, type=click.IntRange(1), help='Number of tasks to run '
+                                                                      'concurrently.')
+@click.option('-c', '--cache', is_flag=True, default=False, help='Reuse results of tasks whose '
+                                                                 'inputs did not change.')
+@click.option('-r', '--report', default=None, type=click.Path(dir_okay=False, writable=True),
+              help='Write a build report to this path, as JUnit XML if the path ends with .xml '
+                   'and JSON otherwise.')
+@click.option('-w', '--watch', is_flag=True, default=False, help='Keep running and rerun the '
+                                                                 'tasks affected by changed '
+                                                                 'files.')
+@click.option('--shard', default=None, callback=parse_shard, metavar='INDEX/COUNT',
+              help='Run one of COUNT parts of the tasks, balanced by task durations.')
+@click.option('--durations', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='JSON build report with the task durations balancing the shards.')
+@click.option('--changed-since', default=None, metavar='REF',
+              help='Only run the tasks affected by the files changed since this git revision.')
+@click.option('--log-dir', default=None, type=click.Path(file_okay=False, writable=True),
+              help='Write the output of every task to its own file in this directory.')
+@click.option('--log-compression', default=None, type=click.Choice(['gzip', 'zstd']),
+              callback=check_log_compression, help='Compress the log files.')
+@click.option('--settings-cache/--no-settings-cache', default=True,
+              help='Reuse the settings of an unchanged friggfile.')
+@click.option('--daemon', is_flag=True, default=False, help='Run the build in the daemon started '
+                                                            'by frigg-daemon.')
+def main(daemon, **kwargs):
+    if daemon:
+        return run_in_daemon(**kwargs)
     Runner(**kwargs).run()
 
 
+def run_in_daemon(path, report, **kwargs):
+    """
+    Send the build to the daemon and print its progress and results. Without a daemon the build
+    runs in this process.
+    """
+    from frigg_runner.daemon import (BUILD_OPTIONS, DaemonError, connect, request_build,
+                                     socket_path)
+
+    unsupported = [name for name in ('verbose', 'watch', 'shard', 'durations', 'changed_since')
+                   if kwargs[name]]
+    if unsupported:
+        raise click.UsageError('--daemon can not be combined with %s' %
+                               ', '.join('--%s' % name.replace('_', '-') for name in unsupported))
+
+    try:
+        connection = connect(socket_path())
+    except DaemonError as exception:
+        click.secho(str(exception), fg='red')
+        return exit_build(False)
+    if connection is None:
+        click.secho('No daemon running on %s, running the build here' % socket_path(),
+                    fg='yellow')
+        return Runner(path=path, report=report, **kwargs).run()
+
+    directory = os.path.abspath(path or os.getcwd())
+    click.secho('%s %s' % (package_name, __version__), fg='blue', bold=True)
+    click.echo('Path: %s' % click.format_filename(directory))
+    click.echo('Daemon: %s' % socket_path())
+    newline()
+
+    options = dict((name, kwargs[name]) for name in BUILD_OPTIONS if name in kwargs)
+    options['environment'] = dict(os.environ)
+    build_report = None
+    for message in request_build(connection, directory, **options):
+        if message['type'] == 'finished':
+            put_task_entry(message['result'])
+        elif message['type'] == 'result':
+            build_report = message['report']
+        elif message['type'] == 'error':
+            click.secho(message['message'], fg='red')
+            exit_build(False)
+    newline()
+
+    if build_report is None:
+        click.secho('The daemon stopped before the build was done', fg='red')
+        exit_build(False)
+
+    failures = [task for task in build_report['tasks'] if task['status'] == 'failure']
+    if failures:
+        click.secho('Failures', fg='red')
+        for task in failures:
+            put_task_entry(task)
+            click.echo(task['output'])
+            if task['log']:
+                click.secho('The output is in %s' % task['log'], fg='yellow')
+        newline()
+
+    click.secho('Total runtime: %ss' % round(build_report['total_time'], ndigits=2), fg='blue')
+    if build_report['coverage'] is not None:
+        click.secho('Coverage %s%s' % (round(build_report['coverage'], ndigits=2), '%'),
+                    fg='blue')
+    if report:
+        write_report(report, build_report)
+        click.secho('Report written to %s' % click.format_filename(report), fg='blue')
+
+    exit_build(build_report['success'])
+
+
+def put_task_entry(task):
+    """
+    Print a task of a build report
+    """
+    color = {'success': 'green', 'failure': 'red', 'skipped': 'yellow'}[task['status']]
+    click.secho('  # %s (%s%s) %s' % (task['name'], round(task['time'], ndigits=2), 's',
+                                      '(setup task)' if task['setup'] else ''), fg=color)
+
+
+@click.command()
+def daemon():
+    """
+    Keep running and run the builds requested with frigg --daemon. The socket is
+    FRIGG_DAEMON_SOCKET, or a socket of the current user in XDG_RUNTIME_DIR or in a private
+    directory in the temporary directory.
+    """
+    from frigg_runner.daemon import DaemonError, DaemonServer, is_running, socket_path, warm_up
+
+    try:
+        path = socket_path()
+        if is_running(path):
+            click.secho('A daemon is already running on %s' % path, fg='red')
+            exit_build(False)
+        warm_up()
+        server = DaemonServer(path)
+    except DaemonError as exception:
+        click.secho(str(exception), fg='red')
+        return exit_build(False)
+    click.secho('Waiting for builds on %s, press Ctrl+C to stop' % path, fg='blue')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        newline()
+    finally:
+        server.server_close()
+
+
+@click.command()
+@click.argument('reports', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('-r', '--report', default=None, type=click.Path(dir_okay=False, writable=True),
+              help='Write the merged report to this path, as JUnit XML if the path ends with '
+                   '.xml and JSON otherwise.')
+@click.option('--coverage', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='Coverage report of the whole build.')
+@click.option('--parser', default=None, help='Parser of the coverage report, like python.')
+def merge(reports, report, coverage, parser):
+    """
+    Combine the JSON reports of the shards of a build into one build result.
+    """
+    if coverage and not parser:
+        raise click.UsageError('--coverage needs the --parser of the coverage report')
+    if parser and parser not in coverage_parsers():
+        raise click.BadParameter('Unknown parser %s, use one of %s' % (
+            parser, ', '.join(coverage_parsers())), param_hint='--parser')
+
+    reports = [read_report(path) for path in reports]
+
+    coverage_percent = None
+    if coverage:
+        try:
+            coverage_percent = parse_coverage_file(coverage, parser).total
+        except COVERAGE_ERRORS as exception:
+            click.secho('Unable to parse the coverage report: %s' % str(exception), fg='red')
+            exit_build(False)
+
+    merged = merge_reports(reports, coverage=coverage_percent)
+
+    click.secho('Shards', fg='blue')
+    for shard in merged['shards']:
+        click.secho('  # %s/%s %s (%s%s) %s' % (shard.get('index', 1), shard.get('count', 1),
+                                                shard['host'],
+                                                round(shard['wall_time'] or 0, ndigits=2), 's',
+                                                'success' if shard['success'] else 'fail'),
+                    fg='green' if shard['success'] else 'red')
+    newline()
+
+    # Every shard of the build has to be merged, missing shards fail the build
+    counts = set(shard['count'] for shard in merged['shards'] if 'count' in shard)
+    indexes = set(shard['index'] for shard in merged['shards'] if 'index' in shard)
+    missing = [index for count in counts for index in range(1, count + 1) if index not in indexes]
+    if len(counts) > 1:
+        click.secho('The reports are from builds with different shard counts', fg='red')
+        merged['success'] = False
+    elif missing:
+        click.secho('Missing shards: %s' % ', '.join(str(index) for index in missing), fg='red')
+        merged['success'] = False
+
+    click.secho('Result', fg='blue')
+    for task in merged['tasks']:
+        put_task_entry(task)
+    newline()
+
+    click.secho('Total runtime: %ss' % round(merged['total_time'], ndigits=2), fg='blue')
+    if coverage_percent is not None:
+        click.secho('Coverage %s%s' % (round(coverage_percent, ndigits=2), '%'), fg='blue')
+    if report:
+        write_report(report, merged)
+        click.secho('Report written to %s' % click.format_filename(report), fg='blue')
+
+    exit_build(merged['success'])
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,102 @@
+# -*- coding: utf8 -*-
+from collections import namedtuple
+
+# Total coverage and the coverage of every package, both in percent. packages is a list of
+# (name, coverage) tuples in report order, None when the breakdown was not requested.
+Coverage = namedtuple('Coverage', ['total', 'packages'])
+
+
+def percent(covered, total):
+    return round(float(covered) / float(total) * 100, 2) if total else 0.0
+
+
+def parse_cobertura(path, packages=False):
+    """
+    Read a Cobertura report, like the ones from coverage.py, one element at a time. The total
+    line rate is an attribute of the root element, without the package breakdown the rest of the
+    document is never read.
+    """
+    import xml.etree.ElementTree as ET
+
+    with open(path, 'rb') as file:
+        if not packages:
+            for _, element in ET.iterparse(file, events=('start',)):
+                return Coverage(float(element.get('line-rate')) * 100, None)
+
+        total = None
+        breakdown = []
+        for _, element in ET.iterparse(file):
+            if element.tag == 'package':
+                breakdown.append((element.get('name'), float(element.get('line-rate')) * 100))
+            elif element.tag == 'coverage':
+                total = float(element.get('line-rate')) * 100
+            # Drop the parsed subtree, only the elements on the current path stay in memory
+            element.clear()
+
+    return Coverage(total, breakdown)
+
+
+def parse_clover(path, packages=False):
+    """
+    Read a Clover report one element at a time. The totals are the metrics element of the
+    project, package metrics are the metrics elements directly inside package elements.
+    """
+    import xml.etree.ElementTree as ET
+
+    total = None
+    breakdown = []
+    stack = []
+    with open(path, 'rb') as file:
+        for event, element in ET.iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if element.tag == 'metrics' and parent is not None:
+                coverage = percent(element.get('coveredstatements'), element.get('statements'))
+                if parent.tag == 'project':
+                    total = coverage
+                elif parent.tag == 'package' and packages:
+                    breakdown.append((parent.get('name'), coverage))
+            element.clear()
+
+    return Coverage(total, breakdown if packages else None)
+
+
+# Parsers reading the report incrementally, the others are handled by frigg_coverage
+STREAMING_PARSERS = {
+    'python': parse_cobertura,
+    'cobertura': parse_cobertura,
+    'clover': parse_clover,
+}
+
+
+def coverage_parsers():
+    """
+    :return: Sorted list of the names of the parsers of coverage reports
+    """
+    from frigg_coverage import PARSERS
+    return sorted(set(STREAMING_PARSERS).union(PARSERS))
+
+
+def parse_coverage_file(path, parser, packages=False):
+    """
+    Compute the coverage of a report without loading the whole document in memory. Parsers
+    without a streaming implementation read the file with frigg_coverage.
+
+    :param path: The coverage report
+    :param parser: Name of the parser, like python or clover
+    :param packages: Also compute the coverage of every package, streaming parsers only
+    :return: (Coverage) The coverage
+    :raises ValueError: The parser is unknown
+    """
+    if parser in STREAMING_PARSERS:
+        return STREAMING_PARSERS[parser](path, packages=packages)
+
+    import frigg_coverage
+    if parser not in frigg_coverage.PARSERS:
+        raise ValueError('Unknown coverage parser: %s' % parser)
+    with open(path, 'r') as file:
+        return Coverage(frigg_coverage.parse_coverage(file.read(), parser), None)
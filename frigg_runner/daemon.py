@@ -0,0 +1,230 @@
+# -*- coding: utf8 -*-
+import errno
+import json
+import os
+import socket
+import stat
+import tempfile
+
+from .build import TASK_FINISHED, BuildError
+from .cache import SettingsCache
+from .report import task_entry
+from .runner import SETTINGS_FILES, Build, build_settings
+
+try:
+    import socketserver
+except ImportError:  # pragma: no cover
+    import SocketServer as socketserver
+
+# Options of a build request, see Build. The environment of the client is sent along, so the
+# tasks run with its PATH and virtualenv and not with the ones of the daemon.
+BUILD_OPTIONS = ['setup', 'jobs', 'failfast', 'cache', 'log_dir', 'log_compression',
+                 'environment']
+
+# Modules imported by the daemon before it accepts builds, so no build pays for them
+WARM_MODULES = ['frigg_settings', 'invoke.runner', 'multiprocessing.pool', 'sqlite3',
+                'xml.etree.ElementTree', 'yaml']
+
+
+class DaemonError(Exception):
+    """
+    The socket of the daemon can not be trusted, like when it belongs to another user
+    """
+
+
+def socket_path():
+    """
+    Path of the socket of the daemon, FRIGG_DAEMON_SOCKET or a socket in the runtime directory of
+    the current user. Without a runtime directory the socket is in a directory of the current user
+    in the temporary directory, only the user can access it.
+
+    :raises DaemonError: The directory in the temporary directory belongs to another user or is
+                         accessible by others
+    """
+    if os.environ.get('FRIGG_DAEMON_SOCKET'):
+        return os.environ['FRIGG_DAEMON_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'frigg-%s.sock' % os.getuid())
+
+    directory = os.path.join(tempfile.gettempdir(), 'frigg-%s' % os.getuid())
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or \
+            status.st_mode & 0o077:
+        raise DaemonError('%s is not a private directory of the current user' % directory)
+    return os.path.join(directory, 'daemon.sock')
+
+
+def check_socket(path):
+    """
+    Make sure a socket belongs to the current user. Another user could create the socket first,
+    collect the environment sent with build requests and send back fake results.
+
+    :param path: Path of the socket
+    :return: True if the socket exists
+    :raises DaemonError: The path belongs to another user or is not a socket
+    """
+    try:
+        status = os.lstat(path)
+    except OSError as error:
+        if error.errno == errno.ENOENT:
+            return False
+        raise
+    if not stat.S_ISSOCK(status.st_mode) or status.st_uid != os.getuid():
+        raise DaemonError('%s is not a socket of the current user' % path)
+    return True
+
+
+def send(stream, message):
+    stream.write((json.dumps(message) + '\n').encode('utf8'))
+    stream.flush()
+
+
+class WarmSettings(object):
+    """
+    Settings of the projects built by the daemon, read through the SettingsCache of the project.
+    The friggfile is parsed again when it or any other file frigg_settings looked at changed.
+    """
+
+    def get(self, directory):
+        """
+        :param directory: The project directory
+        :return: (dict) The settings, None if the friggfile is missing or can not be read
+        """
+        if not any(os.path.isfile(os.path.join(directory, name)) for name in SETTINGS_FILES):
+            # The build reports the missing friggfile or directory
+            return None
+
+        cache = SettingsCache(directory)
+        settings = cache.get()
+        if settings is not None:
+            return settings
+        try:
+            return build_settings(directory, cache=cache)
+        except (RuntimeError, TypeError):
+            # The build reads the friggfile itself and reports the problem
+            return None
+
+
+class BuildHandler(socketserver.StreamRequestHandler):
+    """
+    Runs the build of a request and streams its events back as JSON lines:
+
+        {"type": "started", "task": "flake8"}
+        {"type": "finished", "task": "flake8", "result": {...}}
+        {"type": "result", "report": {...}}
+
+    A build that can not run ends with {"type": "error", "message": "..."} instead.
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf8'))
+        options = dict((name, request[name]) for name in BUILD_OPTIONS if name in request)
+        try:
+            build = Build(request['path'], config=self.server.settings.get(request['path']),
+                          **options)
+        except BuildError as exception:
+            return send(self.wfile, {'type': 'error', 'message': str(exception)})
+
+        try:
+            for event in build.events():
+                message = {'type': event.type, 'task': event.task}
+                if event.type == TASK_FINISHED:
+                    message['result'] = task_entry(event.result)
+                send(self.wfile, message)
+        except (IOError, OSError, socket.error):
+            # The client went away, there is nobody left to report to
+            build.cancel()
+            return
+
+        try:
+            send(self.wfile, {'type': 'result', 'report': build.result().report()})
+        except BuildError as exception:
+            send(self.wfile, {'type': 'error', 'message': str(exception)})
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Accepts build requests on a Unix socket. The daemon stays warm between builds, the modules
+    the builds need are imported once and friggfiles are only parsed again when they change. Every
+    request runs in its own thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, path):
+        """
+        :param path: Path of the socket, only the current user can connect to it
+        :raises DaemonError: The path belongs to another user
+        """
+        # Socket of a daemon that was killed
+        if check_socket(path) and not is_running(path):
+            os.remove(path)
+        # Create the socket without access for other users, changing its mode after binding leaves
+        # a window where they can connect
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, BuildHandler)
+        finally:
+            os.umask(umask)
+        self.path = path
+        self.settings = WarmSettings()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def warm_up():
+    for name in WARM_MODULES:
+        __import__(name)
+
+
+def connect(path):
+    """
+    :param path: Path of the socket
+    :return: Connected socket, None if no daemon is running
+    :raises DaemonError: The socket belongs to another user
+    """
+    if not check_socket(path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except socket.error as error:
+        connection.close()
+        if error.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+        raise
+    return connection
+
+
+def is_running(path):
+    connection = connect(path)
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+
+def request_build(connection, path, **options):
+    """
+    Send a build request to the daemon
+
+    :param connection: Socket from connect
+    :param path: The project directory
+    :param options: Options of the build, see BUILD_OPTIONS
+    :return: Iterator of the messages of the build
+    """
+    stream = connection.makefile('rwb')
+    try:
+        send(stream, dict(options, path=os.path.abspath(path)))
+        for line in stream:
+            yield json.loads(line.decode('utf8'))
+    finally:
+        stream.close()
+        connection.close()
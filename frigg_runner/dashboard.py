@@ -0,0 +1,154 @@
+# -*- coding: utf8 -*-
+import sys
+import threading
+import time
+
+import click
+
+# Maximum number of times per second the dashboard is redrawn
+REFRESH_RATE = 4
+
+# ANSI sequences moving the cursor up a number of lines and clearing the rest of the screen
+CURSOR_UP = '\x1b[%sA'
+CLEAR_DOWN = '\x1b[J'
+
+
+def dashboard_supported():
+    """
+    The dashboard redraws itself with ANSI sequences, which only works on a terminal
+    """
+    return sys.stdout.isatty() and click.get_terminal_size()[0] > 0
+
+
+class Dashboard(object):
+    """
+    Live view of a running build. Every running task is shown with its elapsed time, its
+    expected duration and the last line of its output, below a line with the number of finished
+    and queued tasks:
+
+        Running tasks        3/10 done, 4 queued
+          tox                12.3s / ~40s  collecting ...
+          flake8              1.2s         ./runner.py:1:1: E302
+
+    The view is redrawn by a background thread at most REFRESH_RATE times per second, however
+    fast the tasks produce output. It is used like click.progressbar, iterating over the
+    dashboard yields the items of the iterable and counts them as finished tasks.
+    """
+
+    def __init__(self, iterable, length, label, durations=None, refresh_rate=REFRESH_RATE):
+        """
+        :param iterable: Yields an item for every finished task
+        :param length: Number of tasks
+        :param label: Label in front of the progress line
+        :param durations: Expected duration by task name
+        :param refresh_rate: Redraws per second
+        """
+        self.iterable = iterable
+        self.length = length
+        self.label = label
+        self.durations = durations or {}
+        self.interval = 1.0 / refresh_rate
+        self.lock = threading.Lock()
+        self.running = {}
+        self.finished = 0
+        self.drawn_lines = 0
+        # Held while the dashboard writes to the terminal, messages are printed between redraws
+        self.draw_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.refresh)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stop(self):
+        """
+        Stop redrawing the dashboard, only the progress line is left on the screen. Output
+        printed afterwards, like the failure of a fail fast build, stays on the screen.
+        """
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        with self.draw_lock:
+            self.clear()
+            click.echo(self.render(click.get_terminal_size()[0])[0])
+
+    def echo(self, message, **styles):
+        """
+        Print a message above the dashboard, it is drawn again below the message
+
+        :param message: The message
+        :param styles: Arguments of click.secho, like fg or err
+        """
+        with self.draw_lock:
+            self.clear()
+            click.secho(message, **styles)
+
+    def __iter__(self):
+        for item in self.iterable:
+            with self.lock:
+                self.finished += 1
+            yield item
+
+    def start(self, name, spool=None):
+        """
+        Show a task as running
+
+        :param name: The task name
+        :param spool: OutputSpool of the task, for its last output line
+        """
+        with self.lock:
+            self.running[name] = (time.time(), spool)
+
+    def finish(self, name):
+        with self.lock:
+            self.running.pop(name, None)
+
+    def refresh(self):
+        while not self.stopped.wait(self.interval):
+            self.draw()
+
+    def render(self, width, now=None):
+        """
+        :param width: Width of the terminal
+        :param now: The current time
+        :return: List of lines
+        """
+        now = now or time.time()
+        with self.lock:
+            running = sorted(self.running.items(), key=lambda item: item[1][0])
+            finished = self.finished
+
+        queued = max(self.length - finished - len(running), 0)
+        lines = ['%s %s/%s done, %s queued' % (self.label.ljust(20), finished, self.length,
+                                               queued)]
+        for name, (start_time, spool) in running:
+            elapsed = '%.1fs' % (now - start_time)
+            expected = self.durations.get(name)
+            if expected is not None:
+                elapsed += ' / ~%.0fs' % expected
+            # Progress bars of tasks redraw their line with carriage returns
+            last_line = spool.last_line.split('\r')[-1].strip() if spool else ''
+            lines.append('  %s %s  %s' % (name[:18].ljust(18), elapsed.ljust(14), last_line))
+        return [line[:width - 1] for line in lines]
+
+    def draw(self):
+        lines = self.render(click.get_terminal_size()[0])
+        output = CLEAR_DOWN + ''.join('%s\n' % line for line in lines)
+        with self.draw_lock:
+            if self.drawn_lines:
+                output = CURSOR_UP % self.drawn_lines + output
+            click.echo(output, nl=False)
+            self.drawn_lines = len(lines)
+
+    def clear(self):
+        if self.drawn_lines:
+            click.echo(CURSOR_UP % self.drawn_lines + CLEAR_DOWN, nl=False)
+            self.drawn_lines = 0
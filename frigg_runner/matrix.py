@@ -0,0 +1,115 @@
+# -*- coding: utf8 -*-
+import itertools
+import os
+import shutil
+import subprocess
+import tempfile
+
+from .utils import CACHE_DIRECTORY
+
+# Ways to give every matrix cell its own working directory
+ISOLATION_MODES = ('copy', 'worktree')
+
+# Errors of isolate_cell when the working directory of a cell can not be created
+ISOLATION_ERRORS = (IOError, OSError, shutil.Error, subprocess.CalledProcessError)
+
+
+class MatrixCell(object):
+    """
+    One environment of a matrix build. The task list runs once for every cell, with the
+    environment variables of the cell set:
+
+        matrix:
+          env:
+            PYTHON: [python2.7, python3.4]
+            DJANGO: ['1.8', '1.9']
+          include:
+            - PYTHON: pypy
+          isolate: copy
+
+    isolate is optional, copy runs every cell in a copy of the working directory and worktree
+    in a git worktree of the current commit.
+    """
+
+    def __init__(self, env, directory):
+        self.env = dict((str(key), str(value)) for key, value in env.items())
+        self.name = ' '.join('%s=%s' % (key, self.env[key]) for key in sorted(self.env))
+        self.directory = directory
+
+    def __repr__(self):
+        return '<MatrixCell: %s>' % self.name
+
+
+def expand_matrix(matrix, directory):
+    """
+    Create the cells of a matrix, every combination of the env values plus the included ones.
+
+    :param matrix: The matrix section of the friggfile
+    :param directory: The working directory
+    :return: List of cells
+    """
+    if not isinstance(matrix, dict):
+        raise TypeError('The matrix must be a mapping')
+    if matrix.get('isolate') not in (None,) + ISOLATION_MODES:
+        raise TypeError('Unknown matrix isolation: %s' % matrix['isolate'])
+
+    env = matrix.get('env') or {}
+    if not isinstance(env, dict):
+        raise TypeError('The matrix env must be a mapping')
+    keys = sorted(env)
+    values = [env[key] if isinstance(env[key], list) else [env[key]] for key in keys]
+
+    cells = []
+    if keys:
+        for combination in itertools.product(*values):
+            cells.append(MatrixCell(dict(zip(keys, combination)), directory))
+    for include in matrix.get('include') or []:
+        if not isinstance(include, dict):
+            raise TypeError('Matrix include entries must be mappings')
+        cells.append(MatrixCell(include, directory))
+
+    if not cells:
+        raise TypeError('The matrix has no cells')
+    return cells
+
+
+def isolate_cell(cell, mode):
+    """
+    Give a cell its own working directory
+
+    :param cell: The matrix cell, its directory is replaced
+    :param mode: copy or worktree
+    :raises ISOLATION_ERRORS: The directory could not be created, nothing is left behind
+    """
+    cell.source_directory = cell.directory
+    cell.isolation_directory = tempfile.mkdtemp(prefix='frigg-matrix-')
+    path = os.path.join(cell.isolation_directory, 'build')
+    try:
+        if mode == 'worktree':
+            with open(os.devnull, 'wb') as devnull:
+                subprocess.check_call(['git', 'worktree', 'add', '--detach', path, 'HEAD'],
+                                      cwd=cell.directory, stdout=devnull, stderr=devnull)
+                # The worktree holds the whole repository, the friggfile may be in a
+                # subdirectory
+                prefix = subprocess.check_output(['git', 'rev-parse', '--show-prefix'],
+                                                 cwd=cell.directory, stderr=devnull)
+            path = os.path.normpath(os.path.join(path, prefix.decode('utf8').strip()))
+        else:
+            shutil.copytree(cell.directory, path, symlinks=True,
+                            ignore=shutil.ignore_patterns(CACHE_DIRECTORY))
+    except ISOLATION_ERRORS:
+        cleanup_cell(cell, mode)
+        raise
+    cell.directory = path
+
+
+def cleanup_cell(cell, mode):
+    """
+    Remove the working directory created by isolate_cell
+    """
+    shutil.rmtree(cell.isolation_directory, ignore_errors=True)
+    if mode == 'worktree':
+        with open(os.devnull, 'wb') as devnull:
+            subprocess.call(['git', 'worktree', 'prune'], cwd=cell.source_directory,
+                            stdout=devnull, stderr=devnull)
+    cell.directory = cell.source_directory
@@ -0,0 +1,123 @@
+# -*- coding: utf8 -*-
+import hashlib
+import io
+import os
+import re
+import tempfile
+from collections import deque
+
+# Number of output lines kept in memory for each task
+TAIL_LINES = 200
+
+# Longer lines are truncated in the in-memory tail, the log file keeps them intact
+MAX_LINE_LENGTH = 4096
+
+# Extensions of the log files for every compression format
+COMPRESSION_EXTENSIONS = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def log_filename(name, attempt=1, compression=None):
+    """
+    Name of the log file of a task. Task names are often commands, the characters that do not
+    belong in a filename are replaced and a hash of the name keeps the filenames unique.
+
+    :param name: The task name
+    :param attempt: The attempt number when the task is retried
+    :param compression: Compression of the log, gzip or zstd
+    :return: The filename
+    """
+    slug = re.sub(r'[^A-Za-z0-9_.]+', '-', name).strip('-.')[:80]
+    digest = hashlib.sha1(name.encode('utf8')).hexdigest()[:8]
+    suffix = '.attempt-%s' % attempt if attempt > 1 else ''
+    return '%s-%s%s.log%s' % (slug, digest, suffix, COMPRESSION_EXTENSIONS[compression])
+
+
+def open_log(path, compression=None):
+    """
+    Open a log file for writing text, compressed on the fly with gzip or zstd
+
+    :param path: Path of the log file
+    :param compression: gzip, zstd or None for plain text
+    :return: Text file object
+    """
+    if compression == 'gzip':
+        import gzip
+        return io.TextIOWrapper(gzip.GzipFile(path, 'wb'), encoding='utf8')
+    if compression == 'zstd':
+        import zstandard
+        stream = zstandard.ZstdCompressor().stream_writer(io.open(path, 'wb'))
+        return io.TextIOWrapper(stream, encoding='utf8')
+    return io.open(path, 'w', encoding='utf8')
+
+
+class OutputSpool(object):
+    """
+    Collects the output of a task with constant memory usage.
+
+    The complete output is streamed to a log file while only the last TAIL_LINES lines are kept
+    in a ring buffer, so tasks printing hundreds of megabytes do not grow the runner. The log is
+    a temporary file unless a path is given, logs written to a given path are kept.
+    """
+
+    def __init__(self, tail_lines=TAIL_LINES, path=None, compression=None):
+        """
+        :param tail_lines: Number of lines kept in memory
+        :param path: Path of the log file, a temporary file by default
+        :param compression: Compress the log file with gzip or zstd
+        """
+        if path is None:
+            descriptor, self.path = tempfile.mkstemp(prefix='frigg-', suffix='.log')
+            self.file = io.open(descriptor, 'w', encoding='utf8')
+        else:
+            self.path = path
+            self.file = open_log(path, compression)
+        self.persistent = path is not None
+        self.lines = deque(maxlen=tail_lines)
+        self.partial = ''
+        self.line_count = 0
+
+    def write(self, text):
+        """
+        Add a chunk of output
+
+        :param text: Decoded output, not necessarily ending with a newline
+        """
+        self.file.write(text)
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()[:MAX_LINE_LENGTH]
+        for line in lines:
+            self.lines.append(line.rstrip('\r')[:MAX_LINE_LENGTH])
+        self.line_count += len(lines)
+
+    def close(self):
+        """
+        Flush the log file, the tail is still available afterwards
+        """
+        if not self.file.closed:
+            self.file.close()
+
+    def discard(self):
+        """
+        Close and remove the log file, unless it was written to a given path
+        """
+        self.close()
+        if not self.persistent and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def truncated(self):
+        return self.line_count > len(self.lines)
+
+    @property
+    def last_line(self):
+        return self.partial or (self.lines[-1] if self.lines else '')
+
+    def tail(self):
+        """
+        :return: The last lines of output as a string
+        """
+        return '\n'.join(list(self.lines) + ([self.partial] if self.partial else []))
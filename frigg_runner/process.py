@@ -0,0 +1,317 @@
+# -*- coding: utf8 -*-
+import codecs
+import errno
+import os
+import select
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import click
+
+from .output import OutputSpool
+
+# Commands have always been executed by bash, keep that when it is available
+SHELL = '/bin/bash' if os.path.exists('/bin/bash') else None
+
+# Commands containing any of these characters need a shell, the rest are spawned directly
+SHELL_CHARACTERS = set('|&;<>()$`\\"\'*?[]#~=%{}!\n')
+
+# Run every command in its own session so its process group can be signalled. Python 3 does this
+# without running python code in the child, which is a lot cheaper than preexec_fn.
+if sys.version_info >= (3, 2):
+    SESSION_OPTIONS = {'start_new_session': True}
+else:  # pragma: no cover
+    SESSION_OPTIONS = {'preexec_fn': os.setsid}
+
+# Seconds between SIGTERM and SIGKILL when running tasks are cancelled
+TERMINATE_GRACE_PERIOD = 5
+
+# Resources used by a task and the processes it waited for. Times are in seconds, max_rss is the
+# peak resident set size in kilobytes and the block counts are filesystem reads and writes.
+ResourceUsage = namedtuple('ResourceUsage', ['user_time', 'system_time', 'max_rss',
+                                             'block_input', 'block_output'])
+
+
+class ProcessGroups(object):
+    """
+    Keeps track of running tasks. Every task runs in its own session, so signalling the process
+    group also reaches the processes spawned by the task.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = set()
+        self.closed = False
+
+    def add(self, process):
+        with self.lock:
+            self.processes.add(process)
+            # Processes started after the groups were closed by terminate are killed right away
+            if self.closed:
+                signal_group(process, signal.SIGKILL)
+
+    def remove(self, process):
+        with self.lock:
+            self.processes.discard(process)
+
+    def terminate(self, grace_period=TERMINATE_GRACE_PERIOD, close=False):
+        """
+        Send SIGTERM to every running process group and SIGKILL to the groups that are still
+        alive after the grace period.
+
+        :param grace_period: Seconds to wait before killing the process groups
+        :param close: Also kill processes started from now on
+        """
+        with self.lock:
+            processes = list(self.processes)
+            self.closed = self.closed or close
+
+        for process in processes:
+            signal_group(process, signal.SIGTERM)
+
+        # The processes are reaped by the threads running them, wait for them to unregister
+        deadline = time.time() + grace_period
+        while time.time() < deadline and any(process in self.processes for process in processes):
+            time.sleep(0.05)
+
+        # Children of the task may outlive the task itself, kill what is left of the group
+        for process in processes:
+            signal_group(process, signal.SIGKILL)
+
+
+def signal_group(process, signum):
+    try:
+        os.killpg(process.pid, signum)
+    except OSError as error:
+        if error.errno != errno.ESRCH:
+            raise
+
+
+def wait(process):
+    """
+    Wait for a process and collect its resource usage
+
+    :param process: The Popen object of the process
+    :return: (ResourceUsage) Resources used by the process and its children
+    """
+    while True:
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+            break
+        except OSError as error:
+            if error.errno != errno.EINTR:
+                raise
+
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+
+    # Linux reports the peak rss in kilobytes, OS X in bytes
+    max_rss = rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss
+    return ResourceUsage(rusage.ru_utime, rusage.ru_stime, max_rss, rusage.ru_inblock,
+                         rusage.ru_oublock)
+
+
+def stop(process, grace_period=TERMINATE_GRACE_PERIOD):
+    """
+    Stop a process that is abandoned, like when the runner is interrupted. The process group gets
+    SIGTERM, and SIGKILL if the process is still alive after the grace period.
+
+    :param process: The Popen object of the process
+    :param grace_period: Seconds to wait before killing the process group
+    :return: (ResourceUsage) Resources used by the process and its children
+    """
+    signal_group(process, signal.SIGTERM)
+    timer = threading.Timer(grace_period, signal_group, (process, signal.SIGKILL))
+    timer.daemon = True
+    timer.start()
+    try:
+        return wait(process)
+    finally:
+        timer.cancel()
+        # Children of the process may outlive it
+        signal_group(process, signal.SIGKILL)
+
+
+def wait_readable(descriptor, timeout):
+    """
+    Wait until a file descriptor can be read
+
+    :param descriptor: The file descriptor
+    :param timeout: Seconds to wait, None to wait forever
+    :return: True if the descriptor is readable, False if the timeout expired
+    """
+    while True:
+        try:
+            return bool(select.select([descriptor], [], [], timeout)[0])
+        except (select.error, OSError) as error:
+            # Python 2 does not retry select when it is interrupted by a signal
+            if error.args[0] != errno.EINTR:
+                raise
+
+
+def split_command(command):
+    """
+    Split a command into arguments if it can be executed without a shell
+
+    :param command: The command string
+    :return: List of arguments, None if the command needs a shell
+    """
+    if SHELL_CHARACTERS.intersection(command):
+        return None
+    arguments = shlex.split(command)
+    return arguments or None
+
+
+def spawn(command, cwd, stdin, stdout, env=None, environment=None):
+    """
+    Start a command in a new session. Simple commands are executed directly, everything else
+    and commands that are not executables, like shell builtins, are executed by the shell.
+    """
+    if env or environment is not None:
+        env = dict(os.environ if environment is None else environment, **(env or {}))
+    options = dict(SESSION_OPTIONS, cwd=cwd, stdin=stdin, stdout=stdout, stderr=subprocess.STDOUT,
+                   env=env)
+    arguments = split_command(command)
+    if arguments:
+        try:
+            return subprocess.Popen(arguments, **options)
+        except OSError as error:
+            if error.errno not in (errno.ENOENT, errno.EACCES):
+                raise
+    return subprocess.Popen(command, shell=True, executable=SHELL, **options)
+
+
+def execute(command, hide=False, pty=False, encoding='utf8', processes=None, cwd=None, env=None,
+            timeout=None, inactivity_timeout=None, spool=None, environment=None, quiet=False,
+            warn=None):
+    """
+    Run a command and stream its output to an OutputSpool. Stdout and stderr are read as a
+    single stream, like they would appear in a terminal.
+
+    A command running longer than the timeout gets SIGTERM, and SIGKILL if its process group is
+    still alive after the grace period. A command without output for longer than the inactivity
+    timeout is only flagged, it keeps running.
+
+    :param command: The command to execute
+    :param hide: Do not print the output while the command runs
+    :param pty: Run the command in a pseudo-terminal, in a pipe otherwise
+    :param encoding: Encoding of the output
+    :param processes: ProcessGroups tracking the command while it runs
+    :param cwd: Working directory of the command
+    :param env: Environment variables added to the environment of the command
+    :param timeout: Seconds the command may run, None for no limit
+    :param inactivity_timeout: Seconds without output after which the command is reported as
+                               inactive, None to never report it
+    :param spool: OutputSpool receiving the output, a new one is created by default
+    :param environment: The environment of the command, the environment of the runner by default
+    :param quiet: Do not warn about inactivity, it is only reported in the result
+    :param warn: Function printing the inactivity warning instead of click.secho
+    :return: (Result) Result where stdout is the tail of the output, output is the spool,
+             resources is the ResourceUsage of the command, timeout is the timeout and
+             timed_out and inactive tell if the timeouts expired
+    """
+    if spool is None:
+        spool = OutputSpool()
+
+    if pty:
+        master, slave = os.openpty()
+        try:
+            process = spawn(command, cwd, stdin=slave, stdout=slave, env=env,
+                            environment=environment)
+        finally:
+            os.close(slave)
+        descriptor = master
+    else:
+        with open(os.devnull, 'rb') as devnull:
+            process = spawn(command, cwd, stdin=devnull, stdout=subprocess.PIPE, env=env,
+                            environment=environment)
+        descriptor = process.stdout.fileno()
+
+    if processes is not None:
+        processes.add(process)
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    start_time = last_output_time = time.time()
+    deadline = start_time + timeout if timeout else None
+    kill_time = None
+    timed_out = inactive = False
+    finished = False
+    try:
+        while True:
+            # Sleep until there is output or the next timeout expires
+            wake_times = []
+            if deadline and not timed_out:
+                wake_times.append(deadline)
+            if kill_time:
+                wake_times.append(kill_time)
+            if inactivity_timeout and not inactive:
+                wake_times.append(last_output_time + inactivity_timeout)
+            wait_time = max(min(wake_times) - time.time(), 0) if wake_times else None
+            readable = wait_readable(descriptor, wait_time)
+
+            now = time.time()
+            if deadline and not timed_out and now >= deadline:
+                timed_out = True
+                signal_group(process, signal.SIGTERM)
+                kill_time = now + TERMINATE_GRACE_PERIOD
+            elif kill_time and now >= kill_time:
+                signal_group(process, signal.SIGKILL)
+                kill_time = None
+            if inactivity_timeout and not inactive and now - last_output_time >= inactivity_timeout:
+                inactive = True
+                if not quiet:
+                    message = 'No output for %ss from %s' % (inactivity_timeout, command)
+                    if warn:
+                        warn(message)
+                    else:
+                        click.secho(message, fg='yellow', err=True)
+            if not readable:
+                continue
+
+            try:
+                data = os.read(descriptor, 65536)
+            except OSError as error:
+                # Reading a pty fails with EIO when the other side is closed
+                if error.errno != errno.EIO:
+                    raise
+                data = b''
+
+            last_output_time = now
+            text = decoder.decode(data, final=not data)
+            if text:
+                spool.write(text)
+                if not hide:
+                    click.echo(text, nl=False)
+            if not data:
+                break
+        finished = True
+    finally:
+        if pty:
+            os.close(master)
+        else:
+            process.stdout.close()
+        # A task left behind by an exception, like KeyboardInterrupt, runs in its own session and
+        # never got the SIGINT of the terminal, it would keep the runner waiting
+        resources = wait(process) if finished else stop(process)
+        if finished:
+            spool.close()
+        else:
+            spool.discard()
+        if processes is not None:
+            processes.remove(process)
+
+    from invoke.runner import Result
+    result = Result(spool.tail(), '', process.returncode, pty)
+    result.output = spool
+    result.resources = resources
+    result.timeout = timeout
+    result.timed_out = timed_out
+    result.inactive = inactive
+    return result
@@ -0,0 +1,188 @@
+# -*- coding: utf8 -*-
+import json
+import platform
+import time
+
+from . import __version__
+
+# Upper bounds in seconds of the buckets in the task duration histogram
+HISTOGRAM_BUCKETS = [1, 10, 60, 300, 900]
+
+# Number of output lines included for failed tasks
+EXCERPT_LINES = 50
+
+
+def task_status(task_result):
+    if getattr(task_result, 'skipped', False):
+        return 'skipped'
+    return 'success' if task_result.ok else 'failure'
+
+
+def task_entry(task_result, setup=False):
+    """
+    Describe a task result as a dictionary
+    """
+    entry = {
+        'name': task_result.task,
+        'command': getattr(task_result, 'command', task_result.task),
+        'setup': setup,
+        'status': task_status(task_result),
+        'exit_code': task_result.exited,
+        'time': task_result.time,
+        'cached_time': getattr(task_result, 'cached_time', None),
+        'timed_out': getattr(task_result, 'timed_out', False),
+        'timeout': getattr(task_result, 'timeout', None),
+        'inactive': getattr(task_result, 'inactive', False),
+        'attempts': getattr(task_result, 'attempts', None),
+        'resources': None,
+        'output': None,
+        'log': None,
+    }
+    output = getattr(task_result, 'output', None)
+    if output and output.persistent:
+        entry['log'] = output.path
+    resources = getattr(task_result, 'resources', None)
+    if resources:
+        entry['resources'] = dict(resources._asdict())
+    if entry['status'] == 'failure':
+        lines = (task_result.stdout or '').splitlines() + (task_result.stderr or '').splitlines()
+        entry['output'] = '\n'.join(lines[-EXCERPT_LINES:])
+    return entry
+
+
+def histogram(times):
+    """
+    Count durations per bucket
+
+    :param times: List of durations in seconds
+    :return: List of buckets with an upper bound, None for the last one, and a count
+    """
+    buckets = [{'max': bound, 'count': 0} for bound in HISTOGRAM_BUCKETS + [None]]
+    for duration in times:
+        for bucket in buckets:
+            if bucket['max'] is None or duration < bucket['max']:
+                bucket['count'] += 1
+                break
+    return buckets
+
+
+def build_report(task_results, setup_task_results, coverage=None, wall_time=None, shard=None):
+    """
+    Create a structured report of a build
+
+    :param task_results: Results of the main tasks
+    :param setup_task_results: Results of the setup tasks
+    :param coverage: Test coverage in percent
+    :param wall_time: Time from the first task started until the last task finished
+    :param shard: Tuple of the shard index and count when the build ran a single shard
+    :return: (dict) The report
+    """
+    tasks = ([task_entry(task_result, setup=True) for task_result in setup_task_results] +
+             [task_entry(task_result) for task_result in task_results])
+    return {
+        'version': __version__,
+        'created': time.time(),
+        'host': platform.node(),
+        'success': all(task['status'] == 'success' for task in tasks if not task['setup']),
+        'coverage': coverage,
+        'total_time': sum(task['time'] for task in tasks if not task['setup']),
+        'wall_time': wall_time,
+        'histogram': histogram([task['time'] for task in tasks if task['status'] != 'skipped']),
+        'shard': {'index': shard[0], 'count': shard[1]} if shard else None,
+        'tasks': tasks,
+    }
+
+
+def merge_reports(reports, coverage=None):
+    """
+    Combine the JSON reports of the shards of a build into the report of the whole build
+
+    :param reports: List of reports from build_report
+    :param coverage: Test coverage of the whole build in percent
+    :return: (dict) The merged report, shards lists the shard of every report
+    """
+    tasks = []
+    for report in reports:
+        tasks.extend(report['tasks'])
+    wall_times = [report['wall_time'] for report in reports]
+    return {
+        'version': __version__,
+        'created': time.time(),
+        'host': platform.node(),
+        'success': all(report['success'] for report in reports),
+        'coverage': coverage,
+        'total_time': sum(report['total_time'] for report in reports),
+        'wall_time': max(wall_times) if None not in wall_times else None,
+        'histogram': histogram([task['time'] for task in tasks if task['status'] != 'skipped']),
+        'shards': [dict(report.get('shard') or {}, host=report['host'],
+                        success=report['success'], wall_time=report['wall_time'])
+                   for report in reports],
+        'tasks': tasks,
+    }
+
+
+def read_report(path):
+    """
+    Load a JSON report written by write_report
+    """
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def junit_report(report):
+    """
+    Convert a report to JUnit XML, every task is a test case.
+
+    :param report: Report from build_report
+    :return: (ElementTree) The JUnit document
+    """
+    import xml.etree.ElementTree as ET
+
+    tasks = report['tasks']
+    suites = ET.Element('testsuites')
+    suite = ET.SubElement(suites, 'testsuite', {
+        'name': 'frigg',
+        'tests': str(len(tasks)),
+        'failures': str(len([task for task in tasks if task['status'] == 'failure'])),
+        'skipped': str(len([task for task in tasks if task['status'] == 'skipped'])),
+        'errors': '0',
+        'time': '%.3f' % report['total_time'],
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(report['created'])),
+        'hostname': report['host'],
+    })
+
+    if report['coverage'] is not None:
+        properties = ET.SubElement(suite, 'properties')
+        ET.SubElement(properties, 'property', {'name': 'coverage',
+                                               'value': str(report['coverage'])})
+
+    for task in tasks:
+        case = ET.SubElement(suite, 'testcase', {
+            'classname': 'frigg.setup_tasks' if task['setup'] else 'frigg.tasks',
+            'name': task['name'],
+            'time': '%.3f' % task['time'],
+        })
+        if task['status'] == 'failure':
+            failure = ET.SubElement(case, 'failure', {
+                'message': ('Timed out after %ss' % task['timeout'] if task.get('timed_out') else
+                            'Exit code %s' % task['exit_code']),
+            })
+            failure.text = task['output']
+        elif task['status'] == 'skipped':
+            ET.SubElement(case, 'skipped', {'message': 'A dependency failed'})
+
+    return ET.ElementTree(suites)
+
+
+def write_report(path, report):
+    """
+    Write a report as JUnit XML if the path ends with .xml, as JSON otherwise.
+
+    :param path: The report file
+    :param report: Report from build_report
+    """
+    if path.endswith('.xml'):
+        junit_report(report).write(path, encoding='utf-8')
+    else:
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
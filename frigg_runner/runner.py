@@ -1,154 +1,883 @@
 # -*- coding: utf8 -*-
 import os
+import threading
+import time
 
 import click
-import frigg_coverage
-import frigg_settings
-import invoke
-from invoke.exceptions import Failure
-from invoke.runner import Result
-from yaml import parser, scanner
 
 from . import __name__, __version__
-from .utils import exit_build, newline, print_task, put_task_result, timeit
+from .build import TASK_FINISHED, TASK_STARTED, BuildError, BuildResult, Event
+from .cache import RecordingFileSystemWrapper, ResultCache, SettingsCache
+from .coverage import parse_coverage_file
+from .dashboard import Dashboard, dashboard_supported
+from .matrix import ISOLATION_ERRORS, cleanup_cell, expand_matrix, isolate_cell
+from .output import OutputSpool, log_filename
+from .process import ProcessGroups, execute
+from .report import build_report, read_report, write_report
+from .scheduler import Scheduler
+from .snapshot import SetupSnapshot
+from .split import bucket_command, discover_tests, file_timing_name, merge_results, partition
+from .tasks import affected_tasks, as_seconds, dependencies, parse_tasks, select_tasks, shard_tasks
+from .timings import TimingStore
+from .utils import (exit_build, newline, print_task, progressbar, put_flaky_task, put_skipped_task,
+                    put_task_output, put_task_resources, put_task_result, put_unaffected_task,
+                    task_name, timeit)
+from .watch import Watcher, changed_since
 
-runner_wrapper = frigg_settings.FileSystemWrapper()
+try:
+    from queue import Queue
+except ImportError:  # pragma: no cover
+    from Queue import Queue
+
+
+# Seconds before the first retry of a failed task, the delay doubles up to RETRY_MAX_DELAY
+RETRY_DELAY = 1
+RETRY_MAX_DELAY = 30
+
+# Errors of reading a coverage report, see parse_coverage_file
+COVERAGE_ERRORS = (KeyError, TypeError, ValueError, SyntaxError, IOError, OSError)
+
+# Friggfile names, see frigg_settings.settings.get_path_of_settings_file
+SETTINGS_FILES = set(['.frigg.yml', '.frigg.yaml'])
+
+
+def build_settings(directory, cache=None):
+    """
+    Read the friggfile. The settings and yaml libraries are only imported here, runs exiting
+    before the friggfile is read or using cached settings never load them.
+
+    :param directory: The directory of the friggfile
+    :param cache: SettingsCache storing the settings
+    :return: (dict) The settings
+    :raises RuntimeError: The friggfile has no tasks
+    :raises TypeError: The friggfile is invalid
+    """
+    import frigg_settings
+    from yaml import parser, scanner
+
+    wrapper = RecordingFileSystemWrapper()
+    try:
+        settings = frigg_settings.build_settings(directory, wrapper)
+    except (parser.ParserError, scanner.ScannerError) as exception:
+        raise TypeError(str(exception))
+    if cache:
+        cache.set(wrapper.dependencies, settings)
+    return settings
 
 
 class Runner(object):
 
-    def __init__(self, failfast=False, verbose=False, setup=False, path=None):
+    def __init__(self, failfast=False, verbose=False, setup=False, path=None, jobs=1,
+                 cache=False, report=None, watch=False, shard=None, durations=None, log_dir=None,
+                 log_compression=None, quiet=False, listener=None, config=None,
+                 settings_cache=True, changed_since=None, environment=None):
         """
         Initialize the local build
 
         :param failfast: Stop build then a task exit with a code other than 0
         :param verbose: Print task output directly to stdout and stderr
+        :param jobs: Number of main tasks to run concurrently
+        :param cache: Replay results of tasks whose inputs are unchanged since the last success
+        :param report: Write a JSON report, or JUnit XML if the path ends with .xml, to this path
+        :param watch: Keep running and rerun the tasks affected by file changes
+        :param shard: Tuple of a shard index and the number of shards, only the tasks of that
+                      shard are run
+        :param durations: JSON report with the task durations balancing the shards
+        :param log_dir: Directory where the output of every task is written to its own file
+        :param log_compression: Compress the log files with gzip or zstd
+        :param quiet: Print nothing and raise BuildError instead of exiting, for builds run from
+                      python
+        :param listener: Function called with an Event when a task starts and finishes
+        :param config: Settings of the friggfile when they were read already
+        :param settings_cache: Reuse the settings of the friggfile while it and the files used to
+                               detect tasks are unchanged
+        :param changed_since: Git revision, only the tasks affected by the files changed since
+                              then are run
+        :param environment: Environment variables of the tasks, the environment of the runner by
+                            default
         """
         self.fail_fast = failfast
         self.verbose = verbose
         self.setup = setup
         self.directory = path or os.getcwd()
+        self.jobs = max(jobs, 1)
+        self.slots = threading.BoundedSemaphore(self.jobs)
+        self.cache = ResultCache(self.directory) if cache else None
+        self.processes = ProcessGroups()
+        self.timings = TimingStore(self.directory)
+        self.report_path = report
+        self.watch = watch
+        self.shard = shard
+        self.durations_path = durations
+        self.changed_since = changed_since
+        self.environment = environment
+        self.changed_paths = None
+        self.unaffected_tasks = []
+        self.log_dir = log_dir
+        self.log_compression = log_compression
+        self.quiet = quiet
+        self.listener = listener
+        self.start_time = None
+        self.snapshot = None
+        self.timeout = None
+        self.inactivity_timeout = None
+        self.dashboard = None
+        self.settings_cache = SettingsCache(self.directory) if settings_cache else None
+        self.settings_time = None
+        self.settings_cached = False
 
-        click.secho('%s %s' % (__name__, __version__), fg='blue', bold=True)
-        click.echo('Path: %s' % click.format_filename(self.directory))
-        newline()
-
-        if not os.path.exists(self.directory):
-            click.secho('The given working directory does not exist', fg='red')
-            exit_build(False)
+        if not self.quiet:
+            click.secho('%s %s' % (__name__, __version__), fg='blue', bold=True)
+            click.echo('Path: %s' % click.format_filename(self.directory))
 
         try:
-            self.config = frigg_settings.build_settings(self.directory, runner_wrapper)
+            self.config = config if config is not None else self.read_settings()
+            if not self.quiet:
+                if self.settings_time is not None:
+                    click.echo('Settings: read in %s%s%s' % (
+                        round(self.settings_time * 1000, ndigits=1), 'ms',
+                        ' from the cache' if self.settings_cached else ''))
+                newline()
         except RuntimeError:
-            click.secho('No tasks found!', fg='red')
-            exit_build(True)
-        except (parser.ParserError, scanner.ScannerError, TypeError) as exception:
-            click.secho('Could not read frigg file: %s' % str(exception), fg='red')
+            if not self.quiet:
+                newline()
+                click.secho('No tasks found!', fg='red')
+                exit_build(True)
+            # Builds run from python treat a friggfile without tasks as an empty build
+            self.config = {'tasks': []}
+        except BuildError as exception:
+            if self.quiet:
+                raise
+            newline()
+            click.secho(str(exception), fg='red')
             exit_build(False)
 
-        self.verbose_tasks = self.config.get('verbose_tasks', [])
+        # Quiet builds never show task output
+        self.verbose_tasks = [] if self.quiet else self.config.get('verbose_tasks', [])
 
-    def coverage(self):
+        if self.log_dir and not os.path.isdir(self.log_dir):
+            os.makedirs(self.log_dir)
+
+    def read_settings(self):
         """
-        Check test coverage. Print coverage if coverage information exist in frigg configuration
+        Read the settings of the friggfile, from the settings cache when possible. The time it
+        took is stored in settings_time.
+
+        :return: (dict) The settings of the friggfile
+        :raises RuntimeError: The friggfile has no tasks
+        :raises BuildError: The working directory does not exist or the friggfile is invalid
         """
+        if not os.path.exists(self.directory):
+            raise BuildError('The given working directory does not exist')
+
+        start_time = time.time()
         try:
+            settings = self.settings_cache and self.settings_cache.get()
+            self.settings_cached = settings is not None
+            if not self.settings_cached:
+                settings = build_settings(self.directory, cache=self.settings_cache)
+        except TypeError as exception:
+            raise BuildError('Could not read frigg file: %s' % str(exception))
+        finally:
+            self.settings_time = time.time() - start_time
+        return settings
 
-            if self.config.get('coverage', False):
-                coverage_file = os.path.join(self.directory, self.config['coverage']['path'])
-                parser = self.config['coverage']['parser']
-                coverage_report = None
+    def read_coverage(self):
+        """
+        :return: (Coverage) The coverage from the report in the coverage settings, None if the
+                 friggfile has no coverage settings
+        """
+        if not self.config.get('coverage', False):
+            return None
+        coverage_file = os.path.join(self.directory, self.config['coverage']['path'])
+        parser = self.config['coverage']['parser']
+        packages = bool(self.config['coverage'].get('packages', False))
+        return parse_coverage_file(coverage_file, parser, packages=packages)
 
-                if os.path.exists(coverage_file):
-                    with open(coverage_file, 'r') as file:
-                        coverage_report = file.read()
+    def coverage(self):
+        """
+        Check test coverage. Print coverage if coverage information exist in frigg configuration.
+        The report is parsed incrementally, and with packages enabled in the coverage settings
+        the coverage of every package is printed as well:
 
-                coverage = frigg_coverage.parse_coverage(coverage_report, parser)
+            coverage:
+              path: coverage.xml
+              parser: python
+              packages: true
 
-                click.secho('Coverage %s%s' % (round(coverage, ndigits=2), '%'), fg='blue')
+        :return: The coverage in percent, None if there is no coverage information
+        """
+        try:
+            coverage = self.read_coverage()
+            if coverage:
+                click.secho('Coverage %s%s' % (round(coverage.total, ndigits=2), '%'),
+                            fg='blue')
+                for name, package_coverage in coverage.packages or []:
+                    click.secho('  # %s %s%s' % (name, round(package_coverage, ndigits=2), '%'),
+                                fg='blue')
+                return coverage.total
 
-        except (KeyError, TypeError, OSError) as exception:
+        except COVERAGE_ERRORS as exception:
             click.secho('Unable to parse the coverage report.', fg='red')
             click.secho(str(exception), fg='red')
             return exit_build(False)
 
     @timeit
-    def run_task(self, command):
+    def run_task(self, command, pty=True, cell=None, timeout=None, inactivity_timeout=None,
+                 spool=None, limit=True):
         """
         Run a task and return a task result
 
         :param command: The command to execute
-        :return: (Result) Invoke task result
+        :param pty: Allow running the command in a pseudo-terminal when its output is shown,
+                    disabled for concurrent tasks
+        :param cell: The matrix cell providing the working directory and environment
+        :param timeout: Seconds after which the task is terminated
+        :param inactivity_timeout: Seconds without output after which the task is reported
+        :param spool: OutputSpool receiving the output
+        :param limit: Wait for one of the --jobs slots before starting the command
+        :return: (Result) Task result, stdout contains the tail of the output
         """
-        try:
-            if command in self.verbose_tasks:
-                hide_output = False
-            else:
-                hide_output = (bool(not self.verbose))
-            if not hide_output:
+        if command in self.verbose_tasks:
+            hide_output = False
+        else:
+            hide_output = (bool(not self.verbose))
+        if not hide_output:
+            newline()
+
+        options = {'cwd': self.directory}
+        if cell:
+            options = {'cwd': cell.directory, 'env': cell.env}
+        if timeout:
+            options['timeout'] = timeout
+        if inactivity_timeout:
+            options['inactivity_timeout'] = inactivity_timeout
+        if spool:
+            options['spool'] = spool
+        if self.environment is not None:
+            options['environment'] = self.environment
+        if self.quiet:
+            options['quiet'] = True
+        elif self.dashboard:
+            options['warn'] = self.warn
+
+        if not limit:
+            return execute(command, hide=hide_output, encoding='utf8',
+                           pty=pty and not hide_output, processes=self.processes, **options)
+        with self.slots:
+            return execute(command, hide=hide_output, encoding='utf8',
+                           pty=pty and not hide_output, processes=self.processes, **options)
+
+    @timeit
+    def run_split(self, task, cell=None, timeout=None, inactivity_timeout=None, spool=None):
+        """
+        Run a task with split test files. The test files are divided into buckets with about the
+        same expected runtime and every bucket runs the command with its files, all buckets at
+        the same time. The buckets are extra processes on top of --jobs, the task itself takes
+        one of the slots.
+
+        :param task: The task to execute
+        :param cell: The matrix cell to run the task in
+        :param timeout: Seconds after which a bucket is terminated
+        :param inactivity_timeout: Seconds without output after which a bucket is reported
+        :param spool: OutputSpool receiving the merged output
+        :return: (Result) The merged result of the buckets
+        """
+        name = task_name(task, cell)
+        files = discover_tests(cell.directory if cell else self.directory, task.split)
+        durations = dict((path, self.timings.expected(file_timing_name(name, path)))
+                         for path in files)
+        buckets = partition(files, task.split.count, durations)
+        if len(buckets) < 2:
+            return self.run_task(task.command, pty=False, cell=cell, timeout=timeout,
+                                 inactivity_timeout=inactivity_timeout, spool=spool)[1]
+
+        results = [None] * len(buckets)
+
+        def run_bucket(index):
+            try:
+                results[index] = self.run_task(bucket_command(task.command, buckets[index]),
+                                               pty=False, cell=cell, timeout=timeout,
+                                               inactivity_timeout=inactivity_timeout,
+                                               limit=index == 0)
+            except Exception as exception:
+                # The bucket fails the task, the output of the other buckets is still merged
+                from invoke.runner import Result
+                results[index] = (0, Result('Could not run the bucket: %s\n' % str(exception),
+                                            '', 1, False))
+
+        threads = [threading.Thread(target=run_bucket, args=(index,))
+                   for index in range(len(buckets))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # The runtime of a bucket is shared by its files in proportion to their expected runtime
+        for files, (bucket_time, result) in zip(buckets, results):
+            if result.exited != 0:
+                continue
+            weights = [durations[path] or 1 for path in files]
+            for path, weight in zip(files, weights):
+                self.timings.record(file_timing_name(name, path), task.command,
+                                    bucket_time * weight / sum(weights), True)
+
+        return merge_results(buckets, [result for _, result in results], spool or OutputSpool())
+
+    def execute_task(self, task, pty=True, cell=None):
+        """
+        Run a task, or replay its cached result when the cache is enabled and the inputs of the
+        task are unchanged.
+
+        :param task: The task to execute
+        :param pty: Run the command in a pseudo-terminal
+        :param cell: The matrix cell to run the task in
+        :return: (Result) Task result with task and time attributes
+        """
+        self.notify(TASK_STARTED, task_name(task, cell))
+        cache_key = self.cache and self.cache.key(task, env=cell and cell.env,
+                                                  environment=self.environment)
+        task_result = cache_key and self.cache.get(cache_key)
+        if task_result:
+            task_time = 0
+            if self.verbose or task.command in self.verbose_tasks:
                 newline()
+                click.echo(task_result.stdout)
+                click.echo(task_result.stderr, err=True)
+        else:
+            task_time, task_result = self.run_attempts(task, pty=pty, cell=cell)
+            if cache_key and task_result.ok:
+                self.cache.set(cache_key, task_result, task_time)
+
+            # The complete output is only kept around when the summary points to it: for failed
+            # tasks with more output than the tail shown
+            output = getattr(task_result, 'output', None)
+            if output and (task_result.ok or not output.truncated or self.verbose or self.quiet):
+                output.discard()
 
-            result = invoke.run('cd %s && %s' % (self.directory, command),
-                                hide=hide_output,
-                                encoding='utf8', pty=True)
-            return result
-        except Failure as failure:
-            return failure.result
-        except SystemExit:
-            pass
-        return None
+        task_result.task = task_name(task, cell)
+        task_result.command = task.command
+        task_result.time = task_time
+        return task_result
+
+    def run_attempts(self, task, pty=True, cell=None):
+        """
+        Run a task until it succeeds or has no retries left. The delay before a retry doubles
+        with every attempt.
+
+        :param task: The task to execute
+        :param pty: Run the command in a pseudo-terminal
+        :param cell: The matrix cell to run the task in
+        :return: Tuple of the total runtime of the attempts and the result of the last attempt,
+                 with the runtime and exit code of every attempt in its attempts attribute
+        """
+        attempts = []
+        while True:
+            options = {}
+            dashboard = self.dashboard
+            if self.log_dir:
+                filename = log_filename(task_name(task, cell), len(attempts) + 1,
+                                        self.log_compression)
+                options['spool'] = OutputSpool(path=os.path.join(self.log_dir, filename),
+                                               compression=self.log_compression)
+            elif dashboard:
+                options['spool'] = OutputSpool()
+            if dashboard:
+                dashboard.start(task.name, options['spool'])
+            timeout = task.timeout or self.timeout
+            inactivity_timeout = task.inactivity_timeout or self.inactivity_timeout
+            try:
+                if task.split:
+                    attempt_time, task_result = self.run_split(
+                        task, cell=cell, timeout=timeout, inactivity_timeout=inactivity_timeout,
+                        **options)
+                else:
+                    attempt_time, task_result = self.run_task(
+                        task.command, pty=pty, cell=cell, timeout=timeout,
+                        inactivity_timeout=inactivity_timeout, **options)
+            finally:
+                if dashboard:
+                    dashboard.finish(task.name)
+            attempts.append({'time': attempt_time, 'exit_code': task_result.exited})
+
+            retry = (task_result.failed and len(attempts) <= task.retries and
+                     (not task.retry_on_exit_codes or
+                      task_result.exited in task.retry_on_exit_codes))
+            # Tasks cancelled by fail fast are not retried
+            if not retry or self.processes.closed:
+                break
+
+            output = getattr(task_result, 'output', None)
+            if output:
+                output.discard()
+            delay = min(RETRY_DELAY * 2 ** (len(attempts) - 1), RETRY_MAX_DELAY)
+            if not self.quiet:
+                self.warn('%s failed with exit code %s, retrying in %ss' %
+                          (task_name(task, cell), task_result.exited, delay))
+            time.sleep(delay)
+
+        task_result.attempts = attempts
+        return sum(attempt['time'] for attempt in attempts), task_result
 
     def run(self):
         """
         Run all tasks
         """
-        tasks = self.config['tasks']
-        setup_tasks = self.config.get('setup_tasks', [])
+        try:
+            tasks, setup_tasks, cells = self.parse_config()
+        except TypeError as exception:
+            click.secho('Could not read frigg file: %s' % str(exception), fg='red')
+            return exit_build(False)
 
         # List all tasks
+        if self.changed_paths is not None:
+            click.secho('Changed since %s: %s files, %s of %s tasks affected' % (
+                self.changed_since, len(self.changed_paths),
+                len(self.config['tasks']) - len(self.unaffected_tasks),
+                len(self.config['tasks'])), fg='yellow')
+        if self.shard:
+            click.secho('Shard %s/%s: %s of %s tasks' % (self.shard[0], self.shard[1], len(tasks),
+                                                         len(self.config['tasks'])), fg='yellow')
         click.secho('Tasks', fg='yellow')
         if self.setup:
             for task in setup_tasks:
-                click.secho('  # %s (setup task)' % task, fg='yellow')
+                click.secho('  # %s (setup task)' % task.name, fg='yellow')
         for task in tasks:
-            click.secho('  # %s' % task, fg='yellow')
+            click.secho('  # %s' % task.name, fg='yellow')
         newline()
 
+        if cells:
+            return self.run_matrix(tasks, setup_tasks, cells)
+
+        self.start_time = time.time()
+        setup_task_results = []
+        if self.setup:
+            setup_task_results = self.run_setup_tasks(setup_tasks, 'Running setup tasks')
+
+        task_results = self.run_tasks(tasks, 'Running tasks', jobs=self.jobs,
+                                      fail_fast=self.fail_fast)
+
+        newline()
+        if self.watch:
+            self.summarize(task_results, setup_task_results)
+            self.watch_tasks(tasks)
+        else:
+            self.handle_results(task_results, setup_task_results)
+
+    def parse_config(self):
+        """
+        Parse the tasks and the build settings of the friggfile
+
+        :return: Tuple of the tasks of this shard, the setup tasks and the matrix cells, None if
+                 the friggfile has no matrix
+        :raises TypeError: The friggfile is invalid
+        """
+        tasks = self.select_shard(self.select_changed(parse_tasks(self.config['tasks'])))
+        setup_tasks = parse_tasks(self.config.get('setup_tasks', []))
+        self.timeout = as_seconds(self.config.get('timeout'), 'timeout')
+        self.inactivity_timeout = as_seconds(self.config.get('inactivity_timeout'),
+                                             'inactivity_timeout')
+        self.snapshot = None
+        if self.config.get('setup_cache'):
+            self.snapshot = SetupSnapshot.parse(self.config['setup_cache'], self.directory)
+        cells = None
+        if self.config.get('matrix'):
+            cells = expand_matrix(self.config['matrix'], self.directory)
+        return tasks, setup_tasks, cells
+
+    def build(self):
+        """
+        Run the build without printing anything or exiting, the core of Build
+
+        :return: (BuildResult) The results of the build
+        :raises BuildError: The friggfile is invalid or the coverage report can not be read
+        """
+        try:
+            tasks, setup_tasks, cells = self.parse_config()
+        except TypeError as exception:
+            raise BuildError('Could not read frigg file: %s' % str(exception))
+        if cells:
+            raise BuildError('Matrix builds can only be run from the command line')
+
+        self.start_time = time.time()
         setup_task_results = []
         if self.setup:
-            with click.progressbar(setup_tasks, label='Running setup tasks'.ljust(20),
-                                   show_eta=False, item_show_func=print_task) as bar:
-                for task in bar:
-                    task_time, task_result = self.run_task(task)
-                    task_result.task = task
-                    task_result.time = task_time
-                    if isinstance(task_result, Result):
-                        setup_task_results.append(task_result)
-
-        task_results = []
-        with click.progressbar(tasks, label='Running tasks'.ljust(20), show_eta=False,
-                               item_show_func=print_task) as bar:
-            for task in bar:
-                task_time, task_result = self.run_task(task)
-                task_result.task = task
-                task_result.time = task_time
-                if isinstance(task_result, Result):
-                    task_results.append(task_result)
-
-                # Fail fast
-                if task_result.failed and self.fail_fast:
-                    if not self.verbose:
-                        click.secho(task_result.task, fg='red')
-                        click.echo(task_result.stdout)
-                        click.echo(task_result.stderr, err=True)
-                    exit_build(False)
+            setup_task_results = self.run_setup_tasks(setup_tasks, None)
+        task_results = self.run_tasks(tasks, None, jobs=self.jobs, fail_fast=self.fail_fast)
+        wall_time = time.time() - self.start_time
+
+        try:
+            coverage = self.read_coverage()
+        except COVERAGE_ERRORS as exception:
+            raise BuildError('Unable to parse the coverage report: %s' % str(exception))
+
+        return BuildResult(task_results, setup_task_results,
+                           coverage=coverage.total if coverage else None, wall_time=wall_time,
+                           shard=self.shard)
 
+    def run_matrix(self, tasks, setup_tasks, cells):
+        """
+        Run the task list once for every matrix cell. The cells run concurrently while --jobs
+        limits the number of tasks running at the same time over all cells.
+
+        :param tasks: List of tasks
+        :param setup_tasks: List of setup tasks
+        :param cells: List of matrix cells
+        """
+        isolate = self.config['matrix'].get('isolate')
+        click.secho('Matrix', fg='yellow')
+        for cell in cells:
+            click.secho('  # %s' % cell.name, fg='yellow')
+        newline()
+        if self.watch:
+            click.secho('Watch mode is not supported for matrix builds', fg='yellow')
+
+        def run_cell(cell):
+            start_time = time.time()
+            if isolate:
+                try:
+                    isolate_cell(cell, isolate)
+                except ISOLATION_ERRORS as exception:
+                    raise BuildError('Could not create the working directory of %s: %s' %
+                                     (cell.name, str(exception)))
+            try:
+                setup_task_results = []
+                if self.setup:
+                    setup_task_results = self.run_setup_tasks(setup_tasks, None, cell=cell)
+                task_results = self.run_tasks(tasks, None, jobs=self.jobs,
+                                              fail_fast=self.fail_fast, cell=cell)
+            finally:
+                if isolate:
+                    cleanup_cell(cell, isolate)
+            return cell, time.time() - start_time, setup_task_results, task_results
+
+        self.start_time = time.time()
+        cell_results = {}
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(len(cells))
+        try:
+            with click.progressbar(pool.imap_unordered(run_cell, cells), length=len(cells),
+                                   label='Running matrix'.ljust(20), show_eta=False,
+                                   item_show_func=lambda item: print_task(item and item[0].name)) \
+                    as bar:
+                for cell, cell_time, setup_task_results, task_results in bar:
+                    cell_results[cell.name] = (cell_time, setup_task_results, task_results)
+                    failures = [task_result for task_result in task_results
+                                if task_result.failed]
+                    if failures and self.fail_fast:
+                        self.processes.terminate(close=True)
+                        self.fail_fast_exit(failures[0])
+        except BuildError as exception:
+            self.processes.terminate(close=True)
+            click.secho(str(exception), fg='red')
+            return exit_build(False)
+        except KeyboardInterrupt:
+            self.processes.terminate(close=True)
+            raise
+        finally:
+            pool.terminate()
         newline()
-        self.handle_results(task_results, setup_task_results)
+
+        click.secho('Matrix result', fg='blue')
+        all_task_results = []
+        all_setup_task_results = []
+        for cell in cells:
+            cell_time, setup_task_results, task_results = cell_results[cell.name]
+            all_setup_task_results.extend(setup_task_results)
+            all_task_results.extend(task_results)
+            success = all(task_result.ok for task_result in task_results)
+            click.secho('  # %s (%s%s) %s' % (cell.name, round(cell_time, ndigits=2), 's',
+                                              'success' if success else 'fail'),
+                        fg='green' if success else 'red')
+        newline()
+
+        self.handle_results(all_task_results, all_setup_task_results)
+
+    def watch_tasks(self, tasks):
+        """
+        Rerun the tasks affected by file changes until the runner is interrupted. Tasks with
+        inputs only run when one of their inputs changed, tasks without inputs run on every
+        change. Changes to the friggfile reload the task list. Files changed while the tasks run
+        are not watched, they are the output of the tasks.
+
+        :param tasks: List of tasks
+        """
+        watcher = Watcher(self.directory)
+        try:
+            while True:
+                click.secho('Watching for changes, press Ctrl+C to stop', fg='blue')
+                changed = watcher.wait()
+                newline()
+
+                if SETTINGS_FILES.intersection(changed):
+                    tasks = self.reload_tasks(tasks)
+
+                affected = affected_tasks(tasks, changed)
+                if not affected:
+                    continue
+
+                click.secho('Changed', fg='yellow')
+                for path in sorted(changed):
+                    click.secho('  # %s' % path, fg='yellow')
+                newline()
+
+                self.start_time = time.time()
+                task_results = self.run_tasks(affected, 'Running tasks', jobs=self.jobs,
+                                              fail_fast=self.fail_fast)
+                newline()
+                self.summarize(task_results, [])
+                newline()
+
+                # Files written by the tasks, like coverage reports, would trigger the next round
+                watcher.changes()
+        except KeyboardInterrupt:
+            newline()
+
+    def reload_tasks(self, tasks):
+        """
+        Read the friggfile again, the current tasks are kept if it is invalid
+
+        :param tasks: The current tasks
+        :return: List of tasks
+        """
+        try:
+            config = build_settings(self.directory, cache=self.settings_cache)
+            tasks = self.select_shard(self.select_changed(parse_tasks(config['tasks'])))
+            timeout = as_seconds(config.get('timeout'), 'timeout')
+            inactivity_timeout = as_seconds(config.get('inactivity_timeout'), 'inactivity_timeout')
+        except (RuntimeError, TypeError) as exception:
+            click.secho('Could not read frigg file, keeping the current tasks: %s' %
+                        str(exception), fg='red')
+            return tasks
+
+        click.secho('Reloaded frigg file', fg='blue')
+        self.config = config
+        self.verbose_tasks = self.config.get('verbose_tasks', [])
+        self.timeout = timeout
+        self.inactivity_timeout = inactivity_timeout
+        return tasks
+
+    def output_paths(self):
+        """
+        :return: List of the paths written by the runner inside the working directory, relative to
+                 it: the log directory and the build report
+        """
+        paths = []
+        for path in (self.log_dir, self.report_path):
+            if path:
+                path = os.path.relpath(os.path.abspath(path), os.path.abspath(self.directory))
+                if not path.startswith(os.pardir):
+                    paths.append(path)
+        return paths
+
+    def select_changed(self, tasks):
+        """
+        Restrict the tasks to the ones affected by the files changed since the --changed-since
+        revision: tasks with an input matching a changed file, tasks without inputs, the tasks
+        depending on those and the tasks they depend on. Every task is affected by a change of the
+        friggfile. The names of the other tasks are kept in unaffected_tasks for the summary.
+
+        :param tasks: List of tasks
+        :return: List of the affected tasks, all tasks without --changed-since
+        """
+        self.unaffected_tasks = []
+        if not self.changed_since:
+            return tasks
+
+        try:
+            self.changed_paths = changed_since(self.directory, self.changed_since,
+                                               exclude=self.output_paths())
+        except (OSError, ValueError) as exception:
+            click.secho('Could not find the files changed since %s: %s' %
+                        (self.changed_since, str(exception)), fg='red')
+            return exit_build(False)
+        if SETTINGS_FILES.intersection(self.changed_paths):
+            return tasks
+
+        names = dependencies(tasks, [task.name for task in
+                                     affected_tasks(tasks, self.changed_paths)])
+        self.unaffected_tasks = [task.name for task in tasks if task.name not in names]
+        return select_tasks(tasks, names)
+
+    def select_shard(self, tasks):
+        """
+        Restrict the tasks to the shard of this invocation. The invocations of a sharded build
+        have to agree on the partition, so the durations balancing the shards come from a report
+        shared between them, like the merged report of the previous build, and not from the
+        history of the machine. Without a report every task weighs the same.
+
+        :param tasks: List of tasks
+        :return: List of the tasks in the shard, all tasks when the build is not sharded
+        """
+        if not self.shard:
+            return tasks
+
+        durations = {}
+        if self.durations_path:
+            try:
+                report = read_report(self.durations_path)
+            except (IOError, OSError, ValueError) as exception:
+                click.secho('Could not read the durations report: %s' % str(exception),
+                            fg='red')
+                return exit_build(False)
+            durations = dict((task['name'], task['time']) for task in report['tasks']
+                             if not task['setup'] and task['status'] == 'success')
+
+        index, count = self.shard
+        return shard_tasks(tasks, index, count, durations)
+
+    def run_setup_tasks(self, setup_tasks, label, cell=None):
+        """
+        Run the setup tasks one at a time. With a setup_cache section in the friggfile, the
+        snapshot of an earlier run with the same setup tasks and lockfiles is restored instead,
+        and a new snapshot is stored when every setup task succeeded.
+
+        :param setup_tasks: List of setup tasks
+        :param label: Label of the progressbar, None to hide it
+        :param cell: The matrix cell to run the tasks in
+        :return: List of task results
+        """
+        if not self.snapshot or not setup_tasks:
+            return self.run_tasks(setup_tasks, label, jobs=1, fail_fast=False, cell=cell)
+
+        directory = cell.directory if cell else self.directory
+        fingerprint = self.snapshot.fingerprint(setup_tasks, env=cell and cell.env)
+        start_time = time.time()
+        snapshot_tasks = self.snapshot.restore(fingerprint, directory)
+        if snapshot_tasks is not None:
+            restore_time = time.time() - start_time
+            if label is not None:
+                click.secho('Restored setup snapshot in %ss' % round(restore_time, ndigits=2),
+                            fg='blue')
+            from invoke.runner import Result
+            task_results = []
+            for snapshot_task in snapshot_tasks:
+                task_result = Result('', '', 0, False)
+                task_result.task = snapshot_task['name']
+                task_result.command = snapshot_task['command']
+                task_result.time = 0
+                task_result.cached_time = snapshot_task['time']
+                task_results.append(task_result)
+            return task_results
+
+        self.snapshot.detach(directory)
+        task_results = self.run_tasks(setup_tasks, label, jobs=1, fail_fast=False, cell=cell)
+        if all(task_result.ok for task_result in task_results):
+            self.snapshot.save(fingerprint, directory, task_results)
+        return task_results
+
+    def run_tasks(self, tasks, label, jobs, fail_fast, cell=None):
+        """
+        Run tasks through the scheduler. Up to jobs tasks run concurrently, a task starts when
+        the tasks it depends on have succeeded. The results are returned in the same order as
+        the tasks, regardless of which task finished first.
+
+        :param tasks: List of tasks to execute
+        :param label: Label of the progressbar, None to hide it
+        :param jobs: Number of tasks to run concurrently
+        :param fail_fast: Exit the build when a task fails
+        :param cell: The matrix cell to run the tasks in
+        :return: List of task results
+        """
+        pty = jobs == 1 and cell is None
+        durations = dict((task.name, self.timings.expected(task_name(task, cell)))
+                         for task in tasks)
+        scheduler = Scheduler(tasks, lambda task: self.execute_task(task, pty=pty, cell=cell),
+                              jobs=jobs, durations=durations)
+        if (label is not None and not self.verbose and not self.verbose_tasks and
+                dashboard_supported()):
+            self.dashboard = bar = Dashboard(scheduler.run(), len(tasks), label,
+                                             durations=durations)
+        else:
+            bar = progressbar(scheduler.run(), length=len(tasks), label=label,
+                              item_show_func=lambda item: print_task(item and item[0].name))
+        task_results = {}
+        try:
+            with bar as items:
+                for task, task_result in items:
+                    if task_result is None:
+                        from invoke.runner import Result
+                        task_result = Result('', '', None, pty)
+                        task_result.task = task_name(task, cell)
+                        task_result.command = task.command
+                        task_result.time = 0
+                        task_result.skipped = True
+                    elif getattr(task_result, 'cached_time', None) is None:
+                        task_result.expected_time = durations[task.name]
+                        attempts = getattr(task_result, 'attempts', None) or [
+                            {'time': task_result.time, 'exit_code': task_result.exited}]
+                        for number, attempt in enumerate(attempts, 1):
+                            self.timings.record(task_result.task, task.command, attempt['time'],
+                                                attempt['exit_code'] == 0, attempt=number)
+                    task_results[task.name] = task_result
+                    self.notify(TASK_FINISHED, task_result.task, task_result)
+
+                    # Fail fast, cancel the tasks that are still running. In watch mode, in
+                    # quiet builds and in matrix cells the caller decides what happens next, the
+                    # tasks that finished are returned.
+                    if task_result.failed and fail_fast:
+                        scheduler.close()
+                        self.processes.terminate(close=not self.watch)
+                        if not self.watch and not self.quiet and cell is None:
+                            # The failure is printed below the dashboard and not drawn over
+                            if self.dashboard:
+                                self.dashboard.stop()
+                            self.fail_fast_exit(task_result)
+                        break
+        except KeyboardInterrupt:
+            self.processes.terminate()
+            raise
+        finally:
+            scheduler.close()
+            self.dashboard = None
+
+        return [task_results[task.name] for task in tasks if task.name in task_results]
+
+    def warn(self, message):
+        """
+        Print a warning on stderr, above the dashboard while it is shown
+        """
+        dashboard = self.dashboard
+        if dashboard:
+            dashboard.echo(message, fg='yellow', err=True)
+        else:
+            click.secho(message, fg='yellow', err=True)
+
+    def notify(self, event_type, name, task_result=None):
+        """
+        Pass an event to the listener of the runner
+
+        :param event_type: TASK_STARTED or TASK_FINISHED
+        :param name: The task name
+        :param task_result: The result of a finished task
+        """
+        if self.listener:
+            self.listener(Event(event_type, name, task_result))
+
+    def fail_fast_exit(self, task_result):
+        """
+        Print the output from the failed task and exit the build
+        """
+        if not self.verbose:
+            click.secho(task_result.task, fg='red')
+            put_task_output(task_result)
+        exit_build(False)
 
     def handle_results(self, task_results, setup_task_results):
+        """
+        Print the results and exit the build with an exit code reflecting them
+        """
+        exit_build(self.summarize(task_results, setup_task_results))
+
+    def summarize(self, task_results, setup_task_results):
+        """
+        Print failures, results, resource usage, runtime and coverage, and write the report
 
-        # Create a list of all failures
+        :return: True if every main task succeeded
+        """
+
+        # Create a list of all failures, tasks skipped because of a failed dependency count as
+        # failures but have no output to print.
         failures = []
         for task_result in task_results:
             if task_result.failed:
@@ -157,41 +886,169 @@ class Runner(object):
         for task_result in setup_task_results:
             if task_result.failed:
                 setup_failures.append(task_result)
+        executed_failures = [task_result for task_result in failures
+                             if not getattr(task_result, 'skipped', False)]
+        executed_setup_failures = [task_result for task_result in setup_failures
+                                   if not getattr(task_result, 'skipped', False)]
 
         # Print output from failed tasks, drop it if the runner is in verbose mode.
-        if (len(failures) > 0 or len(setup_failures) > 0) and not self.verbose:
+        if (len(executed_failures) > 0 or len(executed_setup_failures) > 0) and not self.verbose:
             click.secho('Failures', fg='red')
-            for task_result in setup_failures:
+            for task_result in executed_setup_failures:
                 put_task_result(task_result, 'red', setup=True)
-                click.echo(task_result.stdout)
-                click.echo(task_result.stderr, err=True)
-            for task_result in failures:
+                put_task_output(task_result)
+            for task_result in executed_failures:
                 put_task_result(task_result, 'red')
-                click.echo(task_result.stdout)
-                click.echo(task_result.stderr, err=True)
+                put_task_output(task_result)
             newline()
 
         # Print the overall build result
         click.secho('Result', fg='blue')
         for task_result in setup_task_results:
-            if task_result.failed:
+            if getattr(task_result, 'skipped', False):
+                put_skipped_task(task_result, setup=True)
+            elif task_result.failed:
                 put_task_result(task_result, 'red', setup=True)
             elif task_result.ok:
                 put_task_result(task_result, 'green', setup=True)
         for task_result in task_results:
-            if task_result.failed:
+            if getattr(task_result, 'skipped', False):
+                put_skipped_task(task_result)
+            elif task_result.failed:
                 put_task_result(task_result, 'red')
             elif task_result.ok:
                 put_task_result(task_result, 'green')
+        for name in self.unaffected_tasks:
+            put_unaffected_task(name)
 
         newline()
 
+        # Print the tasks that only succeeded after a retry, with their flake rate in recent builds
+        flaky_results = [task_result for task_result in setup_task_results + task_results
+                         if task_result.ok and len(getattr(task_result, 'attempts', [])) > 1]
+        if flaky_results:
+            click.secho('Flaky tasks', fg='yellow')
+            for task_result in flaky_results:
+                put_flaky_task(task_result, self.timings.flake_rate(task_result.task))
+            newline()
+
+        # Print the resources used by the executed tasks
+        measured_results = [task_result for task_result in setup_task_results + task_results
+                            if getattr(task_result, 'resources', None)]
+        if measured_results:
+            click.secho('Resources', fg='blue')
+            for task_result in measured_results:
+                put_task_resources(task_result)
+            newline()
+
         # Print build time
         click.secho('Total runtime: %ss' %
                     round(sum(map(lambda task: task.time, task_results)), ndigits=2), fg='blue')
 
         # Print coverage
-        self.coverage()
+        coverage = self.coverage()
+
+        if self.log_dir:
+            click.secho('Task logs written to %s' % click.format_filename(self.log_dir), fg='blue')
+
+        if self.report_path:
+            wall_time = time.time() - self.start_time if self.start_time else None
+            write_report(self.report_path, build_report(task_results, setup_task_results,
+                                                        coverage=coverage, wall_time=wall_time,
+                                                        shard=self.shard))
+            click.secho('Report written to %s' % click.format_filename(self.report_path),
+                        fg='blue')
+
+        return bool(len(failures) == 0)
+
+
+class Build(object):
+    """
+    Run a build from python. Nothing is printed and the interpreter is never exited, the build
+    runs in its own thread and reports its progress as events:
+
+        build = Build('/path/to/project', jobs=4)
+        for event in build.events():
+            print(event.type, event.task)
+        result = build.result()
 
-        # Exit build with a message and a exit code
-        exit_build(bool(len(failures) == 0))
+    Build(path).run() runs the build and returns its result right away. Every build has its own
+    thread, so one process can drive many builds at the same time.
+    """
+
+    def __init__(self, path, setup=False, jobs=1, failfast=False, cache=False, log_dir=None,
+                 log_compression=None, config=None, environment=None):
+        """
+        The parameters are the ones of Runner, the friggfile is read right away
+
+        :raises BuildError: The working directory does not exist or the friggfile is invalid
+        """
+        self.queue = Queue()
+        self.runner = Runner(failfast=failfast, setup=setup, path=path, jobs=jobs, cache=cache,
+                             log_dir=log_dir, log_compression=log_compression, quiet=True,
+                             listener=self.queue.put, config=config, environment=environment)
+        self.thread = None
+        self.build_result = None
+        self.error = None
+
+    def start(self):
+        """
+        Start the build in the background, if it was not started yet
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.execute)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def execute(self):
+        try:
+            self.build_result = self.runner.build()
+        except Exception as exception:
+            self.error = exception
+        finally:
+            self.runner.timings.close()
+            # End of the events
+            self.queue.put(None)
+
+    def events(self):
+        """
+        Start the build and yield its events until it is done
+
+        :return: Iterator of Event tuples
+        """
+        self.start()
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            yield event
+
+    def result(self, timeout=None):
+        """
+        Start the build and wait for its result
+
+        :param timeout: Seconds to wait, None to wait until the build is done
+        :return: (BuildResult) The result, None if the build is still running after the timeout
+        :raises BuildError: The friggfile or the coverage report is invalid
+        """
+        self.start()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            return None
+        if self.error:
+            raise self.error
+        return self.build_result
+
+    def run(self):
+        """
+        Run the build and wait for its result
+
+        :return: (BuildResult) The result
+        """
+        return self.result()
+
+    def cancel(self):
+        """
+        Terminate the running tasks, tasks starting afterwards are killed right away and fail
+        """
+        self.runner.processes.terminate(close=True)
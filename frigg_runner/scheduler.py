@@ -0,0 +1,120 @@
+# -*- coding: utf8 -*-
+try:
+    from queue import Queue
+except ImportError:  # pragma: no cover
+    from Queue import Queue
+
+
+class Scheduler(object):
+    """
+    Run tasks as soon as all the tasks they depend on have succeeded.
+
+    Tasks are started in friggfile order. When tasks run concurrently and their expected
+    durations are known, the tasks heading the longest chain of remaining work are started first,
+    so the build does not end with one long task started last. Tasks depending on a failed or
+    skipped task are not executed, they are reported as skipped instead.
+    """
+
+    def __init__(self, tasks, execute, jobs=1, durations=None):
+        """
+        :param tasks: List of tasks from tasks.parse_tasks
+        :param execute: Function running a task and returning a result with a failed attribute
+        :param jobs: Number of tasks to run concurrently
+        :param durations: Expected duration in seconds for each task name, if known
+        """
+        self.tasks = tasks
+        self.execute = execute
+        self.jobs = max(jobs, 1)
+        self.durations = durations or {}
+        self.pool = None
+
+    def priorities(self):
+        """
+        Compute the expected duration of the longest chain of tasks starting with each task.
+        Tasks without a known duration are expected to take the average known duration.
+
+        :return: (dict) Priority for each task name
+        """
+        known = [duration for duration in self.durations.values() if duration is not None]
+        default = sum(known) / len(known) if known else 0
+        dependents = dict((task.name, []) for task in self.tasks)
+        for task in self.tasks:
+            for dependency in task.depends_on:
+                dependents[dependency].append(task.name)
+
+        priorities = {}
+
+        def priority(name):
+            if name not in priorities:
+                duration = self.durations.get(name)
+                priorities[name] = (default if duration is None else duration) + \
+                    max([priority(dependent) for dependent in dependents[name]] or [0])
+            return priorities[name]
+
+        for task in self.tasks:
+            priority(task.name)
+        return priorities
+
+    def run(self):
+        """
+        Run all tasks
+
+        :return: Generator of (task, result) tuples in the order the tasks finished. The result
+                 is None for skipped tasks.
+        """
+        pending = list(self.tasks)
+        if self.jobs > 1 and self.durations:
+            priorities = self.priorities()
+            pending.sort(key=lambda task: -priorities[task.name])
+        finished = {}
+        running = 0
+        results = Queue()
+
+        if self.jobs > 1:
+            from multiprocessing.pool import ThreadPool
+            self.pool = ThreadPool(self.jobs)
+
+        try:
+            while pending or running:
+                for task in list(pending):
+                    states = [finished.get(dependency) for dependency in task.depends_on]
+                    if None in states:
+                        continue
+
+                    if not all(states):
+                        pending.remove(task)
+                        finished[task.name] = False
+                        yield task, None
+                    elif running < self.jobs:
+                        pending.remove(task)
+                        running += 1
+                        if self.pool:
+                            self.pool.apply_async(self._execute, (task, results))
+                        else:
+                            results.put((task, self.execute(task), None))
+
+                if not running:
+                    continue
+
+                task, result, error = results.get()
+                running -= 1
+                if error is not None:
+                    raise error
+                finished[task.name] = bool(result is not None and not result.failed)
+                yield task, result
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stop scheduling, tasks already running in the pool are abandoned.
+        """
+        if self.pool:
+            self.pool.terminate()
+            self.pool = None
+
+    def _execute(self, task, results):
+        try:
+            results.put((task, self.execute(task), None))
+        except Exception as exception:
+            results.put((task, None, exception))
@@ -0,0 +1,211 @@
+# -*- coding: utf8 -*-
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from .cache import hash_file
+from .tasks import as_list
+from .utils import CACHE_DIRECTORY, IGNORED_DIRECTORIES, find_files
+
+
+def link_or_copy(source, destination):
+    """
+    Hardlink a file, or copy it when the destination is on another file system
+    """
+    try:
+        os.link(source, destination)
+    except OSError as error:
+        if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copy2(source, destination)
+
+
+def copy_tree(source, destination, copy_function=shutil.copy2):
+    """
+    Copy a directory tree, or a single file, keeping symlinks as they are
+
+    :param source: The path to copy
+    :param destination: The new path, its parent directory must exist
+    :param copy_function: Function copying a single file
+    """
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), destination)
+        return
+    if not os.path.isdir(source):
+        copy_function(source, destination)
+        return
+
+    os.mkdir(destination)
+    for name in os.listdir(source):
+        copy_tree(os.path.join(source, name), os.path.join(destination, name), copy_function)
+    shutil.copystat(source, destination)
+
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+class SetupSnapshot(object):
+    """
+    Snapshots of the directories created by the setup tasks, like a virtualenv or node_modules.
+
+    A snapshot is stored after the setup tasks succeeded and restored instead of running them
+    again as long as the setup tasks and the contents of the lockfiles are unchanged:
+
+        setup_cache:
+          paths:
+            - venv
+            - node_modules
+          lockfiles:
+            - requirements*.txt
+            - package.json
+
+    Snapshots are stored by copying and restored with hardlinks when possible. Before the setup
+    tasks run on top of restored paths, the hardlinks are replaced by copies so the tasks can
+    never write through to a snapshot.
+    """
+
+    def __init__(self, directory, paths, lockfiles=None):
+        """
+        :param directory: The project directory, the snapshots are stored inside it
+        :param paths: Paths created by the setup tasks, relative to the working directory
+        :param lockfiles: Glob patterns of the files deciding what the setup tasks install
+        """
+        self.directory = directory
+        self.paths = paths
+        self.lockfiles = lockfiles or []
+        self.path = os.path.join(directory, CACHE_DIRECTORY, 'setup')
+
+    @classmethod
+    def parse(cls, entry, directory):
+        """
+        Create a snapshot store from the setup_cache section of a friggfile
+
+        :param entry: The setup_cache mapping
+        :param directory: The project directory
+        :return: (SetupSnapshot) The snapshot store
+        """
+        if not isinstance(entry, dict) or not entry.get('paths'):
+            raise TypeError('setup_cache must be a mapping with a list of paths')
+        paths = as_list(entry['paths'])
+        for path in paths:
+            if os.path.isabs(path) or os.pardir in path.split('/'):
+                raise TypeError('setup_cache paths must be inside the working directory: %s' %
+                                path)
+        return cls(directory, paths, as_list(entry.get('lockfiles')))
+
+    def fingerprint(self, setup_tasks, env=None):
+        """
+        Hash of everything deciding the outcome of the setup tasks
+
+        :param setup_tasks: List of setup tasks
+        :param env: Environment variables set for the tasks by the runner
+        :return: The fingerprint as a hex string
+        """
+        digest = hashlib.sha1()
+        for task in setup_tasks:
+            digest.update(('\0task\0%s' % task.command).encode('utf8'))
+        for path in self.paths:
+            digest.update(('\0path\0%s' % path).encode('utf8'))
+        for path in find_files(self.directory, self.lockfiles, exclude=IGNORED_DIRECTORIES):
+            file_hash = hash_file(os.path.join(self.directory, path))
+            digest.update(('\0lockfile\0%s\0%s' % (path, file_hash)).encode('utf8'))
+        for name in sorted(env or {}):
+            digest.update(('\0env\0%s=%s' % (name, env[name])).encode('utf8'))
+        return digest.hexdigest()
+
+    def restore(self, fingerprint, target):
+        """
+        Replace the paths in the working directory with the snapshot
+
+        :param fingerprint: Fingerprint from SetupSnapshot.fingerprint
+        :param target: The working directory
+        :return: (list) Names, commands and durations of the setup tasks stored with the
+                 snapshot, None if there is no snapshot
+        """
+        snapshot = os.path.join(self.path, fingerprint)
+        try:
+            with open(os.path.join(snapshot, 'snapshot.json'), 'r') as file:
+                metadata = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        for path in self.paths:
+            remove_path(os.path.join(target, path))
+        for path in metadata['paths']:
+            destination = os.path.join(target, path)
+            if not os.path.isdir(os.path.dirname(destination)):
+                os.makedirs(os.path.dirname(destination))
+            copy_tree(os.path.join(snapshot, 'files', path), destination, link_or_copy)
+        return metadata['tasks']
+
+    def detach(self, target):
+        """
+        Replace hardlinked files in the paths of the working directory with copies
+
+        :param target: The working directory
+        """
+        for path in self.paths:
+            path = os.path.join(target, path)
+            file_paths = [path]
+            for root, _, filenames in os.walk(path):
+                file_paths.extend(os.path.join(root, filename) for filename in filenames)
+
+            for file_path in file_paths:
+                if (os.path.islink(file_path) or not os.path.isfile(file_path) or
+                        os.stat(file_path).st_nlink < 2):
+                    continue
+                temporary_path = '%s.frigg-detach' % file_path
+                shutil.copy2(file_path, temporary_path)
+                os.rename(temporary_path, file_path)
+
+    def save(self, fingerprint, target, task_results):
+        """
+        Store the paths of the working directory as a snapshot. The snapshot is assembled in a
+        temporary directory and renamed into place, concurrent builds never see a partial one.
+
+        :param fingerprint: Fingerprint from SetupSnapshot.fingerprint
+        :param target: The working directory
+        :param task_results: Results of the setup tasks
+        """
+        try:
+            os.makedirs(self.path)
+        except OSError:
+            if not os.path.isdir(self.path):
+                raise
+
+        temporary_path = tempfile.mkdtemp(dir=self.path)
+        try:
+            paths = []
+            for path in self.paths:
+                source = os.path.join(target, path)
+                if not os.path.lexists(source):
+                    continue
+                destination = os.path.join(temporary_path, 'files', path)
+                if not os.path.isdir(os.path.dirname(destination)):
+                    os.makedirs(os.path.dirname(destination))
+                copy_tree(source, destination)
+                paths.append(path)
+
+            with open(os.path.join(temporary_path, 'snapshot.json'), 'w') as file:
+                json.dump({
+                    'paths': paths,
+                    'tasks': [{'name': task_result.task, 'command': task_result.command,
+                               'time': task_result.time} for task_result in task_results],
+                }, file)
+
+            try:
+                os.rename(temporary_path, os.path.join(self.path, fingerprint))
+            except OSError:
+                # Another build stored the same snapshot first
+                if not os.path.isdir(os.path.join(self.path, fingerprint)):
+                    raise
+        finally:
+            if os.path.isdir(temporary_path):
+                shutil.rmtree(temporary_path)
@@ -0,0 +1,163 @@
+# -*- coding: utf8 -*-
+import io
+import os
+from collections import namedtuple
+
+from .process import ResourceUsage, split_command
+from .utils import IGNORED_DIRECTORIES, find_files, matches
+
+try:
+    from shlex import quote
+except ImportError:  # pragma: no cover
+    from pipes import quote
+
+# Test runners that can be split, with the glob patterns of their test files
+TEST_RUNNERS = {
+    'py.test': ['test_*.py', '*_test.py'],
+    'pytest': ['test_*.py', '*_test.py'],
+    'nosetests': ['test*.py', '*_test.py'],
+}
+
+# Number of buckets, glob patterns of the paths searched for test files and the test runner of a
+# split task
+Split = namedtuple('Split', ['count', 'files', 'runner'])
+
+
+def find_test_runner(command):
+    """
+    Name of the test runner of a command, like py.test for `python -m py.test -x`
+
+    :return: The name, None if the command is not a test runner that can be split
+    """
+    arguments = split_command(command) or []
+    if len(arguments) > 2 and os.path.basename(arguments[0]).startswith('python') and \
+            arguments[1] == '-m':
+        arguments = arguments[2:]
+    name = os.path.basename(arguments[0]) if arguments else None
+    return name if name in TEST_RUNNERS else None
+
+
+def parse_split(value, command):
+    """
+    Check the split setting of a task, either the number of buckets or a mapping with the number
+    of buckets and glob patterns of the paths searched for test files:
+
+        split: 4
+
+        split:
+          count: 4
+          files: tests/*
+
+    Only files named like the test files of the test runner are used, like test_*.py for
+    py.test. The test files are added to the command, which should not name any tests itself.
+
+    :param value: The value from the friggfile
+    :param command: The command of the task
+    :return: (Split) The split setting, None if the task is not split
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        value = {'count': value}
+    count = value.get('count')
+    if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+        raise TypeError('split must be a number of at least 1: %s' % count)
+
+    runner = find_test_runner(command)
+    if runner is None:
+        raise TypeError('split is only supported for %s commands without shell syntax: %s' %
+                        (', '.join(sorted(TEST_RUNNERS)), command))
+    files = value.get('files') or ['*']
+    return Split(count, files if isinstance(files, list) else [files], runner)
+
+
+def discover_tests(directory, split):
+    """
+    :param directory: The working directory of the task
+    :param split: The split setting of the task
+    :return: Sorted list of the test files, relative to the directory
+    """
+    return [path for path in find_files(directory, split.files, exclude=IGNORED_DIRECTORIES)
+            if matches(os.path.basename(path), TEST_RUNNERS[split.runner])]
+
+
+def partition(files, count, durations=None):
+    """
+    Divide test files into buckets with about the same runtime. The files are handed out longest
+    first to the bucket with the least work.
+
+    :param files: List of test files
+    :param count: The number of buckets
+    :param durations: Expected duration by file, unknown durations count as the average
+    :return: List of buckets, lists of files in the order of the files. Empty buckets are left
+             out.
+    """
+    durations = dict((path, duration) for path, duration in (durations or {}).items()
+                     if duration is not None)
+    known = [durations[path] for path in files if path in durations]
+    default = sum(known) / len(known) if known else 1
+
+    positions = dict((path, position) for position, path in enumerate(files))
+    loads = [0] * count
+    buckets = [[] for _ in range(count)]
+    for path in sorted(files, key=lambda path: (-durations.get(path, default), positions[path])):
+        bucket = loads.index(min(loads))
+        loads[bucket] += durations.get(path, default)
+        buckets[bucket].append(path)
+    return [sorted(bucket, key=positions.get) for bucket in buckets if bucket]
+
+
+def bucket_command(command, files):
+    """
+    The command of a task running only some of the test files
+    """
+    return ' '.join([command] + [quote(path) for path in files])
+
+
+def file_timing_name(name, path):
+    """
+    Name of a test file in the timing store
+    """
+    return '%s :: %s' % (name, path)
+
+
+def merge_results(buckets, results, spool):
+    """
+    Combine the results of the buckets of a split task into one task result
+
+    :param buckets: List of the files of every bucket
+    :param results: List of the results of the buckets
+    :param spool: OutputSpool receiving the output of every bucket, one after the other
+    :return: (Result) The result of the task, failed when one of the buckets failed
+    """
+    for number, (files, result) in enumerate(zip(buckets, results), 1):
+        spool.write('# Bucket %s/%s: %s test files, exit code %s\n' % (
+            number, len(buckets), len(files), result.exited))
+        output = getattr(result, 'output', None)
+        if output:
+            with io.open(output.path, encoding='utf8', errors='replace') as file:
+                for chunk in iter(lambda: file.read(65536), u''):
+                    spool.write(chunk)
+            output.discard()
+        else:
+            spool.write(result.stdout)
+        if spool.partial:
+            spool.write('\n')
+    spool.close()
+
+    failures = [result for result in results if result.exited != 0]
+    from invoke.runner import Result
+    merged = Result(spool.tail(), '', failures[0].exited if failures else 0, False)
+    merged.output = spool
+
+    usages = [result.resources for result in results if getattr(result, 'resources', None)]
+    if usages:
+        merged.resources = ResourceUsage(sum(usage.user_time for usage in usages),
+                                         sum(usage.system_time for usage in usages),
+                                         max(usage.max_rss for usage in usages),
+                                         sum(usage.block_input for usage in usages),
+                                         sum(usage.block_output for usage in usages))
+    merged.timeout = getattr(results[0], 'timeout', None)
+    merged.timed_out = any(getattr(result, 'timed_out', False) for result in results)
+    merged.inactive = any(getattr(result, 'inactive', False) for result in results)
+    return merged
@@ -0,0 +1,277 @@
+# -*- coding: utf8 -*-
+import copy
+
+from .split import parse_split
+from .utils import matches
+
+
+def as_list(value):
+    """
+    Settings taking a list also accept a single value
+    """
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        return [value]
+    return value
+
+
+def as_seconds(value, setting):
+    """
+    Check a duration setting
+
+    :param value: The value from the friggfile
+    :param setting: Name of the setting, used in the error message
+    :return: The duration in seconds, None if the setting is not set
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise TypeError('%s must be a positive number of seconds: %s' % (setting, value))
+    return value
+
+
+def as_count(value, setting):
+    """
+    Check a setting taking a number of times, like retries
+    """
+    if value is None:
+        return 0
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise TypeError('%s must be a number of at least 0: %s' % (setting, value))
+    return value
+
+
+class Task(object):
+    """
+    A single entry in the tasks or setup_tasks list of a friggfile.
+
+    Tasks are either plain commands or mappings with a command and optional settings:
+
+        tasks:
+          - name: install
+            command: pip install -e .
+          - name: lint
+            command: flake8
+            depends_on: install
+            inputs:
+              - '*.py'
+          - command: tox
+            timeout: 1800
+            inactivity_timeout: 300
+            retries: 2
+            retry_on_exit_codes: [1]
+          - command: py.test
+            split: 4
+
+    timeout is the number of seconds a task may run before it is terminated, tasks without output
+    for inactivity_timeout seconds are reported. Both default to the settings with the same names
+    at the top level of the friggfile. A failed task is run again up to retries times, only for
+    the listed exit codes when retry_on_exit_codes is set. The test files of a py.test, pytest or
+    nosetests task with split are divided into buckets running at the same time, see parse_split.
+    """
+
+    def __init__(self, command, name=None, depends_on=None, inputs=None, env=None, timeout=None,
+                 inactivity_timeout=None, retries=None, retry_on_exit_codes=None, split=None):
+        self.command = command
+        self.name = name or command
+        self.depends_on = as_list(depends_on)
+        self.inputs = as_list(inputs)
+        self.env = as_list(env)
+        self.timeout = as_seconds(timeout, 'timeout')
+        self.inactivity_timeout = as_seconds(inactivity_timeout, 'inactivity_timeout')
+        self.retries = as_count(retries, 'retries')
+        self.retry_on_exit_codes = as_list(retry_on_exit_codes)
+        for exit_code in self.retry_on_exit_codes:
+            if isinstance(exit_code, bool) or not isinstance(exit_code, int):
+                raise TypeError('retry_on_exit_codes must be a list of exit codes: %s' %
+                                retry_on_exit_codes)
+        self.split = parse_split(split, command)
+
+    def __repr__(self):
+        return '<Task: %s>' % self.name
+
+    @classmethod
+    def parse(cls, entry):
+        """
+        Create a task from a friggfile entry
+
+        :param entry: A command string or a mapping with a command key
+        :return: (Task) The parsed task
+        """
+        if isinstance(entry, cls):
+            return entry
+        if isinstance(entry, dict):
+            if 'command' not in entry:
+                raise TypeError('Task is missing a command: %s' % entry)
+            return cls(entry['command'], name=entry.get('name'),
+                       depends_on=entry.get('depends_on'), inputs=entry.get('inputs'),
+                       env=entry.get('env'), timeout=entry.get('timeout'),
+                       inactivity_timeout=entry.get('inactivity_timeout'),
+                       retries=entry.get('retries'),
+                       retry_on_exit_codes=entry.get('retry_on_exit_codes'),
+                       split=entry.get('split'))
+        return cls(entry)
+
+
+def parse_tasks(entries):
+    """
+    Parse a list of friggfile entries and check that the dependencies are valid. Names given in
+    the friggfile must be unique, a command listed more than once without a name gets a number,
+    like "tox #2".
+
+    :param entries: List of command strings or task mappings
+    :return: List of tasks in friggfile order
+    """
+    tasks = [Task.parse(entry) for entry in entries]
+    named = [isinstance(entry, Task) or isinstance(entry, dict) and entry.get('name') is not None
+             for entry in entries]
+
+    names = set()
+    for task, is_named in zip(tasks, named):
+        if is_named:
+            if task.name in names:
+                raise TypeError('Duplicate task name: %s' % task.name)
+            names.add(task.name)
+    for task, is_named in zip(tasks, named):
+        if not is_named:
+            name, number = task.name, 1
+            while name in names:
+                number += 1
+                name = '%s #%s' % (task.name, number)
+            task.name = name
+            names.add(name)
+
+    for task in tasks:
+        for dependency in task.depends_on:
+            if dependency not in names:
+                raise TypeError('Task %s depends on unknown task %s' % (task.name, dependency))
+
+    # Depth first search for cycles
+    dependencies = dict((task.name, task.depends_on) for task in tasks)
+    visited = set()
+
+    def visit(name, path):
+        if name in path:
+            raise TypeError('Circular task dependency: %s' % ' -> '.join(path + [name]))
+        if name not in visited:
+            for dependency in dependencies[name]:
+                visit(dependency, path + [name])
+            visited.add(name)
+
+    for task in tasks:
+        visit(task.name, [])
+
+    return tasks
+
+
+def dependents(tasks, names):
+    """
+    Extend a set of task names with every task depending on them, directly or indirectly
+    """
+    names = set(names)
+    added = True
+    while added:
+        added = False
+        for task in tasks:
+            if task.name not in names and names.intersection(task.depends_on):
+                names.add(task.name)
+                added = True
+    return names
+
+
+def dependencies(tasks, names):
+    """
+    Extend a set of task names with every task they depend on, directly or indirectly
+    """
+    depends_on = dict((task.name, task.depends_on) for task in tasks)
+    names = set(names)
+    pending = list(names)
+    while pending:
+        for dependency in depends_on.get(pending.pop(), []):
+            if dependency not in names:
+                names.add(dependency)
+                pending.append(dependency)
+    return names
+
+
+def select_tasks(tasks, names):
+    """
+    Restrict a task list to the given names. Dependencies on tasks that are left out are dropped,
+    they are assumed to be satisfied already.
+
+    :param tasks: List of tasks
+    :param names: Names of the tasks to keep
+    :return: List of copies of the selected tasks in the original order
+    """
+    selected = []
+    for task in tasks:
+        if task.name in names:
+            task = copy.copy(task)
+            task.depends_on = [name for name in task.depends_on if name in names]
+            selected.append(task)
+    return selected
+
+
+def affected_tasks(tasks, paths):
+    """
+    Find the tasks affected by changed files: tasks with an input matching one of the paths,
+    tasks without declared inputs and every task depending on those.
+
+    :param tasks: List of tasks
+    :param paths: Changed paths relative to the working directory
+    :return: List of affected tasks
+    """
+    names = [task.name for task in tasks
+             if not task.inputs or any(matches(path, task.inputs) for path in paths)]
+    return select_tasks(tasks, dependents(tasks, names))
+
+
+def shard_tasks(tasks, index, count, durations=None):
+    """
+    Select the tasks of one shard, when a build is split over count runner invocations. Tasks
+    connected through depends_on stay in the same shard. Groups of tasks are handed out longest
+    first to the shard with the least work, so every invocation gets the same partition as long
+    as it has the same tasks and durations.
+
+    :param tasks: List of tasks
+    :param index: The shard to select, from 1 to count
+    :param count: The number of shards
+    :param durations: Expected duration by task name, unknown durations count as the average
+    :return: List of the tasks in the shard
+    """
+    durations = dict((name, duration) for name, duration in (durations or {}).items()
+                     if duration is not None)
+    known = [durations[task.name] for task in tasks if task.name in durations]
+    default = sum(known) / len(known) if known else 1
+
+    # Connected groups of tasks, keyed by the first task of the group in friggfile order
+    groups = dict((task.name, task.name) for task in tasks)
+
+    def find(name):
+        while groups[name] != name:
+            name = groups[name]
+        return name
+
+    positions = dict((task.name, position) for position, task in enumerate(tasks))
+    for task in tasks:
+        for dependency in task.depends_on:
+            first, second = sorted([find(task.name), find(dependency)], key=positions.get)
+            groups[second] = first
+
+    members = {}
+    for task in tasks:
+        members.setdefault(find(task.name), []).append(task.name)
+
+    weights = dict((group, sum(durations.get(name, default) for name in names))
+                   for group, names in members.items())
+
+    loads = [0] * count
+    selected = set()
+    for group in sorted(members, key=lambda group: (-weights[group], positions[group])):
+        shard = loads.index(min(loads))
+        loads[shard] += weights[group]
+        if shard == index - 1:
+            selected.update(members[group])
+
+    return select_tasks(tasks, selected)
@@ -0,0 +1,120 @@
+# -*- coding: utf8 -*-
+import os
+import threading
+import time
+
+from .utils import CACHE_DIRECTORY
+
+# Number of recent successful runs used for the expected duration of a task
+HISTORY_SIZE = 10
+
+
+class TimingStore(object):
+    """
+    Task durations of previous builds, stored in a SQLite database inside the project. The store
+    can be shared by the threads running matrix cells.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: The project directory
+        """
+        self.path = os.path.join(directory, CACHE_DIRECTORY, 'timings.sqlite')
+        self.connection = None
+        self.lock = threading.RLock()
+
+    def connect(self):
+        """
+        Open the database, creating it if needed.
+
+        :return: The connection, None if the database can not be used
+        """
+        with self.lock:
+            if self.connection is None:
+                try:
+                    import sqlite3
+                except ImportError:  # pragma: no cover
+                    return None
+                try:
+                    if not os.path.isdir(os.path.dirname(self.path)):
+                        os.makedirs(os.path.dirname(self.path))
+                    connection = sqlite3.connect(self.path, check_same_thread=False)
+                    connection.execute('CREATE TABLE IF NOT EXISTS durations ('
+                                       'task TEXT NOT NULL, command TEXT NOT NULL, '
+                                       'duration REAL NOT NULL, success INTEGER NOT NULL, '
+                                       'created REAL NOT NULL)')
+                    connection.execute('CREATE INDEX IF NOT EXISTS durations_task '
+                                       'ON durations (task, created)')
+                    # Databases created before retries existed have no attempt column
+                    columns = [row[1] for row in connection.execute('PRAGMA table_info(durations)')]
+                    if 'attempt' not in columns:
+                        connection.execute('ALTER TABLE durations '
+                                           'ADD COLUMN attempt INTEGER NOT NULL DEFAULT 1')
+                    self.connection = connection
+                except (OSError, sqlite3.Error):
+                    self.connection = None
+            return self.connection
+
+    def record(self, task, command, duration, success, attempt=1):
+        """
+        Append the duration of a task run
+
+        :param task: The task name
+        :param command: The command of the task
+        :param duration: Runtime in seconds
+        :param success: True if the task succeeded
+        :param attempt: The attempt number when the task is retried
+        """
+        with self.lock:
+            connection = self.connect()
+            if connection:
+                with connection:
+                    connection.execute('INSERT INTO durations (task, command, duration, success, '
+                                       'created, attempt) VALUES (?, ?, ?, ?, ?, ?)',
+                                       (task, command, duration, int(success), time.time(),
+                                        attempt))
+
+    def expected(self, task):
+        """
+        Expected duration of a task, the median of the recent successful runs.
+
+        :param task: The task name
+        :return: Duration in seconds, None if the task has no successful runs
+        """
+        with self.lock:
+            connection = self.connect()
+            if not connection:
+                return None
+            durations = sorted(row[0] for row in connection.execute(
+                'SELECT duration FROM durations WHERE task = ? AND success = 1 '
+                'ORDER BY created DESC LIMIT ?', (task, HISTORY_SIZE)))
+        if not durations:
+            return None
+        middle = len(durations) // 2
+        if len(durations) % 2:
+            return durations[middle]
+        return (durations[middle - 1] + durations[middle]) / 2.0
+
+    def flake_rate(self, task):
+        """
+        Share of the recent successful runs of a task that only succeeded after a retry
+
+        :param task: The task name
+        :return: Flake rate from 0 to 1, None if the task has no successful runs
+        """
+        with self.lock:
+            connection = self.connect()
+            if not connection:
+                return None
+            attempts = [row[0] for row in connection.execute(
+                'SELECT attempt FROM durations WHERE task = ? AND success = 1 '
+                'ORDER BY created DESC LIMIT ?', (task, HISTORY_SIZE))]
+        if not attempts:
+            return None
+        return len([attempt for attempt in attempts if attempt > 1]) / float(len(attempts))
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
@@ -1,10 +1,68 @@
 # -*- coding: utf8 -*-
 
+import fnmatch
+import os
 import sys
 import time
 
 import click
 
+# Directory inside the project where the runner keeps its caches
+CACHE_DIRECTORY = '.frigg-cache'
+
+# Directories of version control, tools and dependencies, never searched for test files, task
+# inputs or lockfiles and never watched for changes
+IGNORED_DIRECTORIES = ('.git', '.hg', '.tox', '.eggs', '.venv', CACHE_DIRECTORY, '__pycache__',
+                       'build', 'dist', 'node_modules', 'venv')
+
+# A task is slower than usual when it takes this many times its expected duration, and at least
+# SLOWDOWN_MIN_SECONDS longer.
+SLOWDOWN_FACTOR = 1.5
+SLOWDOWN_MIN_SECONDS = 1
+
+
+class FileSystemWrapper(object):
+    """
+    Gives frigg_settings access to the friggfile, with the same interface as
+    frigg_settings.FileSystemWrapper. It is defined here so the settings library is only imported
+    when the friggfile is read.
+    """
+
+    def list_files(self, path):
+        try:
+            return [name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name))]
+        except OSError:
+            return []
+
+    def read_file(self, path):
+        with open(path) as file:
+            return file.read()
+
+    def file_exist(self, path):
+        return os.path.isfile(path)
+
+
+class HiddenProgressbar(object):
+    """
+    Stand-in for click.progressbar when no progress should be shown
+    """
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+
+    def __enter__(self):
+        return self.iterable
+
+    def __exit__(self, *args):
+        pass
+
+
+def progressbar(iterable, length, label, item_show_func):
+    if label is None:
+        return HiddenProgressbar(iterable)
+    return click.progressbar(iterable, length=length, label=label.ljust(20), show_eta=False,
+                             item_show_func=item_show_func)
+
 
 def timeit(function):
     def wrapper(*args, **kwargs):
@@ -32,9 +90,85 @@ def newline():
     click.echo('', nl=True)
 
 
+def is_slower(duration, expected):
+    """
+    Check if a task took significantly longer than its expected duration
+    """
+    return (duration > expected * SLOWDOWN_FACTOR and
+            duration - expected >= SLOWDOWN_MIN_SECONDS)
+
+
 def put_task_result(task_result, color, setup=False):
+    notes = []
+    if getattr(task_result, 'timed_out', False):
+        notes.append('(timed out after %s%s)' % (task_result.timeout, 's'))
+    elif getattr(task_result, 'inactive', False):
+        notes.append('(inactive)')
+    if getattr(task_result, 'cached_time', None) is not None:
+        notes.append('(cached, %s%s)' % (round(task_result.cached_time, ndigits=2), 's'))
+    expected_time = getattr(task_result, 'expected_time', None)
+    if expected_time is not None:
+        notes.append('(expected %s%s)' % (round(expected_time, ndigits=2), 's'))
+        if is_slower(task_result.time, expected_time):
+            notes.append('(slower than usual)')
+    attempts = getattr(task_result, 'attempts', None)
+    if attempts and len(attempts) > 1:
+        notes.append('(%s attempts)' % len(attempts))
+    if setup:
+        notes.append('(setup task)')
     click.secho('  # %s (%s%s) %s' % (task_result.task, round(task_result.time, ndigits=2), 's',
-                                      ('(setup task)' if setup else '')), fg=color)
+                                      ' '.join(notes)), fg=color)
+
+
+def put_task_output(task_result):
+    click.echo(task_result.stdout)
+    click.echo(task_result.stderr, err=True)
+    output = getattr(task_result, 'output', None)
+    if output and output.truncated:
+        click.secho('Showing the last %s lines, the complete output is in %s' %
+                    (len(output.lines), output.path), fg='yellow')
+    elif output and output.persistent:
+        click.secho('The output is in %s' % output.path, fg='yellow')
+
+
+def put_task_resources(task_result):
+    resources = task_result.resources
+    cpu_time = resources.user_time + resources.system_time
+    cpu_usage = int(round(cpu_time / task_result.time * 100)) if task_result.time else 0
+    click.echo('  # %s: %s%% cpu (%ss user, %ss sys), %sMB peak rss, %s blocks in, '
+               '%s blocks out' % (task_result.task, cpu_usage,
+                                  round(resources.user_time, ndigits=2),
+                                  round(resources.system_time, ndigits=2),
+                                  round(resources.max_rss / 1024.0, ndigits=1),
+                                  resources.block_input, resources.block_output))
+
+
+def put_flaky_task(task_result, flake_rate):
+    attempt_times = ', '.join('%s%s' % (round(attempt['time'], ndigits=2), 's')
+                              for attempt in task_result.attempts)
+    message = '  # %s passed on attempt %s (%s)' % (task_result.task, len(task_result.attempts),
+                                                    attempt_times)
+    if flake_rate is not None:
+        message += ', flake rate %s%% in recent builds' % int(round(flake_rate * 100))
+    click.secho(message, fg='yellow')
+
+
+def put_skipped_task(task_result, setup=False):
+    click.secho('  # %s (skipped) %s' % (task_result.task, ('(setup task)' if setup else '')),
+                fg='yellow')
+
+
+def put_unaffected_task(name):
+    click.secho('  # %s (not affected by the changes)' % name, fg='yellow')
+
+
+def task_name(task, cell=None):
+    """
+    Name of a task in the results, tasks of matrix builds include the name of the cell
+    """
+    if cell is None:
+        return task.name
+    return '%s [%s]' % (task.name, cell.name)
 
 
 def print_task(task):
@@ -42,3 +176,31 @@ def print_task(task):
         return ':  %s' % task
     else:
         return ''
+
+
+def matches(path, patterns):
+    """
+    Check if a relative path matches one of the glob patterns. A * in the patterns also matches
+    the directory separator, src/*.py matches every python file in the src directory tree.
+    """
+    path = path.replace(os.sep, '/')
+    return any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+
+def find_files(directory, patterns, exclude=('.git', CACHE_DIRECTORY)):
+    """
+    List the files in the directory tree matching one of the glob patterns
+
+    :param directory: The root directory
+    :param patterns: List of glob patterns relative to the root directory
+    :param exclude: Directory names that are never searched
+    :return: Sorted list of relative paths
+    """
+    files = []
+    for root, directories, filenames in os.walk(directory):
+        directories[:] = [name for name in directories if name not in exclude]
+        for filename in filenames:
+            path = os.path.relpath(os.path.join(root, filename), directory)
+            if matches(path, patterns):
+                files.append(path.replace(os.sep, '/'))
+    return sorted(files)
@@ -0,0 +1,114 @@
+# -*- coding: utf8 -*-
+import os
+import subprocess
+import time
+
+from .utils import CACHE_DIRECTORY, IGNORED_DIRECTORIES
+
+# Seconds between two scans of the working directory
+POLL_INTERVAL = 0.5
+
+# Changes are collected until the directory has been quiet for this many seconds, so saving many
+# files at once, or a checkout, triggers a single build.
+DEBOUNCE_PERIOD = 0.3
+
+
+class Watcher(object):
+    """
+    Detects changed files in a directory tree.
+
+    The directory is scanned by polling file modification times, which works on every platform
+    without native file system notification bindings.
+    """
+
+    def __init__(self, directory, exclude=IGNORED_DIRECTORIES, interval=POLL_INTERVAL,
+                 debounce=DEBOUNCE_PERIOD):
+        self.directory = directory
+        self.exclude = exclude
+        self.interval = interval
+        self.debounce = debounce
+        self.state = self.snapshot()
+
+    def snapshot(self):
+        """
+        :return: (dict) Modification time and size of every file by relative path
+        """
+        state = {}
+        for root, directories, filenames in os.walk(self.directory):
+            directories[:] = [name for name in directories if name not in self.exclude]
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                relative_path = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                state[relative_path] = (stat.st_mtime, stat.st_size)
+        return state
+
+    def changes(self):
+        """
+        Scan the directory once
+
+        :return: (set) Paths created, changed or removed since the last scan
+        """
+        state = self.snapshot()
+        changed = set(path for path in state if self.state.get(path) != state[path])
+        changed.update(path for path in self.state if path not in state)
+        self.state = state
+        return changed
+
+    def wait(self):
+        """
+        Block until files change and the directory has been quiet for the debounce period
+
+        :return: (set) The changed paths
+        """
+        changed = set()
+        while not changed:
+            time.sleep(self.interval)
+            changed = self.changes()
+
+        while True:
+            time.sleep(self.debounce)
+            more = self.changes()
+            if not more:
+                return changed
+            changed.update(more)
+
+
+def git_output(arguments, directory):
+    """
+    :return: (str) The output of a git command
+    :raises ValueError: git failed, the message is the error printed by git
+    """
+    process = subprocess.Popen(['git'] + arguments, cwd=directory, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise ValueError(stderr.decode('utf8', 'replace').strip() or
+                         'git %s exited with %s' % (arguments[0], process.returncode))
+    return stdout.decode('utf8', 'replace')
+
+
+def changed_since(directory, revision, exclude=()):
+    """
+    Files changed since a git revision, like the target branch of a pull request: files changed
+    by the commits since the merge base of the revision and HEAD, uncommitted changes and
+    untracked files. The files of the runner in CACHE_DIRECTORY are no changes.
+
+    :param directory: The working directory, inside a git repository
+    :param revision: The git revision
+    :param exclude: Relative paths of more files and directories written by the runner, like the
+                    build report
+    :return: (set) Paths relative to the working directory, files outside of it are left out
+    :raises OSError: git is not installed
+    :raises ValueError: The directory is not in a git repository or the revision is unknown
+    """
+    base = git_output(['merge-base', revision, 'HEAD'], directory).strip()
+    changed = git_output(['diff', '--name-only', '--relative', '-z', base], directory)
+    untracked = git_output(['ls-files', '--others', '--exclude-standard', '-z'], directory)
+    exclude = [CACHE_DIRECTORY] + [path.replace(os.sep, '/').rstrip('/') for path in exclude]
+    return set(path for path in (changed + untracked).split('\0')
+               if path and not any(path == excluded or path.startswith(excluded + '/')
+                                   for excluded in exclude))
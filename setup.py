@@ -51,9 +51,16 @@ setup(
                  'frigg-runner'},
     include_package_data=True,
     entry_points={
-        "console_scripts": ['frigg = frigg_runner.cli:main']
+        "console_scripts": [
+            'frigg = frigg_runner.cli:main',
+            'frigg-merge = frigg_runner.cli:merge',
+            'frigg-daemon = frigg_runner.cli:daemon',
+        ]
     },
     install_requires=requirements,
+    extras_require={
+        'zstd': ['zstandard'],
+    },
     license="MIT",
     zip_safe=False,
     keywords='frigg-runner',
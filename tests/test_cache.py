@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from invoke.runner import Result
+
+from frigg_runner.cache import RecordingFileSystemWrapper, ResultCache, SettingsCache, hash_file
+from frigg_runner.tasks import Task
+
+
+class ResultCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResultCache(self.directory)
+        self.write('setup.py', 'setup()')
+        self.write('src/module.py', 'pass')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        path = os.path.join(self.directory, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as file:
+            file.write(content)
+
+    def test_hash_file(self):
+        self.assertEqual(hash_file(os.path.join(self.directory, 'setup.py')),
+                         hashlib.sha1(b'setup()').hexdigest())
+        self.assertNotEqual(hash_file(os.path.join(self.directory, 'setup.py')),
+                            hash_file(os.path.join(self.directory, 'src/module.py')))
+
+    def test_key_without_inputs(self):
+        self.assertIsNone(self.cache.key(Task('flake8')))
+
+    def test_key_changes_with_inputs(self):
+        task = Task('flake8', inputs=['*.py'])
+        key = self.cache.key(task)
+        self.assertEqual(key, self.cache.key(task))
+
+        self.write('src/module.py', 'import os')
+        self.assertNotEqual(key, self.cache.key(task))
+
+    def test_key_ignores_other_files(self):
+        task = Task('flake8', inputs=['src/*.py'])
+        key = self.cache.key(task)
+        self.write('setup.py', 'setup(name="frigg")')
+        self.assertEqual(key, self.cache.key(task))
+
+    def test_key_ignores_dependencies(self):
+        task = Task('flake8', inputs=['*.py'])
+        key = self.cache.key(task)
+        for path in ('venv/lib/site.py', 'node_modules/package/index.py', '.tox/py27/setup.py'):
+            self.write(path, 'import os')
+        self.assertEqual(key, self.cache.key(task))
+
+    def test_key_changes_with_command(self):
+        self.assertNotEqual(self.cache.key(Task('flake8', inputs=['*.py'])),
+                            self.cache.key(Task('isort', inputs=['*.py'])))
+
+    def test_key_changes_with_environment(self):
+        task = Task('flake8', inputs=['*.py'], env=['FRIGG_CACHE_TEST'])
+        os.environ['FRIGG_CACHE_TEST'] = '1'
+        try:
+            key = self.cache.key(task)
+            os.environ['FRIGG_CACHE_TEST'] = '2'
+            self.assertNotEqual(key, self.cache.key(task))
+        finally:
+            del os.environ['FRIGG_CACHE_TEST']
+
+    def test_key_changes_with_runner_environment(self):
+        task = Task('flake8', inputs=['*.py'])
+        self.assertNotEqual(self.cache.key(task, env={'PYTHON': 'python2.7'}),
+                            self.cache.key(task, env={'PYTHON': 'python3.4'}))
+
+    @mock.patch.dict('os.environ', {'FRIGG_CACHE_TEST': 'daemon'})
+    def test_key_of_client_environment(self):
+        task = Task('flake8', inputs=['*.py'], env=['FRIGG_CACHE_TEST'])
+        key = self.cache.key(task, environment={'FRIGG_CACHE_TEST': '1'})
+        self.assertEqual(key, self.cache.key(task, environment={'FRIGG_CACHE_TEST': '1'}))
+        self.assertNotEqual(key, self.cache.key(task, environment={'FRIGG_CACHE_TEST': '2'}))
+        self.assertNotEqual(key, self.cache.key(task))
+        self.assertEqual(self.cache.key(task, env={'FRIGG_CACHE_TEST': '1'}, environment={}), key)
+
+    def test_set_and_get(self):
+        self.assertIsNone(self.cache.get('key'))
+
+        self.cache.set('key', Result('out', 'err', 0, True), 2.5)
+        result = self.cache.get('key')
+        self.assertEqual(result.stdout, 'out')
+        self.assertEqual(result.stderr, 'err')
+        self.assertTrue(result.ok)
+        self.assertEqual(result.cached_time, 2.5)
+
+    def test_set_read_only_directory(self):
+        with mock.patch('tempfile.mkstemp', side_effect=OSError(13, 'Permission denied')):
+            self.cache.set('key', Result('out', 'err', 0, True), 2.5)
+        self.assertIsNone(self.cache.get('key'))
+
+        # The cache directory can not be created
+        shutil.rmtree(os.path.join(self.directory, '.frigg-cache'))
+        self.write('.frigg-cache', '')
+        self.cache.set('key', Result('out', 'err', 0, True), 2.5)
+        self.assertIsNone(self.cache.get('key'))
+
+        # Nothing is left behind when writing the entry fails
+        os.remove(os.path.join(self.directory, '.frigg-cache'))
+        with mock.patch('json.dump', side_effect=IOError(28, 'No space left on device')):
+            self.cache.set('key', Result('out', 'err', 0, True), 2.5)
+        self.assertEqual(os.listdir(self.cache.path), [])
+
+
+class SettingsCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SettingsCache(self.directory)
+        self.write('.frigg.yml', 'tasks:\n  - tox\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        with open(os.path.join(self.directory, path), 'w') as file:
+            file.write(content)
+
+    def build_settings(self):
+        """
+        Look at the files like frigg_settings does
+        """
+        wrapper = RecordingFileSystemWrapper()
+        for name in ('.frigg.yml', '.frigg.yaml'):
+            if wrapper.file_exist(os.path.join(self.directory, name)):
+                wrapper.read_file(os.path.join(self.directory, name))
+        wrapper.list_files(self.directory)
+        self.cache.set(wrapper.dependencies, {'tasks': ['tox']})
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get())
+        self.build_settings()
+        self.assertEqual(self.cache.get(), {'tasks': ['tox']})
+
+    def test_changed_friggfile(self):
+        self.build_settings()
+        self.write('.frigg.yml', 'tasks:\n  - flake8\n')
+        self.assertIsNone(self.cache.get())
+
+    def test_new_files(self):
+        self.build_settings()
+        self.write('.frigg.yaml', 'tasks:\n  - flake8\n')
+        self.assertIsNone(self.cache.get())
+
+    def test_new_version(self):
+        self.build_settings()
+        with mock.patch('frigg_runner.cache.__version__', '0.0.1'):
+            self.assertIsNone(self.cache.get())
+
+    def test_set_unsupported_settings(self):
+        dependencies = [['exists', os.path.join(self.directory, '.frigg.yml'), True]]
+        self.cache.set(dependencies, {'tasks': ['tox'], 'matrix': {1: 'one'}})
+        self.cache.set(dependencies, {'tasks': [object()]})
+        self.cache.set([], {'tasks': ['tox']})
+        self.assertIsNone(self.cache.get())
+
+    def test_set_read_only_directory(self):
+        dependencies = [['exists', os.path.join(self.directory, '.frigg.yml'), True]]
+        with mock.patch('tempfile.mkstemp', side_effect=OSError(13, 'Permission denied')):
+            self.cache.set(dependencies, {'tasks': ['tox']})
+        self.assertIsNone(self.cache.get())
+
+        # The cache directory can not be created
+        os.rmdir(os.path.join(self.directory, '.frigg-cache'))
+        self.write('.frigg-cache', '')
+        self.cache.set(dependencies, {'tasks': ['tox']})
+        self.assertIsNone(self.cache.get())
@@ -1,10 +1,39 @@
 # -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
 import mock
 from click.testing import CliRunner
+from invoke.runner import Result
 
-from frigg_runner.cli import main
+from frigg_runner.cli import main, merge
+from frigg_runner.daemon import DaemonError
+from frigg_runner.report import build_report, write_report
+
+# Modules that are only imported when a build needs them
+LAZY_MODULES = ['frigg_coverage', 'frigg_settings', 'invoke', 'multiprocessing.pool', 'sqlite3',
+                'xml.etree.ElementTree', 'yaml']
+
+DEFAULT_OPTIONS = {
+    'failfast': False,
+    'verbose': False,
+    'path': None,
+    'setup': False,
+    'jobs': 1,
+    'cache': False,
+    'report': None,
+    'watch': False,
+    'shard': None,
+    'durations': None,
+    'changed_since': None,
+    'log_dir': None,
+    'log_compression': None,
+    'settings_cache': True,
+}
 
 
 @mock.patch('frigg_runner.cli.Runner')
@@ -18,46 +47,169 @@ class CLITests(unittest.TestCase):
 
     def test_run(self, mock_runner):
         self.runner.invoke(main)
-        mock_runner.assert_called_once_with(
-            failfast=False,
-            verbose=False,
-            path=None,
-            setup=False
-        )
+        mock_runner.assert_called_once_with(**DEFAULT_OPTIONS)
 
     def test_run_with_failfast(self, mock_runner):
         self.runner.invoke(main, ['--failfast'])
-        mock_runner.assert_called_once_with(
-            failfast=True,
-            verbose=False,
-            path=None,
-            setup=False
-        )
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, failfast=True))
 
     def test_run_with_verbose(self, mock_runner):
         self.runner.invoke(main, ['--verbose'])
-        mock_runner.assert_called_once_with(
-            failfast=False,
-            verbose=True,
-            path=None,
-            setup=False,
-        )
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, verbose=True))
 
     def test_run_with_path(self, mock_runner):
         self.runner.invoke(main, ['--path', '/tmp'])
-        mock_runner.assert_called_once_with(failfast=False, verbose=False, path='/tmp', setup=False)
-        mock_runner.assert_called_once_with(
-            failfast=False,
-            verbose=False,
-            path='/tmp',
-            setup=False,
-        )
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, path='/tmp'))
 
     def test_run_with_setup(self, mock_runner):
         self.runner.invoke(main, ['--setup'])
-        mock_runner.assert_called_once_with(
-            failfast=False,
-            verbose=False,
-            path=None,
-            setup=True,
-        )
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, setup=True))
+
+    def test_run_with_jobs(self, mock_runner):
+        self.runner.invoke(main, ['--jobs', '4'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, jobs=4))
+
+    def test_run_with_invalid_jobs(self, mock_runner):
+        result = self.runner.invoke(main, ['--jobs', '0'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertFalse(mock_runner.called)
+
+    def test_run_with_cache(self, mock_runner):
+        self.runner.invoke(main, ['--cache'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, cache=True))
+
+    def test_run_with_report(self, mock_runner):
+        self.runner.invoke(main, ['--report', 'report.xml'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, report='report.xml'))
+
+    def test_run_with_watch(self, mock_runner):
+        self.runner.invoke(main, ['--watch'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, watch=True))
+
+    def test_run_with_shard(self, mock_runner):
+        self.runner.invoke(main, ['--shard', '2/4'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, shard=(2, 4)))
+
+    def test_run_with_invalid_shard(self, mock_runner):
+        for shard in ('2', '0/4', '5/4', 'a/b'):
+            result = self.runner.invoke(main, ['--shard', shard])
+            self.assertNotEqual(result.exit_code, 0)
+        self.assertFalse(mock_runner.called)
+
+    def test_run_with_durations(self, mock_runner):
+        self.runner.invoke(main, ['--durations', __file__])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, durations=__file__))
+
+    def test_run_with_changed_since(self, mock_runner):
+        self.runner.invoke(main, ['--changed-since', 'origin/master'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS,
+                                                   changed_since='origin/master'))
+
+    def test_run_with_log_dir(self, mock_runner):
+        self.runner.invoke(main, ['--log-dir', 'logs', '--log-compression', 'gzip'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, log_dir='logs',
+                                                   log_compression='gzip'))
+
+    def test_run_without_settings_cache(self, mock_runner):
+        self.runner.invoke(main, ['--no-settings-cache'])
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, settings_cache=False))
+
+    def test_run_with_daemon_unsupported_options(self, mock_runner):
+        result = self.runner.invoke(main, ['--daemon', '--watch', '--changed-since', 'HEAD'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('--watch, --changed-since', result.output)
+        self.assertFalse(mock_runner.called)
+
+    @mock.patch('frigg_runner.daemon.connect',
+                side_effect=DaemonError('/tmp/frigg.sock is not a socket of the current user'))
+    def test_run_with_daemon_of_other_user(self, mock_connect, mock_runner):
+        result = self.runner.invoke(main, ['--daemon'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('is not a socket of the current user', result.output)
+        self.assertFalse(mock_runner.called)
+
+    @mock.patch('frigg_runner.daemon.connect', return_value=None)
+    def test_run_with_daemon_not_running(self, mock_connect, mock_runner):
+        result = self.runner.invoke(main, ['--daemon', '--jobs', '2'])
+        self.assertIn('No daemon running', result.output)
+        mock_runner.assert_called_once_with(**dict(DEFAULT_OPTIONS, jobs=2))
+
+    @mock.patch.dict('sys.modules', {'zstandard': None})
+    def test_run_with_zstd_missing(self, mock_runner):
+        result = self.runner.invoke(main, ['--log-dir', 'logs', '--log-compression', 'zstd'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('zstandard', result.output)
+        self.assertFalse(mock_runner.called)
+
+
+class StartupTests(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, frigg_runner.cli; print(" ".join(sorted(sys.modules)))'
+        ], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        modules = output.decode('utf8').split()
+        self.assertEqual([module for module in LAZY_MODULES if module in modules], [])
+
+
+class MergeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CliRunner()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_shard(self, index, count, exited=0):
+        result = Result('', '', exited, False)
+        result.task = 'task %s' % index
+        result.time = 1
+        path = os.path.join(self.directory, 'shard-%s.json' % index)
+        write_report(path, build_report([result], [], wall_time=1, shard=(index, count)))
+        return path
+
+    def test_merge(self):
+        paths = [self.write_shard(1, 2), self.write_shard(2, 2)]
+        output = os.path.join(self.directory, 'report.xml')
+        result = self.runner.invoke(merge, paths + ['--report', output])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('task 2', result.output)
+        self.assertTrue(os.path.exists(output))
+
+    def test_merge_failure(self):
+        result = self.runner.invoke(merge, [self.write_shard(1, 2), self.write_shard(2, 2, 1)])
+        self.assertEqual(result.exit_code, 1)
+
+    def test_merge_missing_shard(self):
+        result = self.runner.invoke(merge, [self.write_shard(1, 3), self.write_shard(3, 3)])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Missing shards: 2', result.output)
+
+    @mock.patch('frigg_coverage.parse_coverage', return_value=87.5)
+    def test_merge_coverage(self, mock_parse_coverage):
+        result = self.runner.invoke(merge, [self.write_shard(1, 1), '--coverage', __file__,
+                                            '--parser', 'go-cover'])
+        self.assertIn('Coverage 87.5%', result.output)
+        self.assertEqual(mock_parse_coverage.call_args[0][1], 'go-cover')
+
+    def test_merge_coverage_without_parser(self):
+        result = self.runner.invoke(merge, [self.write_shard(1, 1), '--coverage', __file__])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('--coverage needs the --parser', result.output)
+
+    def test_merge_coverage_unknown_parser(self):
+        result = self.runner.invoke(merge, [self.write_shard(1, 1), '--coverage', __file__,
+                                            '--parser', 'unknown'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('Unknown parser unknown', result.output)
+
+    def test_merge_invalid_coverage(self):
+        path = os.path.join(self.directory, 'coverage.xml')
+        with open(path, 'w') as file:
+            file.write('<coverage')
+        result = self.runner.invoke(merge, [self.write_shard(1, 1), '--coverage', path,
+                                            '--parser', 'python'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Unable to parse the coverage report', result.output)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from frigg_runner.coverage import parse_coverage_file
+
+COBERTURA_REPORT = """<?xml version="1.0" ?>
+<coverage line-rate="0.8" branch-rate="0" version="3.7.1" timestamp="1437573532">
+  <packages>
+    <package name="frigg_runner" line-rate="0.9" branch-rate="0" complexity="0">
+      <classes>
+        <class name="runner.py" filename="frigg_runner/runner.py" line-rate="0.9">
+          <lines><line number="1" hits="1"/></lines>
+        </class>
+      </classes>
+    </package>
+    <package name="tests" line-rate="0.7" branch-rate="0" complexity="0">
+      <classes/>
+    </package>
+  </packages>
+</coverage>
+"""
+
+CLOVER_REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<coverage generated="1437573532">
+  <project timestamp="1437573532">
+    <package name="Frigg">
+      <file name="Runner.php">
+        <metrics statements="10" coveredstatements="5"/>
+        <line num="1" type="stmt" count="1"/>
+      </file>
+      <metrics statements="10" coveredstatements="5"/>
+    </package>
+    <package name="Tests">
+      <metrics statements="30" coveredstatements="30"/>
+    </package>
+    <metrics statements="40" coveredstatements="35"/>
+  </project>
+</coverage>
+"""
+
+
+class CoverageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content):
+        path = os.path.join(self.directory, 'coverage.xml')
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def test_parse_cobertura(self):
+        coverage = parse_coverage_file(self.write(COBERTURA_REPORT), 'python')
+        self.assertEqual(coverage.total, 80)
+        self.assertIsNone(coverage.packages)
+
+    def test_parse_cobertura_packages(self):
+        coverage = parse_coverage_file(self.write(COBERTURA_REPORT), 'cobertura', packages=True)
+        self.assertEqual(coverage.total, 80)
+        self.assertEqual(coverage.packages, [('frigg_runner', 90), ('tests', 70)])
+
+    def test_parse_cobertura_stops_after_root(self):
+        coverage = parse_coverage_file(self.write(COBERTURA_REPORT[:120]), 'python')
+        self.assertEqual(coverage.total, 80)
+
+    def test_parse_clover(self):
+        coverage = parse_coverage_file(self.write(CLOVER_REPORT), 'clover', packages=True)
+        self.assertEqual(coverage.total, 87.5)
+        self.assertEqual(coverage.packages, [('Frigg', 50), ('Tests', 100)])
+
+    @mock.patch('frigg_coverage.parse_coverage', return_value=42.0)
+    def test_parse_other_formats(self, mock_parse_coverage):
+        coverage = parse_coverage_file(self.write('mode: set'), 'go-coverprofile')
+        self.assertEqual(coverage.total, 42.0)
+        mock_parse_coverage.assert_called_once_with('mode: set', 'go-coverprofile')
+
+    def test_parse_invalid_report(self):
+        self.assertRaises(SyntaxError, parse_coverage_file, self.write('<coverage'), 'python')
+
+    def test_parse_unknown_parser(self):
+        self.assertRaises(ValueError, parse_coverage_file, self.write('mode: set'), 'unknown')
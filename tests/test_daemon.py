@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from frigg_runner.daemon import (DaemonError, DaemonServer, WarmSettings, connect, is_running,
+                                 request_build, socket_path)
+
+
+class DaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'daemon.sock')
+        with open(os.path.join(self.directory, '.frigg.yml'), 'w') as file:
+            file.write('tasks: []\n')
+
+        def build_settings(directory, wrapper):
+            wrapper.read_file(os.path.join(directory, '.frigg.yml'))
+            return {'tasks': ['echo "Hello"', 'exit 1']}
+
+        patcher = mock.patch('frigg_settings.build_settings', side_effect=build_settings)
+        self.build_settings = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = DaemonServer(self.path)
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_build(self):
+        messages = list(request_build(connect(self.path), self.directory, jobs=2))
+        self.assertEqual(sorted((message['type'], message['task']) for message in messages[:-1]), [
+            ('finished', 'echo "Hello"'), ('finished', 'exit 1'),
+            ('started', 'echo "Hello"'), ('started', 'exit 1'),
+        ])
+        report = messages[-1]['report']
+        self.assertFalse(report['success'])
+        self.assertEqual([task['status'] for task in report['tasks']], ['success', 'failure'])
+
+        # The friggfile is parsed once while it does not change
+        list(request_build(connect(self.path), self.directory))
+        self.assertEqual(self.build_settings.call_count, 1)
+
+    @mock.patch.dict('os.environ', {'FRIGG_DAEMON': 'daemon'})
+    def test_build_environment(self):
+        """
+        Test that the tasks run with the environment of the client and not the one of the daemon
+        """
+        self.build_settings.side_effect = lambda *args: {
+            'tasks': ['test "$FRIGG_CLIENT" = client -a -z "$FRIGG_DAEMON"'],
+        }
+        environment = {'PATH': os.environ['PATH'], 'FRIGG_CLIENT': 'client'}
+        messages = list(request_build(connect(self.path), self.directory,
+                                      environment=environment))
+        self.assertTrue(messages[-1]['report']['success'])
+
+    def test_build_error(self):
+        messages = list(request_build(connect(self.path), os.path.join(self.directory, 'missing')))
+        self.assertEqual(messages, [{'type': 'error',
+                                     'message': 'The given working directory does not exist'}])
+
+    def test_socket(self):
+        self.assertTrue(is_running(self.path))
+        self.assertEqual(oct(os.stat(self.path).st_mode & 0o777), oct(0o600))
+        self.assertIsNone(connect(os.path.join(self.directory, 'missing.sock')))
+
+    def test_stale_socket(self):
+        path = os.path.join(self.directory, 'stale.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        server = DaemonServer(path)
+        server.server_close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_socket_of_other_user(self):
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertRaises(DaemonError, connect, self.path)
+            self.assertRaises(DaemonError, DaemonServer, self.path)
+
+        # A file that is not a socket
+        path = os.path.join(self.directory, 'file.sock')
+        open(path, 'w').close()
+        self.assertRaises(DaemonError, connect, path)
+
+    @mock.patch.dict('os.environ', {'FRIGG_DAEMON_SOCKET': '/tmp/frigg.sock'})
+    def test_socket_path(self):
+        self.assertEqual(socket_path(), '/tmp/frigg.sock')
+
+    def test_socket_path_private_directory(self):
+        environ = dict((key, value) for key, value in os.environ.items()
+                       if key not in ('FRIGG_DAEMON_SOCKET', 'XDG_RUNTIME_DIR'))
+        with mock.patch.dict('os.environ', environ, clear=True), \
+                mock.patch('tempfile.gettempdir', return_value=self.directory):
+            path = socket_path()
+            directory = os.path.dirname(path)
+            self.assertEqual(os.path.dirname(directory), self.directory)
+            self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+            self.assertEqual(socket_path(), path)
+
+            # A directory other users can access is not used
+            os.chmod(directory, 0o777)
+            self.assertRaises(DaemonError, socket_path)
+
+
+class WarmSettingsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = WarmSettings()
+
+    def write(self, content):
+        with open(os.path.join(self.directory, '.frigg.yml'), 'w') as file:
+            file.write(content)
+
+    def build_settings(self, directory, wrapper):
+        # Like frigg_settings, which reads the friggfile and tox.ini
+        wrapper.read_file(os.path.join(directory, '.frigg.yml'))
+        wrapper.file_exist(os.path.join(directory, 'tox.ini'))
+        return {'tasks': ['tox']}
+
+    def test_reparse_on_change(self):
+        with mock.patch('frigg_settings.build_settings',
+                        side_effect=self.build_settings) as mock_build_settings:
+            self.write('tasks:\n  - tox\n')
+            os.utime(os.path.join(self.directory, '.frigg.yml'), (0, 0))
+            self.assertEqual(self.cache.get(self.directory), {'tasks': ['tox']})
+            self.assertEqual(self.cache.get(self.directory), {'tasks': ['tox']})
+            self.assertEqual(mock_build_settings.call_count, 1)
+
+            # Same size and modification time, other content
+            self.write('tasks:\n  - tux\n')
+            os.utime(os.path.join(self.directory, '.frigg.yml'), (0, 0))
+            self.cache.get(self.directory)
+            self.assertEqual(mock_build_settings.call_count, 2)
+
+            # Files next to the friggfile are dependencies too
+            open(os.path.join(self.directory, 'tox.ini'), 'w').close()
+            self.cache.get(self.directory)
+            self.assertEqual(mock_build_settings.call_count, 3)
+            self.cache.get(self.directory)
+            self.assertEqual(mock_build_settings.call_count, 3)
+
+    @mock.patch('frigg_settings.build_settings', side_effect=TypeError)
+    def test_invalid(self, mock_build_settings):
+        self.assertIsNone(self.cache.get(self.directory))
+        self.assertFalse(mock_build_settings.called)
+        self.write('tasks: tox\n')
+        self.assertIsNone(self.cache.get(self.directory))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from frigg_runner.dashboard import Dashboard
+from frigg_runner.output import OutputSpool
+
+
+class DashboardTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = OutputSpool()
+        self.dashboard = Dashboard(iter(['flake8', 'isort']), 4, 'Running tasks',
+                                   durations={'tox': 40})
+
+    def tearDown(self):
+        self.spool.discard()
+
+    @mock.patch('time.time', return_value=100)
+    def test_render(self, mock_time):
+        self.dashboard.start('tox', self.spool)
+        self.spool.write('collecting ...\n\rtest_runner.py 10%\r\ntest_runner.py 20%')
+        self.dashboard.start('flake8')
+        self.dashboard.finished = 1
+
+        self.assertEqual(self.dashboard.render(80, now=112.34), [
+            'Running tasks        1/4 done, 1 queued',
+            '  tox                12.3s / ~40s    test_runner.py 20%',
+            '  flake8             12.3s           ',
+        ])
+        self.assertEqual(len(self.dashboard.render(20, now=112.34)[1]), 19)
+
+        self.dashboard.finish('tox')
+        self.assertEqual(len(self.dashboard.render(80)), 2)
+
+    def test_iterate(self):
+        self.assertEqual(list(self.dashboard), ['flake8', 'isort'])
+        self.assertEqual(self.dashboard.finished, 2)
+
+    @mock.patch('click.get_terminal_size', return_value=(80, 24))
+    @mock.patch('click.echo')
+    def test_draw(self, mock_echo, mock_get_terminal_size):
+        self.dashboard.draw()
+        self.assertEqual(mock_echo.call_args[0][0],
+                         '\x1b[JRunning tasks        0/4 done, 4 queued\n')
+
+        self.dashboard.start('tox', self.spool)
+        self.dashboard.draw()
+        self.assertTrue(mock_echo.call_args[0][0].startswith('\x1b[1A\x1b[J'))
+        self.assertEqual(self.dashboard.drawn_lines, 2)
+
+        self.dashboard.clear()
+        self.assertEqual(mock_echo.call_args[0][0], '\x1b[2A\x1b[J')
+        self.assertEqual(self.dashboard.drawn_lines, 0)
+
+    @mock.patch('click.get_terminal_size', return_value=(80, 24))
+    @mock.patch('click.echo')
+    def test_context_manager(self, mock_echo, mock_get_terminal_size):
+        dashboard = Dashboard(iter(['flake8']), 1, 'Running tasks', refresh_rate=100)
+        with dashboard as items:
+            self.assertEqual(list(items), ['flake8'])
+        self.assertFalse(dashboard.thread.is_alive())
+        mock_echo.assert_called_with('Running tasks        1/1 done, 0 queued')
+
+    @mock.patch('click.get_terminal_size', return_value=(80, 24))
+    @mock.patch('click.secho')
+    @mock.patch('click.echo')
+    def test_echo(self, mock_echo, mock_secho, mock_get_terminal_size):
+        self.dashboard.draw()
+        self.dashboard.echo('tox failed, retrying in 1s', fg='yellow', err=True)
+        mock_echo.assert_called_with('\x1b[1A\x1b[J', nl=False)
+        mock_secho.assert_called_once_with('tox failed, retrying in 1s', fg='yellow', err=True)
+        self.assertEqual(self.dashboard.drawn_lines, 0)
+
+    @mock.patch('click.get_terminal_size', return_value=(80, 24))
+    @mock.patch('click.echo')
+    def test_stop(self, mock_echo, mock_get_terminal_size):
+        with self.dashboard:
+            self.dashboard.draw()
+            self.dashboard.stop()
+            self.assertFalse(self.dashboard.thread.is_alive())
+            self.assertEqual(self.dashboard.drawn_lines, 0)
+            mock_echo.assert_called_with('Running tasks        0/4 done, 4 queued')
+            # Output printed after stopping is not cleared when the dashboard exits
+            mock_echo.reset_mock()
+        self.assertFalse(mock_echo.called)
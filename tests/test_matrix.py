@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from frigg_runner.matrix import (ISOLATION_ERRORS, MatrixCell, cleanup_cell, expand_matrix,
+                                 isolate_cell)
+
+
+class ExpandMatrixTestCase(unittest.TestCase):
+
+    def test_expand_matrix(self):
+        cells = expand_matrix({
+            'env': {'PYTHON': ['python2.7', 'python3.4'], 'DJANGO': ['1.8', 1.9]},
+            'include': [{'PYTHON': 'pypy'}],
+        }, '/tmp')
+        self.assertEqual([cell.name for cell in cells], [
+            'DJANGO=1.8 PYTHON=python2.7',
+            'DJANGO=1.8 PYTHON=python3.4',
+            'DJANGO=1.9 PYTHON=python2.7',
+            'DJANGO=1.9 PYTHON=python3.4',
+            'PYTHON=pypy',
+        ])
+        self.assertEqual(cells[2].env, {'DJANGO': '1.9', 'PYTHON': 'python2.7'})
+        self.assertEqual(cells[0].directory, '/tmp')
+
+    def test_expand_matrix_single_value(self):
+        cells = expand_matrix({'env': {'DEBUG': 1}}, '/tmp')
+        self.assertEqual([cell.env for cell in cells], [{'DEBUG': '1'}])
+
+    def test_expand_invalid_matrix(self):
+        self.assertRaises(TypeError, expand_matrix, ['python2.7'], '/tmp')
+        self.assertRaises(TypeError, expand_matrix, {'env': ['python2.7']}, '/tmp')
+        self.assertRaises(TypeError, expand_matrix, {'include': ['python2.7']}, '/tmp')
+        self.assertRaises(TypeError, expand_matrix, {'env': {}}, '/tmp')
+        self.assertRaises(TypeError, expand_matrix, {'env': {'A': 1}, 'isolate': 'vm'}, '/tmp')
+
+
+class IsolateCellTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'setup.py'), 'w') as file:
+            file.write('setup()')
+        os.makedirs(os.path.join(self.directory, '.frigg-cache'))
+        self.cell = MatrixCell({'PYTHON': 'python3.4'}, self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_copy(self):
+        isolate_cell(self.cell, 'copy')
+        copy = self.cell.directory
+        self.assertNotEqual(copy, self.directory)
+        self.assertTrue(os.path.exists(os.path.join(copy, 'setup.py')))
+        self.assertFalse(os.path.exists(os.path.join(copy, '.frigg-cache')))
+
+        cleanup_cell(self.cell, 'copy')
+        self.assertEqual(self.cell.directory, self.directory)
+        self.assertFalse(os.path.exists(copy))
+
+    def test_worktree(self):
+        with open(os.devnull, 'wb') as devnull:
+            for command in (['git', 'init'], ['git', 'add', 'setup.py'],
+                            ['git', '-c', 'user.name=frigg', '-c', 'user.email=hi@frigg.io',
+                             'commit', '-m', 'Initial commit']):
+                subprocess.check_call(command, cwd=self.directory, stdout=devnull,
+                                      stderr=devnull)
+
+        isolate_cell(self.cell, 'worktree')
+        worktree = self.cell.directory
+        self.assertTrue(os.path.exists(os.path.join(worktree, 'setup.py')))
+
+        cleanup_cell(self.cell, 'worktree')
+        self.assertFalse(os.path.exists(worktree))
+
+    def test_failure(self):
+        """
+        Test that no temporary directory is left behind when the working directory of a cell
+        can not be created
+        """
+        # The directory is not a git repository
+        self.assertRaises(subprocess.CalledProcessError, isolate_cell, self.cell, 'worktree')
+        self.assertFalse(os.path.exists(self.cell.isolation_directory))
+        self.assertEqual(self.cell.directory, self.directory)
+
+        cell = MatrixCell({}, os.path.join(self.directory, 'missing'))
+        self.assertRaises(ISOLATION_ERRORS, isolate_cell, cell, 'copy')
+        self.assertFalse(os.path.exists(cell.isolation_directory))
+
+    def test_worktree_subdirectory(self):
+        """
+        Test that a cell of a project in a subdirectory of the repository runs in that
+        subdirectory of the worktree
+        """
+        project = os.path.join(self.directory, 'project')
+        os.makedirs(project)
+        with open(os.path.join(project, '.frigg.yml'), 'w') as file:
+            file.write('tasks: []')
+        with open(os.devnull, 'wb') as devnull:
+            for command in (['git', 'init'], ['git', 'add', '.'],
+                            ['git', '-c', 'user.name=frigg', '-c', 'user.email=hi@frigg.io',
+                             'commit', '-m', 'Initial commit']):
+                subprocess.check_call(command, cwd=self.directory, stdout=devnull,
+                                      stderr=devnull)
+
+        cell = MatrixCell({'PYTHON': 'python3.4'}, project)
+        isolate_cell(cell, 'worktree')
+        worktree = cell.directory
+        self.assertEqual(os.path.basename(worktree), 'project')
+        self.assertTrue(os.path.exists(os.path.join(worktree, '.frigg.yml')))
+
+        cleanup_cell(cell, 'worktree')
+        self.assertEqual(cell.directory, project)
+        self.assertFalse(os.path.exists(worktree))
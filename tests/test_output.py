@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import six
+
+from frigg_runner.output import MAX_LINE_LENGTH, OutputSpool, log_filename
+
+
+class OutputSpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = OutputSpool(tail_lines=3)
+
+    def tearDown(self):
+        self.spool.discard()
+
+    def test_tail(self):
+        self.spool.write('first\nsec')
+        self.spool.write('ond\r\nthird')
+        self.assertEqual(self.spool.tail(), 'first\nsecond\nthird')
+        self.assertEqual(self.spool.last_line, 'third')
+        self.assertFalse(self.spool.truncated)
+
+    def test_bounded_tail(self):
+        for number in range(10):
+            self.spool.write('line %s\n' % number)
+        self.assertEqual(self.spool.tail(), 'line 7\nline 8\nline 9')
+        self.assertTrue(self.spool.truncated)
+
+    def test_long_lines(self):
+        self.spool.write('x' * (MAX_LINE_LENGTH * 2) + '\n')
+        self.assertEqual(len(self.spool.tail()), MAX_LINE_LENGTH)
+
+    def test_complete_output_in_file(self):
+        for number in range(10):
+            self.spool.write('line %s\n' % number)
+        self.spool.close()
+        with io.open(self.spool.path, encoding='utf8') as file:
+            self.assertEqual(len(file.read().splitlines()), 10)
+
+    def test_discard(self):
+        self.spool.discard()
+        self.assertFalse(os.path.exists(self.spool.path))
+
+
+class LogFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_log_filename(self):
+        six.assertRegex(self, log_filename('flake8'), r'^flake8-[0-9a-f]{8}\.log$')
+        six.assertRegex(self, log_filename('py.test -x tests/ [py27]', 2, 'gzip'),
+                        r'^py.test-x-tests-py27-[0-9a-f]{8}\.attempt-2\.log\.gz$')
+        self.assertNotEqual(log_filename('echo a/b'), log_filename('echo a b'))
+
+    def test_kept_on_discard(self):
+        path = os.path.join(self.directory, 'task.log')
+        spool = OutputSpool(path=path)
+        spool.write('line\n')
+        spool.discard()
+        with io.open(path, encoding='utf8') as file:
+            self.assertEqual(file.read(), 'line\n')
+
+    def test_gzip(self):
+        path = os.path.join(self.directory, 'task.log.gz')
+        spool = OutputSpool(tail_lines=1, path=path, compression='gzip')
+        for number in range(1000):
+            spool.write(u'line %s ✓\n' % number)
+        spool.close()
+        self.assertEqual(spool.tail(), u'line 999 ✓')
+        with gzip.open(path) as file:
+            self.assertEqual(len(file.read().decode('utf8').splitlines()), 1000)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+import unittest
+
+import mock
+
+from frigg_runner.process import ProcessGroups, execute, split_command
+
+
+class SplitCommandTestCase(unittest.TestCase):
+
+    def test_simple_command(self):
+        self.assertEqual(split_command('tox -e py27'), ['tox', '-e', 'py27'])
+
+    def test_shell_command(self):
+        self.assertIsNone(split_command('echo "Hello"'))
+        self.assertIsNone(split_command('coverage xml && coverage report'))
+        self.assertIsNone(split_command('PYTHONPATH=. py.test'))
+        self.assertIsNone(split_command('ls *.py'))
+
+    def test_empty_command(self):
+        self.assertIsNone(split_command(''))
+
+
+class ExecuteTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        # Results of failed commands are falsy
+        if getattr(self, 'result', None) is not None:
+            self.result.output.discard()
+
+    @mock.patch('click.echo')
+    def test_execute_pipe(self, mock_echo):
+        self.result = execute('echo out; echo err >&2; exit 2', hide=True, pty=False)
+        self.assertEqual(self.result.exited, 2)
+        self.assertEqual(self.result.stdout, 'out\nerr')
+        self.assertEqual(self.result.stderr, '')
+        self.assertFalse(self.result.pty)
+        self.assertFalse(mock_echo.called)
+
+    @mock.patch('click.echo')
+    def test_execute_pty(self, mock_echo):
+        self.result = execute('echo out', pty=True)
+        self.assertTrue(self.result.ok)
+        self.assertEqual(self.result.stdout, 'out')
+        self.assertTrue(self.result.pty)
+        self.assertTrue(mock_echo.called)
+
+    def test_execute_cwd(self):
+        self.result = execute('pwd', hide=True, cwd='/')
+        self.assertEqual(self.result.stdout, '/')
+
+    def test_execute_builtin(self):
+        self.result = execute('exit 4', hide=True)
+        self.assertEqual(self.result.exited, 4)
+
+    def test_execute_missing_command(self):
+        self.result = execute('frigg-command-that-does-not-exist', hide=True)
+        self.assertEqual(self.result.exited, 127)
+
+    def test_execute_env(self):
+        self.result = execute('echo $FRIGG_TEST', hide=True, env={'FRIGG_TEST': 'matrix'})
+        self.assertEqual(self.result.stdout, 'matrix')
+
+    def test_execute_environment(self):
+        self.result = execute('echo $HOME $FRIGG_TEST', hide=True, env={'FRIGG_TEST': 'matrix'},
+                              environment={'PATH': os.environ['PATH'], 'HOME': '/home/frigg'})
+        self.assertEqual(self.result.stdout, '/home/frigg matrix')
+
+    def test_execute_resources(self):
+        self.result = execute('python -c "sum(range(3000000))"', hide=True, pty=False)
+        resources = self.result.resources
+        self.assertGreater(resources.user_time + resources.system_time, 0)
+        self.assertGreater(resources.max_rss, 0)
+        self.assertGreaterEqual(resources.block_input, 0)
+        self.assertGreaterEqual(resources.block_output, 0)
+
+    def test_execute_killed_by_signal(self):
+        self.result = execute('kill -9 $$', hide=True, pty=False)
+        self.assertEqual(self.result.exited, -9)
+
+    def test_execute_timeout(self):
+        start = time.time()
+        self.result = execute('echo started; sleep 30', hide=True, pty=False, timeout=0.2)
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(self.result.timed_out)
+        self.assertEqual(self.result.exited, -15)
+        self.assertEqual(self.result.stdout, 'started')
+
+    @mock.patch('frigg_runner.process.TERMINATE_GRACE_PERIOD', 0.2)
+    def test_execute_timeout_kills_after_grace_period(self):
+        start = time.time()
+        self.result = execute("trap '' TERM; sleep 30", hide=True, pty=False, timeout=0.2)
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(self.result.timed_out)
+        self.assertEqual(self.result.exited, -9)
+
+    @mock.patch('click.secho')
+    def test_execute_inactivity_timeout(self, mock_secho):
+        self.result = execute('sleep 0.3; echo done', hide=True, pty=False,
+                              inactivity_timeout=0.1)
+        self.assertTrue(self.result.ok)
+        self.assertTrue(self.result.inactive)
+        self.assertFalse(self.result.timed_out)
+        mock_secho.assert_called_once_with('No output for 0.1s from sleep 0.3; echo done',
+                                           fg='yellow', err=True)
+
+    @mock.patch('click.secho')
+    def test_execute_inactivity_timeout_quiet(self, mock_secho):
+        self.result = execute('sleep 0.3; echo done', hide=True, pty=False,
+                              inactivity_timeout=0.1, quiet=True)
+        self.assertTrue(self.result.inactive)
+        self.assertFalse(mock_secho.called)
+
+    @mock.patch('click.secho')
+    def test_execute_inactivity_timeout_warn(self, mock_secho):
+        warn = mock.Mock()
+        self.result = execute('sleep 0.3; echo done', hide=True, pty=False,
+                              inactivity_timeout=0.1, warn=warn)
+        warn.assert_called_once_with('No output for 0.1s from sleep 0.3; echo done')
+        self.assertFalse(mock_secho.called)
+
+    def test_execute_without_timeouts(self):
+        self.result = execute('echo "Hello"', hide=True, timeout=5, inactivity_timeout=5)
+        self.assertFalse(self.result.timed_out)
+        self.assertFalse(self.result.inactive)
+
+    def test_execute_large_output(self):
+        self.result = execute('seq 100000', hide=True, pty=False)
+        self.assertTrue(self.result.ok)
+        self.assertEqual(self.result.stdout.splitlines()[-1], '100000')
+        self.assertTrue(self.result.output.truncated)
+
+
+class ProcessGroupsTestCase(unittest.TestCase):
+
+    def run_in_thread(self, command, processes):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            execute(command, hide=True, pty=False, processes=processes)))
+        thread.start()
+        while not processes.processes:
+            time.sleep(0.01)
+        return thread, results
+
+    def test_terminate(self):
+        processes = ProcessGroups()
+        thread, results = self.run_in_thread('sleep 30 & sleep 30', processes)
+
+        start = time.time()
+        processes.terminate(grace_period=5)
+        thread.join(5)
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(results[0].failed)
+        self.assertEqual(processes.processes, set())
+        results[0].output.discard()
+
+    def test_terminate_kills_after_grace_period(self):
+        processes = ProcessGroups()
+        thread, results = self.run_in_thread("trap '' TERM; sleep 30", processes)
+
+        start = time.time()
+        processes.terminate(grace_period=0.2)
+        thread.join(5)
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(results[0].failed)
+        results[0].output.discard()
+
+    def test_terminate_close(self):
+        processes = ProcessGroups()
+        processes.terminate(close=True)
+        result = execute('sleep 30', hide=True, processes=processes)
+        self.assertEqual(result.exited, -9)
+        result.output.discard()
+
+    def test_terminate_without_processes(self):
+        ProcessGroups().terminate()
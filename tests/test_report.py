@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+import mock
+from invoke.runner import Result
+
+from frigg_runner.process import ResourceUsage
+from frigg_runner.report import (build_report, histogram, junit_report, merge_reports, read_report,
+                                 write_report)
+
+
+def create_result(task, exited, time, **kwargs):
+    result = Result('line 1\nline 2', '', exited, False)
+    result.task = task
+    result.time = time
+    for key, value in kwargs.items():
+        setattr(result, key, value)
+    return result
+
+
+class ReportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.report = build_report(
+            [
+                create_result('flake8', 0, 0.5, resources=ResourceUsage(0.4, 0.1, 2048, 0, 8)),
+                create_result('tox', 1, 42, command='tox -e py34',
+                              output=mock.Mock(path='logs/tox.log', persistent=True)),
+                create_result('docs', None, 0, skipped=True),
+            ],
+            [create_result('pip install', 0, 12)],
+            coverage=91.2,
+            wall_time=50
+        )
+
+    def test_build_report(self):
+        self.assertFalse(self.report['success'])
+        self.assertEqual(self.report['coverage'], 91.2)
+        self.assertEqual(self.report['total_time'], 42.5)
+        self.assertEqual(self.report['wall_time'], 50)
+
+        setup, flake8, tox, docs = self.report['tasks']
+        self.assertTrue(setup['setup'])
+        self.assertEqual(flake8['status'], 'success')
+        self.assertEqual(flake8['resources']['max_rss'], 2048)
+        self.assertIsNone(flake8['output'])
+        self.assertEqual(tox['status'], 'failure')
+        self.assertEqual(tox['command'], 'tox -e py34')
+        self.assertEqual(tox['exit_code'], 1)
+        self.assertEqual(tox['output'], 'line 1\nline 2')
+        self.assertEqual(tox['log'], 'logs/tox.log')
+        self.assertIsNone(flake8['log'])
+        self.assertEqual(docs['status'], 'skipped')
+
+    def test_merge_reports(self):
+        other = build_report([create_result('isort', 0, 3)], [create_result('pip install', 0, 10)],
+                             wall_time=20, shard=(2, 2))
+        self.report['shard'] = {'index': 1, 'count': 2}
+        merged = merge_reports([self.report, other], coverage=85)
+
+        self.assertFalse(merged['success'])
+        self.assertEqual(merged['coverage'], 85)
+        self.assertEqual(merged['total_time'], 45.5)
+        self.assertEqual(merged['wall_time'], 50)
+        self.assertEqual(len(merged['tasks']), 6)
+        self.assertEqual([(shard['index'], shard['success']) for shard in merged['shards']],
+                         [(1, False), (2, True)])
+
+    def test_histogram(self):
+        counts = [bucket['count'] for bucket in histogram([0.1, 0.5, 5, 100, 1000])]
+        self.assertEqual(counts, [2, 1, 0, 1, 0, 1])
+
+    def test_junit_report(self):
+        suite = junit_report(self.report).getroot().find('testsuite')
+        self.assertEqual(suite.get('tests'), '4')
+        self.assertEqual(suite.get('failures'), '1')
+        self.assertEqual(suite.get('skipped'), '1')
+
+        cases = suite.findall('testcase')
+        self.assertEqual(cases[0].get('classname'), 'frigg.setup_tasks')
+        self.assertEqual(cases[2].find('failure').get('message'), 'Exit code 1')
+        self.assertIsNotNone(cases[3].find('skipped'))
+        self.assertEqual(suite.find('properties/property').get('value'), '91.2')
+
+    def test_junit_report_timeout(self):
+        report = build_report([create_result('tox', -15, 60.1, timeout=60, timed_out=True)], [])
+        self.assertTrue(report['tasks'][0]['timed_out'])
+        case = junit_report(report).getroot().find('testsuite/testcase')
+        self.assertEqual(case.find('failure').get('message'), 'Timed out after 60s')
+
+    def test_write_report(self):
+        directory = tempfile.mkdtemp()
+        try:
+            write_report(os.path.join(directory, 'report.json'), self.report)
+            with open(os.path.join(directory, 'report.json')) as file:
+                self.assertEqual(json.load(file)['coverage'], 91.2)
+            self.assertEqual(read_report(os.path.join(directory, 'report.json'))['tasks'],
+                             self.report['tasks'])
+
+            write_report(os.path.join(directory, 'report.xml'), self.report)
+            root = ET.parse(os.path.join(directory, 'report.xml')).getroot()
+            self.assertEqual(root.tag, 'testsuites')
+        finally:
+            shutil.rmtree(directory)
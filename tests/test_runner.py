@@ -1,15 +1,24 @@
 # -*- coding: utf-8 -*-
+import gzip
+import json
 import os
-import sys
+import shutil
+import signal
+import tempfile
+import threading
+import time
 import unittest
 from unittest import skip
 
 import mock
 import six
-from invoke.exceptions import Failure
 from invoke.runner import Result
 
-from frigg_runner.runner import Runner, runner_wrapper
+from frigg_runner import process
+from frigg_runner.build import TASK_FINISHED, TASK_STARTED, BuildError
+from frigg_runner.runner import Build, Runner
+from frigg_runner.snapshot import SetupSnapshot
+from frigg_runner.tasks import Task, parse_tasks
 
 OPEN_MODULE = 'builtins.open' if six.PY3 else '__builtin__.open'
 RUN_TASK_RESULT = (1, Result('', '', True, None))
@@ -17,6 +26,12 @@ RUN_TASK_RESULT = (1, Result('', '', True, None))
 
 class RunnerTestCase(unittest.TestCase):
 
+    def setUp(self):
+        # Keep the tests from recording task durations in the working directory
+        patcher = mock.patch('frigg_runner.timings.TimingStore.connect', lambda self: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch('frigg_settings.build_settings')
     def test_runner_init(self, mock_build_settings):
         """
@@ -28,7 +43,31 @@ class RunnerTestCase(unittest.TestCase):
         self.assertTrue(runner.verbose)
         self.assertEqual(runner.directory, os.getcwd())
 
-        mock_build_settings.assert_called_once_with(runner.directory, runner_wrapper)
+        mock_build_settings.assert_called_once_with(runner.directory, mock.ANY)
+
+    def test_runner_init_settings_cache(self):
+        """
+        Test that the settings of an unchanged friggfile are read from the cache
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, '.frigg.yml'), 'w') as file:
+            file.write('tasks:\n  - tox\n')
+
+        def build_settings(directory, wrapper):
+            return {'tasks': [wrapper.read_file(os.path.join(directory, '.frigg.yml')).split()[-1]]}
+
+        with mock.patch('frigg_settings.build_settings', side_effect=build_settings) as mock_build:
+            runner = Runner(path=directory)
+            self.assertFalse(runner.settings_cached)
+            runner = Runner(path=directory)
+            self.assertTrue(runner.settings_cached)
+            self.assertEqual(runner.config, {'tasks': ['tox']})
+            self.assertIsNotNone(runner.settings_time)
+            self.assertEqual(mock_build.call_count, 1)
+
+            Runner(path=directory, settings_cache=False)
+            self.assertEqual(mock_build.call_count, 2)
 
     @mock.patch('os.path.exists', side_effect=lambda *args, **kwargs: False)
     @mock.patch('frigg_settings.build_settings')
@@ -64,8 +103,8 @@ class RunnerTestCase(unittest.TestCase):
         """
         runner = Runner()
         runner.config['coverage'] = {
-            'path': 'coverage.xml',
-            'parser': 'python'
+            'path': 'coverage.out',
+            'parser': 'go-cover'
         }
         runner.coverage()
 
@@ -74,6 +113,38 @@ class RunnerTestCase(unittest.TestCase):
             runner.config['coverage']['parser']
         )
 
+    @mock.patch('frigg_settings.build_settings', side_effect=lambda *args, **kwargs: {})
+    def test_coverage_packages(self, mock_build_settings):
+        """
+        Test that Cobertura reports are parsed without frigg_coverage, with package coverage
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, 'coverage.xml'), 'w') as file:
+                file.write('<coverage line-rate="0.875"><packages>'
+                           '<package name="frigg_runner" line-rate="0.9"/>'
+                           '<package name="tests" line-rate="0.5"/></packages></coverage>')
+            runner = Runner(path=directory)
+            runner.config['coverage'] = {'path': 'coverage.xml', 'parser': 'python',
+                                         'packages': True}
+            with mock.patch('click.secho') as mock_secho:
+                self.assertEqual(runner.coverage(), 87.5)
+            self.assertEqual([call[0][0] for call in mock_secho.call_args_list],
+                             ['Coverage 87.5%', '  # frigg_runner 90.0%', '  # tests 50.0%'])
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('sys.exit')
+    @mock.patch('frigg_settings.build_settings', side_effect=lambda *args, **kwargs: {})
+    def test_coverage_missing_report(self, mock_build_settings, mock_exit):
+        """
+        Test that a missing coverage report fails the build
+        """
+        runner = Runner(path='/tmp')
+        runner.config['coverage'] = {'path': 'does-not-exist.xml', 'parser': 'python'}
+        runner.coverage()
+        mock_exit.assert_called_once_with(1)
+
     @mock.patch('frigg_settings.build_settings', side_effect=lambda *args, **kwargs: {})
     @mock.patch('os.path.exists', side_effect=lambda *args, **kwargs: True)
     def test_coverage_no_config(self, mock_exists, mock_build_settings):
@@ -97,7 +168,7 @@ class RunnerTestCase(unittest.TestCase):
         runner.coverage()
         mock_exit.assert_called_once_with(1)
 
-    @mock.patch('invoke.run')
+    @mock.patch('frigg_runner.runner.execute')
     @mock.patch('frigg_settings.build_settings')
     def test_run_command(self, mock_build_settings, mock_run):
         """
@@ -105,10 +176,10 @@ class RunnerTestCase(unittest.TestCase):
         """
         runner = Runner(verbose=True, path='/tmp')
         runner.run_task('echo "Hello"')
-        mock_run.assert_called_once_with('cd %s && echo "Hello"' % runner.directory, hide=False,
-                                         encoding='utf8', pty=True)
+        mock_run.assert_called_once_with('echo "Hello"', hide=False, encoding='utf8', pty=True,
+                                         processes=runner.processes, cwd=runner.directory)
 
-    @mock.patch('invoke.run')
+    @mock.patch('frigg_runner.runner.execute')
     @mock.patch('frigg_settings.build_settings',
                 side_effect=lambda *args, **kwargs: {'verbose_tasks': ['echo "Hello"']})
     def test_run_command_verbose_task(self, mock_build_settings, mock_run):
@@ -117,34 +188,317 @@ class RunnerTestCase(unittest.TestCase):
         """
         runner = Runner(failfast=False, verbose=False, path='/tmp')
         runner.run_task('echo "Hello"')
-        mock_run.assert_called_once_with('cd %s && echo "Hello"' % runner.directory, hide=False,
-                                         encoding='utf8', pty=True)
+        mock_run.assert_called_once_with('echo "Hello"', hide=False, encoding='utf8', pty=True,
+                                         processes=runner.processes, cwd=runner.directory)
+
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_runner.runner.execute', side_effect=lambda *args, **kwargs:
+                Result('', '', 0, False))
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_timeouts(self, mock_build_settings, mock_execute, mock_handle_results):
+        """
+        Test that tasks get their own timeouts or the global ones
+        """
+        runner = Runner(path='/tmp')
+        runner.config = {
+            'timeout': 600,
+            'inactivity_timeout': 60,
+            'tasks': ['flake8', {'command': 'tox', 'timeout': 1800}],
+        }
+        runner.run()
+        options = [(call[1]['timeout'], call[1]['inactivity_timeout'])
+                   for call in mock_execute.call_args_list]
+        self.assertEqual(options, [(600, 60), (1800, 60)])
+
+    @mock.patch('time.sleep')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task')
+    def test_execute_task_retries(self, mock_run_task, mock_build_settings, mock_sleep):
+        """
+        Test that failed tasks are retried with a growing delay
+        """
+        mock_run_task.side_effect = [(1, Result('', '', 1, False)), (2, Result('', '', 1, False)),
+                                     (3, Result('', '', 0, False))]
+        runner = Runner()
+        task_result = runner.execute_task(Task('tox', retries=3))
+        self.assertTrue(task_result.ok)
+        self.assertEqual(task_result.time, 6)
+        self.assertEqual([attempt['exit_code'] for attempt in task_result.attempts], [1, 1, 0])
+        self.assertEqual([call[0][0] for call in mock_sleep.call_args_list], [1, 2])
+
+        mock_run_task.side_effect = [(1, Result('', '', 2, False))]
+        task_result = runner.execute_task(Task('tox', retries=3, retry_on_exit_codes=[1]))
+        self.assertEqual(task_result.exited, 2)
+        self.assertEqual(len(task_result.attempts), 1)
+
+        mock_run_task.side_effect = [(1, Result('', '', 1, False)), (1, Result('', '', 1, False))]
+        task_result = runner.execute_task(Task('tox', retries=1))
+        self.assertTrue(task_result.failed)
+        self.assertEqual(len(task_result.attempts), 2)
+
+    @mock.patch('frigg_runner.dashboard.Dashboard.draw')
+    @mock.patch('frigg_runner.runner.dashboard_supported', return_value=True)
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task')
+    def test_run_dashboard(self, mock_run_task, mock_build_settings, mock_handle_results,
+                           mock_dashboard_supported, mock_draw):
+        """
+        Test that running tasks are shown on the dashboard with their output
+        """
+        def run_task(command, **kwargs):
+            self.assertIn(command, runner.dashboard.running)
+            self.assertIs(runner.dashboard.running[command][1], kwargs['spool'])
+            result = Result('', '', 0, False)
+            result.output = kwargs['spool']
+            return 1, result
+        mock_run_task.side_effect = run_task
+
+        runner = Runner(jobs=2)
+        runner.config = {'tasks': ['flake8', 'tox']}
+        runner.verbose_tasks = []
+        with mock.patch('click.echo'):
+            runner.run()
+        self.assertEqual(mock_run_task.call_count, 2)
+        self.assertIsNone(runner.dashboard)
+
+    @mock.patch('time.sleep')
+    @mock.patch('frigg_runner.dashboard.Dashboard.echo')
+    @mock.patch('frigg_runner.dashboard.Dashboard.draw')
+    @mock.patch('frigg_runner.runner.dashboard_supported', return_value=True)
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task',
+                lambda *args, **kwargs: (1, Result('', '', 1, False)))
+    def test_run_dashboard_fail_fast(self, mock_build_settings, mock_dashboard_supported,
+                                     mock_draw, mock_echo, mock_sleep):
+        """
+        Test that the dashboard is stopped before the failure of a fail fast build is printed,
+        and that retries are reported above it
+        """
+        def fail_fast_exit(task_result):
+            self.assertTrue(runner.dashboard.stopped.is_set())
+            raise SystemExit(1)
+
+        runner = Runner(failfast=True, jobs=2)
+        runner.config = {'tasks': [{'command': 'tox', 'retries': 1}]}
+        runner.verbose_tasks = []
+        runner.fail_fast_exit = mock.Mock(side_effect=fail_fast_exit)
+        with mock.patch('click.echo'):
+            self.assertRaises(SystemExit, runner.run)
+        self.assertTrue(runner.fail_fast_exit.called)
+        mock_echo.assert_called_once_with('tox failed with exit code 1, retrying in 1s',
+                                          fg='yellow', err=True)
+
+    @mock.patch('frigg_runner.runner.execute')
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_command_hidden_output(self, mock_build_settings, mock_run):
+        """
+        Test that commands with hidden output run without a pseudo-terminal
+        """
+        runner = Runner(path='/tmp')
+        runner.run_task('echo "Hello"')
+        mock_run.assert_called_once_with('echo "Hello"', hide=True, encoding='utf8', pty=False,
+                                         processes=runner.processes, cwd=runner.directory)
 
     @mock.patch('frigg_settings.build_settings')
-    @mock.patch('invoke.run', side_effect=Failure('Custom result'))
-    def test_run_command_failure(self, mock_run, mock_build_settings):
+    def test_run_command_directory_with_spaces(self, mock_build_settings):
         """
-        Test function for command exec when the invoke return a Failure object
+        Test running commands in a working directory with spaces in the path
         """
+        directory = tempfile.mkdtemp(suffix=' with spaces')
+        try:
+            runner = Runner(path=directory)
+            function_time, result = runner.run_task('pwd')
+            self.assertTrue(result.ok)
+            self.assertEqual(result.stdout, os.path.realpath(directory))
+            result.output.discard()
+        finally:
+            shutil.rmtree(directory)
 
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_command_failure(self, mock_build_settings):
+        """
+        Test function for command exec when the command fails
+        """
         runner = Runner(path='/tmp')
-        function_time, result = runner.run_task('echo "Hello"')
-        mock_run.assert_called_once_with('cd %s && echo "Hello"' % runner.directory, hide=True,
-                                         encoding='utf8', pty=True)
-        self.assertEqual(result, 'Custom result')
+        function_time, result = runner.run_task('echo "Hello" && exit 3')
+        self.assertEqual(result.exited, 3)
+        self.assertEqual(result.stdout, 'Hello')
+        self.assertTrue(os.path.exists(result.output.path))
         self.assertIsNotNone(function_time)
+        result.output.discard()
 
     @mock.patch('frigg_settings.build_settings')
-    @mock.patch('invoke.run', side_effect=lambda *args, **kwargs: sys.exit(1))
-    def test_run_command_exit(self, mock_run, mock_build_settings):
+    def test_execute_task_discards_output(self, mock_build_settings):
         """
-        Test function for command exec when invoke exits
+        Test that the complete output of successful tasks is removed
         """
-        runner = Runner(path='/tmp')
-        function_time, result = runner.run_task('echo "Hello"')
-        mock_run.assert_called_once_with('cd %s && echo "Hello"' % runner.directory, hide=True,
-                                         encoding='utf8', pty=True)
-        self.assertIsNone(result)
+        runner = Runner(path='/tmp', jobs=2)
+        result = runner.execute_task(Task('echo "Hello"'), pty=False)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.stdout, 'Hello')
+        self.assertFalse(os.path.exists(result.output.path))
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_execute_task_keeps_truncated_output(self, mock_build_settings):
+        """
+        Test that the complete output of failed tasks is only kept when it is longer than the
+        tail, the summary points to it then
+        """
+        runner = Runner(path='/tmp', jobs=2)
+        result = runner.execute_task(Task('echo "Hello" && exit 1'), pty=False)
+        self.assertFalse(os.path.exists(result.output.path))
+
+        result = runner.execute_task(Task('seq 1000 && exit 1'), pty=False)
+        self.assertTrue(result.output.truncated)
+        self.assertTrue(os.path.exists(result.output.path))
+        result.output.discard()
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_execute_task_log_dir(self, mock_build_settings):
+        """
+        Test that the output of every task is kept in its own file in the log directory
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            log_dir = os.path.join(directory, 'logs')
+            runner = Runner(path=directory, jobs=2, log_dir=log_dir, log_compression='gzip')
+            result = runner.execute_task(Task('echo "Hello"'), pty=False)
+            self.assertTrue(result.ok)
+            self.assertEqual(os.path.dirname(result.output.path), log_dir)
+            self.assertTrue(result.output.path.endswith('.log.gz'))
+            with gzip.open(result.output.path) as file:
+                self.assertEqual(file.read(), b'Hello\n')
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_tasks_interrupted(self, mock_build_settings):
+        """
+        Test that Ctrl+C stops a serial build right away, the task runs in its own session and
+        never gets the SIGINT of the terminal
+        """
+        runner = Runner(path=tempfile.gettempdir())
+        timer = threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGINT))
+        start = time.time()
+        timer.start()
+        try:
+            with mock.patch('click.progressbar'):
+                self.assertRaises(KeyboardInterrupt, runner.run_tasks, [Task('sleep 30')], None,
+                                  jobs=1, fail_fast=False)
+        finally:
+            timer.cancel()
+        self.assertLess(time.time() - start, 5)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_execute_task_split(self, mock_build_settings):
+        """
+        Test that the test files of a split task run in buckets and their output is merged
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ('test_a.py', 'test_b.py', 'test_c.py'):
+                open(os.path.join(directory, name), 'w').close()
+            runner = Runner(path=directory)
+            task = Task('python -m pytest', split=2)
+            with mock.patch('frigg_runner.runner.bucket_command',
+                            side_effect=lambda command, files: 'echo %s' % ' '.join(files)), \
+                    mock.patch('frigg_runner.timings.TimingStore.record') as mock_record:
+                result = runner.execute_task(task, pty=False)
+            self.assertTrue(result.ok)
+            self.assertEqual(result.stdout, '# Bucket 1/2: 2 test files, exit code 0\n'
+                                            'test_a.py test_c.py\n'
+                                            '# Bucket 2/2: 1 test files, exit code 0\n'
+                                            'test_b.py')
+            # Every test file gets its share of the runtime of its bucket
+            self.assertEqual(sorted(call[0][0] for call in mock_record.call_args_list),
+                             ['python -m pytest :: test_a.py', 'python -m pytest :: test_b.py',
+                              'python -m pytest :: test_c.py'])
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_execute_task_split_error(self, mock_build_settings):
+        """
+        Test that a bucket which can not be run fails the task and the other buckets are merged
+        """
+        def execute(command, **kwargs):
+            if command == 'echo test_b.py':
+                raise OSError(24, 'Too many open files')
+            return process.execute(command, **kwargs)
+
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ('test_a.py', 'test_b.py', 'test_c.py'):
+                open(os.path.join(directory, name), 'w').close()
+            runner = Runner(path=directory)
+            task = Task('python -m pytest', split=2)
+            with mock.patch('frigg_runner.runner.bucket_command',
+                            side_effect=lambda command, files: 'echo %s' % ' '.join(files)), \
+                    mock.patch('frigg_runner.runner.execute', side_effect=execute), \
+                    mock.patch('frigg_runner.timings.TimingStore.record') as mock_record:
+                result = runner.execute_task(task, pty=False)
+            self.assertTrue(result.failed)
+            self.assertEqual(result.stdout, '# Bucket 1/2: 2 test files, exit code 0\n'
+                                            'test_a.py test_c.py\n'
+                                            '# Bucket 2/2: 1 test files, exit code 1\n'
+                                            'Could not run the bucket: [Errno 24] Too many open '
+                                            'files')
+            self.assertEqual(sorted(call[0][0] for call in mock_record.call_args_list),
+                             ['python -m pytest :: test_a.py', 'python -m pytest :: test_c.py'])
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('frigg_runner.runner.Runner.run_task',
+                side_effect=lambda *args, **kwargs: (1, Result('out', '', 0, True)))
+    @mock.patch('frigg_settings.build_settings')
+    def test_execute_task_cache(self, mock_build_settings, mock_run_task):
+        """
+        Test that the results of tasks with unchanged inputs are replayed from the cache
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, 'setup.py'), 'w') as file:
+                file.write('setup()')
+            runner = Runner(path=directory, cache=True)
+            task = Task('flake8', inputs=['*.py'])
+
+            result = runner.execute_task(task)
+            self.assertEqual(result.time, 1)
+            self.assertIsNone(getattr(result, 'cached_time', None))
+
+            result = runner.execute_task(task)
+            self.assertEqual(result.stdout, 'out')
+            self.assertEqual(result.task, 'flake8')
+            self.assertEqual(result.cached_time, 1)
+            self.assertEqual(mock_run_task.call_count, 1)
+
+            with open(os.path.join(directory, 'setup.py'), 'w') as file:
+                file.write('setup(name="frigg")')
+            runner.execute_task(task)
+            self.assertEqual(mock_run_task.call_count, 2)
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('frigg_runner.runner.Runner.run_task',
+                side_effect=lambda *args, **kwargs: (1, Result('out', '', 0, True)))
+    @mock.patch('frigg_settings.build_settings')
+    def test_execute_task_cache_environment(self, mock_build_settings, mock_run_task):
+        """
+        Test that the cache key uses the environment the tasks run in and not the one of the
+        daemon running them
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            open(os.path.join(directory, 'setup.py'), 'w').close()
+            task = Task('flake8', inputs=['*.py'], env=['VIRTUAL_ENV'])
+            Runner(path=directory, cache=True, environment={'VIRTUAL_ENV': 'a'}).execute_task(task)
+            Runner(path=directory, cache=True, environment={'VIRTUAL_ENV': 'b'}).execute_task(task)
+            self.assertEqual(mock_run_task.call_count, 2)
+            Runner(path=directory, cache=True, environment={'VIRTUAL_ENV': 'a'}).execute_task(task)
+            self.assertEqual(mock_run_task.call_count, 2)
+        finally:
+            shutil.rmtree(directory)
 
     @mock.patch('frigg_runner.runner.Runner.coverage')
     @mock.patch('frigg_settings.build_settings')
@@ -181,6 +535,27 @@ class RunnerTestCase(unittest.TestCase):
 
         self.assertRaises(SystemExit, runner.handle_results, [res1, res2], [res3, res4])
 
+    @mock.patch('frigg_runner.runner.Runner.coverage', side_effect=lambda: 87.5)
+    @mock.patch('frigg_settings.build_settings')
+    def test_handle_result_report(self, mock_build_settings, mock_coverage):
+        """
+        Test that handle_results writes the build report
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            runner = Runner(report=os.path.join(directory, 'report.json'))
+            result = Result('', '', 0, None)
+            result.task = 'tox'
+            result.time = 1
+
+            self.assertRaises(SystemExit, runner.handle_results, [result], [])
+            with open(os.path.join(directory, 'report.json')) as file:
+                report = json.load(file)
+            self.assertEqual(report['coverage'], 87.5)
+            self.assertEqual(report['tasks'][0]['name'], 'tox')
+        finally:
+            shutil.rmtree(directory)
+
     @mock.patch('frigg_runner.runner.Runner.handle_results')
     @mock.patch('frigg_settings.build_settings')
     @mock.patch('frigg_runner.runner.Runner.run_task', lambda *args, **kwargs: RUN_TASK_RESULT)
@@ -219,6 +594,299 @@ class RunnerTestCase(unittest.TestCase):
         runner.run()
         self.assertTrue(mock_handle_results.called)
 
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task')
+    def test_run_parallel(self, mock_run_task, mock_build_settings, mock_handle_results):
+        """
+        Test that concurrent tasks are collected in friggfile order
+        """
+        def run_task(command, pty=True, cell=None, **kwargs):
+            time.sleep(0.1 if command == 'flake8' else 0)
+            return 1, Result('', '', 0, pty)
+        mock_run_task.side_effect = run_task
+
+        runner = Runner(jobs=2)
+        runner.config = {
+            'tasks': [
+                'flake8',
+                'tox',
+                'isort'
+            ]
+        }
+
+        runner.run()
+        task_results = mock_handle_results.call_args[0][0]
+        self.assertEqual([result.task for result in task_results], ['flake8', 'tox', 'isort'])
+        self.assertEqual(mock_run_task.call_count, 3)
+        for call in mock_run_task.call_args_list:
+            self.assertEqual(call[1], {'pty': False, 'cell': None, 'timeout': None,
+                                       'inactivity_timeout': None})
+
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task',
+                lambda *args, **kwargs: (1, Result('', '', 1, False)))
+    def test_run_parallel_fail_fast(self, mock_build_settings, mock_handle_results):
+        """
+        Test that a failing concurrent task exits the build when failfast is set
+        """
+        runner = Runner(failfast=True, jobs=2)
+        runner.config = {
+            'tasks': [
+                'flake8',
+                'tox'
+            ]
+        }
+
+        self.assertRaises(SystemExit, runner.run)
+        self.assertFalse(mock_handle_results.called)
+
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_parallel_fail_fast_cancels_tasks(self, mock_build_settings,
+                                                  mock_handle_results):
+        """
+        Test that failfast terminates the tasks that are still running
+        """
+        runner = Runner(failfast=True, jobs=2, path='/tmp')
+        runner.config = {
+            'tasks': [
+                'sleep 30',
+                'sleep 0.2 && exit 1'
+            ]
+        }
+
+        start = time.time()
+        self.assertRaises(SystemExit, runner.run)
+        self.assertLess(time.time() - start, 10)
+        self.assertFalse(mock_handle_results.called)
+
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task',
+                lambda self, command, **kwargs: (1, Result('', '', int(command == 'pip'), True)))
+    def test_run_skips_dependents_of_failed_task(self, mock_build_settings, mock_handle_results):
+        """
+        Test that tasks depending on a failed task are reported as skipped
+        """
+        runner = Runner()
+        runner.config = {
+            'tasks': [
+                {'name': 'install', 'command': 'pip'},
+                {'name': 'lint', 'command': 'flake8', 'depends_on': 'install'},
+                'tox'
+            ]
+        }
+
+        runner.run()
+        task_results = mock_handle_results.call_args[0][0]
+        self.assertEqual([result.task for result in task_results], ['install', 'lint', 'tox'])
+        self.assertTrue(task_results[0].failed)
+        self.assertTrue(task_results[1].skipped)
+        self.assertTrue(task_results[2].ok)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_invalid_dependencies(self, mock_build_settings):
+        """
+        Test that unknown task dependencies exit the build
+        """
+        runner = Runner()
+        runner.config = {
+            'tasks': [
+                {'name': 'lint', 'command': 'flake8', 'depends_on': 'install'},
+            ]
+        }
+
+        self.assertRaises(SystemExit, runner.run)
+
+    @mock.patch('frigg_runner.runner.Runner.summarize')
+    @mock.patch('frigg_runner.runner.Watcher')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task')
+    def test_run_watch(self, mock_run_task, mock_build_settings, mock_watcher, mock_summarize):
+        """
+        Test that watch mode reruns the tasks affected by changed files
+        """
+        mock_run_task.side_effect = lambda command, **kwargs: (1, Result('', '', 0, True))
+        mock_watcher.return_value.wait.side_effect = [set(['README.rst']),
+                                                      set(['frigg_runner/cli.py']),
+                                                      KeyboardInterrupt]
+        runner = Runner(watch=True)
+        runner.config = {
+            'tasks': [
+                {'command': 'flake8', 'inputs': '*.py'},
+                {'command': 'make docs', 'inputs': 'docs/*'},
+            ]
+        }
+
+        runner.run()
+        self.assertEqual([call[0][0] for call in mock_run_task.call_args_list],
+                         ['flake8', 'make docs', 'flake8'])
+        self.assertEqual(mock_summarize.call_count, 2)
+        # The files written by the tasks of a round are not changes
+        self.assertEqual(mock_watcher.return_value.changes.call_count, 1)
+
+    @mock.patch('frigg_runner.runner.Runner.handle_results')
+    @mock.patch('frigg_settings.build_settings')
+    @mock.patch('frigg_runner.runner.Runner.run_task')
+    def test_run_matrix(self, mock_run_task, mock_build_settings, mock_handle_results):
+        """
+        Test that the tasks run once for every matrix cell
+        """
+        mock_run_task.side_effect = lambda command, **kwargs: (
+            1, Result('', '', int(kwargs['cell'].env['PYTHON'] == 'python3.4'), False))
+        runner = Runner(jobs=2, setup=True)
+        runner.config = {
+            'setup_tasks': ['pip install -e .'],
+            'tasks': ['flake8', 'tox'],
+            'matrix': {'env': {'PYTHON': ['python2.7', 'python3.4']}},
+        }
+
+        runner.run()
+        task_results, setup_task_results = mock_handle_results.call_args[0]
+        self.assertEqual([result.task for result in task_results], [
+            'flake8 [PYTHON=python2.7]',
+            'tox [PYTHON=python2.7]',
+            'flake8 [PYTHON=python3.4]',
+            'tox [PYTHON=python3.4]',
+        ])
+        self.assertEqual([result.ok for result in task_results], [True, True, False, False])
+        self.assertEqual(len(setup_task_results), 2)
+        self.assertEqual(mock_run_task.call_count, 6)
+
+    @mock.patch('click.secho')
+    @mock.patch('frigg_runner.runner.Runner.run_task')
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_matrix_isolate_failure(self, mock_build_settings, mock_run_task, mock_secho):
+        """
+        Test that the build fails when the working directory of a cell can not be created
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            runner = Runner(path=directory)
+            runner.config = {
+                'tasks': ['flake8'],
+                'matrix': {'env': {'PYTHON': ['python3.4']}, 'isolate': 'worktree'},
+            }
+            self.assertRaises(SystemExit, runner.run)
+            self.assertFalse(mock_run_task.called)
+            self.assertTrue(any(call[0][0].startswith('Could not create the working directory '
+                                                      'of PYTHON=python3.4: ')
+                                for call in mock_secho.call_args_list))
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_matrix_fail_fast(self, mock_build_settings):
+        """
+        Test that failfast cancels the tasks of every matrix cell
+        """
+        runner = Runner(failfast=True, jobs=4, path='/tmp')
+        runner.config = {
+            'tasks': ['sleep 30', 'test $PYTHON != python3.4'],
+            'matrix': {'env': {'PYTHON': ['python2.7', 'python3.4']}},
+        }
+
+        start = time.time()
+        self.assertRaises(SystemExit, runner.run)
+        self.assertLess(time.time() - start, 10)
+
+    @mock.patch('frigg_runner.snapshot.SetupSnapshot.save')
+    @mock.patch('frigg_runner.snapshot.SetupSnapshot.restore')
+    @mock.patch('frigg_runner.runner.Runner.run_task', side_effect=lambda *args, **kwargs:
+                (1, Result('', '', 0, None)))
+    @mock.patch('frigg_settings.build_settings')
+    def test_run_setup_tasks_snapshot(self, mock_build_settings, mock_run_task, mock_restore,
+                                      mock_save):
+        """
+        Test that a snapshot replaces the setup tasks and is stored after they succeed
+        """
+        runner = Runner(setup=True, path='/tmp')
+        runner.snapshot = SetupSnapshot('/tmp', ['venv'])
+        setup_tasks = [Task('virtualenv venv')]
+
+        mock_restore.return_value = [{'name': 'virtualenv venv', 'command': 'virtualenv venv',
+                                      'time': 4.2}]
+        task_results = runner.run_setup_tasks(setup_tasks, None)
+        self.assertEqual(task_results[0].cached_time, 4.2)
+        self.assertTrue(task_results[0].ok)
+        self.assertFalse(mock_run_task.called)
+
+        mock_restore.return_value = None
+        with mock.patch('frigg_runner.snapshot.SetupSnapshot.detach'):
+            task_results = runner.run_setup_tasks(setup_tasks, None)
+        self.assertEqual(mock_run_task.call_count, 1)
+        mock_save.assert_called_once_with(mock_restore.call_args[0][0], '/tmp', task_results)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_select_shard(self, mock_build_settings):
+        """
+        Test that the shards are balanced by the durations report
+        """
+        tasks = [Task('tox'), Task('flake8'), Task('isort')]
+        self.assertEqual(Runner().select_shard(tasks), tasks)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'report.json')
+            with open(path, 'w') as file:
+                json.dump({'tasks': [
+                    {'name': 'tox', 'setup': False, 'status': 'success', 'time': 10},
+                    {'name': 'flake8', 'setup': False, 'status': 'success', 'time': 20},
+                    {'name': 'isort', 'setup': False, 'status': 'success', 'time': 5},
+                ]}, file)
+            runner = Runner(shard=(2, 2), durations=path)
+            self.assertEqual([task.name for task in runner.select_shard(tasks)],
+                             ['tox', 'isort'])
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('frigg_settings.build_settings')
+    def test_select_changed(self, mock_build_settings):
+        """
+        Test that only the tasks affected by the changed files and their dependencies are selected
+        """
+        tasks = parse_tasks([
+            {'name': 'install', 'command': 'pip install -e .', 'inputs': 'setup.py'},
+            {'name': 'tests', 'command': 'py.test', 'depends_on': 'install',
+             'inputs': ['*.py']},
+            {'name': 'docs', 'command': 'make docs', 'inputs': 'docs/*'},
+            {'name': 'isort', 'command': 'isort -c'},
+        ])
+        self.assertEqual(Runner().select_changed(tasks), tasks)
+
+        runner = Runner(changed_since='origin/master', report='reports/build.json')
+        with mock.patch('frigg_runner.runner.changed_since',
+                        return_value=set(['tests/test_runner.py'])) as mock_changed_since:
+            selected = runner.select_changed(tasks)
+        # The report written by the runner is no change
+        mock_changed_since.assert_called_once_with(runner.directory, 'origin/master',
+                                                   exclude=['reports/build.json'])
+        self.assertEqual([task.name for task in selected], ['install', 'tests', 'isort'])
+        self.assertEqual(selected[1].depends_on, ['install'])
+        self.assertEqual(runner.unaffected_tasks, ['docs'])
+
+        with mock.patch('click.secho') as mock_secho, \
+                mock.patch('frigg_runner.runner.Runner.coverage'), \
+                mock.patch('frigg_runner.runner.write_report'):
+            runner.summarize([], [])
+        self.assertIn(mock.call('  # docs (not affected by the changes)', fg='yellow'),
+                      mock_secho.call_args_list)
+
+        # Every task is affected by a change of the friggfile
+        with mock.patch('frigg_runner.runner.changed_since', return_value=set(['.frigg.yml'])):
+            self.assertEqual(runner.select_changed(tasks), tasks)
+        self.assertEqual(runner.unaffected_tasks, [])
+
+    @mock.patch('sys.exit')
+    @mock.patch('frigg_settings.build_settings')
+    def test_select_changed_unknown_revision(self, mock_build_settings, mock_exit):
+        with mock.patch('frigg_runner.runner.changed_since',
+                        side_effect=ValueError('unknown revision')):
+            Runner(changed_since='unknown').select_changed([Task('tox')])
+        mock_exit.assert_called_once_with(1)
+
     @skip('This test has never worked, just silently failed.'
           'Because failfast makes the app exit.')
     @mock.patch('frigg_runner.runner.Runner.handle_results')
@@ -259,6 +927,73 @@ class RunnerTestCase(unittest.TestCase):
         self.assertTrue(mock_handle_results.called)
 
 
+class BuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def build(self, config, **kwargs):
+        with mock.patch('frigg_settings.build_settings', lambda *args: config):
+            return Build(self.directory, **kwargs)
+
+    @mock.patch('click.echo')
+    def test_events(self, mock_echo):
+        build = self.build({'tasks': [{'name': 'hello', 'command': 'echo "Hello"'},
+                                      {'name': 'fail', 'command': 'exit 3',
+                                       'depends_on': ['hello']}]})
+        events = list(build.events())
+        self.assertEqual([(event.type, event.task) for event in events], [
+            (TASK_STARTED, 'hello'), (TASK_FINISHED, 'hello'),
+            (TASK_STARTED, 'fail'), (TASK_FINISHED, 'fail'),
+        ])
+        self.assertEqual(events[1].result.stdout, 'Hello')
+
+        result = build.result()
+        self.assertFalse(result.success)
+        self.assertEqual([task_result.exited for task_result in result.failures], [3])
+        self.assertEqual(result.report()['tasks'][1]['status'], 'failure')
+        self.assertFalse(mock_echo.called)
+
+    @mock.patch('click.secho')
+    def test_inactive_task(self, mock_secho):
+        result = self.build({'tasks': ['sleep 0.3'], 'inactivity_timeout': 0.1}).run()
+        self.assertTrue(result.task_results[0].inactive)
+        self.assertFalse(mock_secho.called)
+
+    def test_run_fail_fast(self):
+        result = self.build({'tasks': ['exit 1', 'true']}, failfast=True).run()
+        self.assertEqual([task_result.task for task_result in result.task_results], ['exit 1'])
+
+    def test_setup_tasks(self):
+        result = self.build({'tasks': ['true'], 'setup_tasks': ['exit 1']}, setup=True).run()
+        self.assertTrue(result.success)
+        self.assertTrue(result.setup_task_results[0].failed)
+
+    def test_no_tasks(self):
+        with mock.patch('frigg_settings.build_settings', side_effect=RuntimeError):
+            result = Build(self.directory).run()
+        self.assertTrue(result.success)
+        self.assertEqual(result.task_results, [])
+
+    def test_invalid_friggfile(self):
+        with mock.patch('frigg_settings.build_settings', side_effect=TypeError('invalid')):
+            self.assertRaises(BuildError, Build, self.directory)
+        self.assertRaises(BuildError, self.build({'tasks': [{'name': 'lint'}]}).run)
+        self.assertRaises(BuildError, Build, os.path.join(self.directory, 'missing'))
+
+    def test_coverage(self):
+        with open(os.path.join(self.directory, 'coverage.xml'), 'w') as file:
+            file.write('<coverage line-rate="0.5"></coverage>')
+        build = self.build({'tasks': ['true'],
+                            'coverage': {'path': 'coverage.xml', 'parser': 'python'}})
+        self.assertEqual(build.run().coverage, 50)
+
+        build = self.build({'tasks': ['true'],
+                            'coverage': {'path': 'missing.xml', 'parser': 'python'}})
+        self.assertRaises(BuildError, build.run)
+
+
 class FileIO(six.StringIO):
     if six.PY2:
         def __exit__(self, *args, **kwargs):
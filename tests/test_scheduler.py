@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from invoke.runner import Result
+
+from frigg_runner.scheduler import Scheduler
+from frigg_runner.tasks import parse_tasks
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tasks = parse_tasks([
+            {'name': 'install', 'command': 'install'},
+            {'name': 'lint', 'command': 'lint', 'depends_on': 'install'},
+            {'name': 'test', 'command': 'test', 'depends_on': 'install'},
+            {'name': 'package', 'command': 'package', 'depends_on': ['lint', 'test']},
+        ])
+
+    def test_run_in_dependency_order(self):
+        executed = []
+
+        def execute(task):
+            executed.append(task.name)
+            return Result('', '', 0, False)
+
+        results = list(Scheduler(self.tasks, execute).run())
+        self.assertEqual(executed, ['install', 'lint', 'test', 'package'])
+        self.assertEqual([task.name for task, result in results], executed)
+
+    def test_skip_descendants_of_failed_task(self):
+        def execute(task):
+            return Result('', '', 1 if task.name == 'test' else 0, False)
+
+        results = dict((task.name, result) for task, result in
+                       Scheduler(self.tasks, execute).run())
+        self.assertTrue(results['lint'].ok)
+        self.assertTrue(results['test'].failed)
+        self.assertIsNone(results['package'])
+
+    def test_run_concurrently(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max_running': 0}
+
+        def execute(task):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.1)
+            with lock:
+                state['running'] -= 1
+            return Result('', '', 0, False)
+
+        results = list(Scheduler(self.tasks, execute, jobs=4).run())
+        self.assertEqual(state['max_running'], 2)
+        self.assertEqual(results[0][0].name, 'install')
+        self.assertEqual(results[-1][0].name, 'package')
+
+    def test_execute_error(self):
+        def execute(task):
+            raise ValueError(task.name)
+
+        self.assertRaises(ValueError, list, Scheduler(self.tasks, execute, jobs=2).run())
+
+    def test_priorities(self):
+        scheduler = Scheduler(self.tasks, None, durations={'install': 10, 'lint': 1, 'test': 5})
+        priorities = scheduler.priorities()
+        self.assertEqual(priorities['package'], 16 / 3.0)
+        self.assertEqual(priorities['test'], 5 + 16 / 3.0)
+        self.assertEqual(priorities['install'], 10 + 5 + 16 / 3.0)
+
+    def test_run_longest_first(self):
+        tasks = parse_tasks(['short', 'unknown', 'long'])
+        executed = []
+
+        def execute(task):
+            executed.append(task.name)
+            return Result('', '', 0, False)
+
+        list(Scheduler(tasks, execute, jobs=2, durations={'short': 1, 'long': 100}).run())
+        self.assertEqual(executed[0], 'long')
+        self.assertEqual(sorted(executed[1:]), ['short', 'unknown'])
+
+        executed[:] = []
+        list(Scheduler(tasks, execute, jobs=1, durations={'short': 1, 'long': 100}).run())
+        self.assertEqual(executed, ['short', 'unknown', 'long'])
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from invoke.runner import Result
+
+from frigg_runner.snapshot import SetupSnapshot
+from frigg_runner.tasks import Task
+
+
+class SetupSnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot = SetupSnapshot(self.directory, ['venv'], ['requirements.txt'])
+        self.tasks = [Task('virtualenv venv'), Task('venv/bin/pip install -r requirements.txt')]
+        self.write('requirements.txt', 'click==4.1')
+        self.write('venv/bin/python', 'python')
+        os.symlink('python', os.path.join(self.directory, 'venv/bin/python3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        path = os.path.join(self.directory, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as file:
+            file.write(content)
+
+    def read(self, path):
+        with open(os.path.join(self.directory, path), 'r') as file:
+            return file.read()
+
+    def task_results(self):
+        task_results = []
+        for task in self.tasks:
+            task_result = Result('', '', 0, False)
+            task_result.task = task.name
+            task_result.command = task.command
+            task_result.time = 2.5
+            task_results.append(task_result)
+        return task_results
+
+    def test_parse(self):
+        snapshot = SetupSnapshot.parse({'paths': 'venv'}, self.directory)
+        self.assertEqual(snapshot.paths, ['venv'])
+        self.assertEqual(snapshot.lockfiles, [])
+
+    def test_parse_invalid(self):
+        self.assertRaises(TypeError, SetupSnapshot.parse, ['venv'], self.directory)
+        self.assertRaises(TypeError, SetupSnapshot.parse, {'lockfiles': ['setup.py']},
+                          self.directory)
+        self.assertRaises(TypeError, SetupSnapshot.parse, {'paths': ['../venv']}, self.directory)
+        self.assertRaises(TypeError, SetupSnapshot.parse, {'paths': ['/venv']}, self.directory)
+
+    def test_fingerprint(self):
+        fingerprint = self.snapshot.fingerprint(self.tasks)
+        self.assertEqual(fingerprint, self.snapshot.fingerprint(self.tasks))
+        self.assertNotEqual(fingerprint, self.snapshot.fingerprint(self.tasks[:1]))
+        self.assertNotEqual(fingerprint, self.snapshot.fingerprint(self.tasks, env={'A': '1'}))
+
+        self.write('requirements.txt', 'click==5.0')
+        self.assertNotEqual(fingerprint, self.snapshot.fingerprint(self.tasks))
+
+    def test_fingerprint_ignores_dependencies(self):
+        """
+        Test that lockfiles installed by the setup tasks do not change the fingerprint
+        """
+        snapshot = SetupSnapshot(self.directory, ['venv'], ['**/requirements.txt'])
+        fingerprint = snapshot.fingerprint(self.tasks)
+        self.write('venv/lib/package/requirements.txt', 'six')
+        self.write('node_modules/package/requirements.txt', 'six')
+        self.assertEqual(fingerprint, snapshot.fingerprint(self.tasks))
+
+    def test_restore_without_snapshot(self):
+        self.assertIsNone(self.snapshot.restore('missing', self.directory))
+        self.assertEqual(self.read('venv/bin/python'), 'python')
+
+    def test_save_and_restore(self):
+        fingerprint = self.snapshot.fingerprint(self.tasks)
+        self.snapshot.save(fingerprint, self.directory, self.task_results())
+
+        shutil.rmtree(os.path.join(self.directory, 'venv'))
+        self.write('venv/bin/stale', 'stale')
+        tasks = self.snapshot.restore(fingerprint, self.directory)
+
+        self.assertEqual([task['name'] for task in tasks], [task.name for task in self.tasks])
+        self.assertEqual(tasks[0]['time'], 2.5)
+        self.assertEqual(self.read('venv/bin/python'), 'python')
+        self.assertEqual(os.readlink(os.path.join(self.directory, 'venv/bin/python3')), 'python')
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'venv/bin/stale')))
+
+    def test_detach(self):
+        fingerprint = self.snapshot.fingerprint(self.tasks)
+        self.snapshot.save(fingerprint, self.directory, self.task_results())
+        self.snapshot.restore(fingerprint, self.directory)
+
+        self.snapshot.detach(self.directory)
+        self.write('venv/bin/python', 'changed')
+        self.snapshot.restore(fingerprint, self.directory)
+        self.assertEqual(self.read('venv/bin/python'), 'python')
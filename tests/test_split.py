@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from invoke.runner import Result
+
+from frigg_runner.output import OutputSpool
+from frigg_runner.process import ResourceUsage
+from frigg_runner.split import (Split, bucket_command, discover_tests, find_test_runner,
+                                merge_results, parse_split, partition)
+
+
+class SplitTestCase(unittest.TestCase):
+
+    def test_find_test_runner(self):
+        self.assertEqual(find_test_runner('py.test -x'), 'py.test')
+        self.assertEqual(find_test_runner('python -m pytest -q'), 'pytest')
+        self.assertEqual(find_test_runner('.venv/bin/nosetests'), 'nosetests')
+        self.assertIsNone(find_test_runner('tox'))
+        self.assertIsNone(find_test_runner('python -m unittest'))
+        self.assertIsNone(find_test_runner(''))
+
+    def test_parse_split(self):
+        self.assertIsNone(parse_split(None, 'py.test'))
+        self.assertEqual(parse_split(4, 'py.test'), Split(4, ['*'], 'py.test'))
+        self.assertEqual(parse_split({'count': 2, 'files': 'tests/*'}, 'python -m pytest'),
+                         Split(2, ['tests/*'], 'pytest'))
+
+    def test_parse_split_invalid(self):
+        for value in (0, -1, 1.5, 'four', True, {'files': 'tests/*'}):
+            self.assertRaises(TypeError, parse_split, value, 'py.test')
+        self.assertRaises(TypeError, parse_split, 2, 'tox')
+        self.assertRaises(TypeError, parse_split, 2, 'py.test && flake8')
+
+    def test_partition(self):
+        files = ['a', 'b', 'c', 'd']
+        buckets = partition(files, 2, {'a': 10, 'b': 1, 'c': 8, 'd': 2})
+        self.assertEqual(buckets, [['a', 'b'], ['c', 'd']])
+
+    def test_partition_unknown_durations(self):
+        self.assertEqual(partition(['a', 'b', 'c'], 2), [['a', 'c'], ['b']])
+        # Unknown durations count as the average of the known ones
+        self.assertEqual(partition(['a', 'b', 'c'], 2, {'a': 4, 'b': None, 'c': 2}),
+                         [['a'], ['b', 'c']])
+
+    def test_partition_more_buckets_than_files(self):
+        self.assertEqual(partition(['a', 'b'], 4), [['a'], ['b']])
+        self.assertEqual(partition([], 4), [])
+
+    def test_bucket_command(self):
+        self.assertEqual(bucket_command('py.test -x', ['tests/test_a.py', 'tests/my test.py']),
+                         "py.test -x tests/test_a.py 'tests/my test.py'")
+
+    def test_merge_results(self):
+        first = Result('1 passed', '', 0, False)
+        first.resources = ResourceUsage(1.0, 0.5, 100, 1, 2)
+        second = Result('1 failed', '', 1, False)
+        second.resources = ResourceUsage(2.0, 0.5, 200, 3, 4)
+        second.timed_out = True
+
+        spool = OutputSpool()
+        result = merge_results([['a', 'b'], ['c']], [first, second], spool)
+        self.assertEqual(result.exited, 1)
+        self.assertEqual(result.stdout, '# Bucket 1/2: 2 test files, exit code 0\n1 passed\n'
+                                        '# Bucket 2/2: 1 test files, exit code 1\n1 failed')
+        self.assertIs(result.output, spool)
+        self.assertEqual(result.resources, ResourceUsage(3.0, 1.0, 200, 4, 6))
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.inactive)
+        spool.discard()
+
+
+class DiscoverTestsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for path in ('tests/test_a.py', 'tests/b_test.py', 'tests/helpers.py', 'test_c.py',
+                     '.tox/py27/test_d.py', 'docs/test_e.txt'):
+            path = os.path.join(self.directory, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_discover_tests(self):
+        self.assertEqual(discover_tests(self.directory, Split(2, ['*'], 'py.test')),
+                         ['test_c.py', 'tests/b_test.py', 'tests/test_a.py'])
+
+    def test_discover_tests_files(self):
+        self.assertEqual(discover_tests(self.directory, Split(2, ['tests/*'], 'py.test')),
+                         ['tests/b_test.py', 'tests/test_a.py'])
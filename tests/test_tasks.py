@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from frigg_runner.tasks import (Task, affected_tasks, dependencies, dependents, parse_tasks,
+                                select_tasks, shard_tasks)
+
+
+class TaskTestCase(unittest.TestCase):
+
+    def test_parse_command(self):
+        task = Task.parse('tox')
+        self.assertEqual(task.command, 'tox')
+        self.assertEqual(task.name, 'tox')
+        self.assertEqual(task.depends_on, [])
+
+    def test_parse_mapping(self):
+        task = Task.parse({'name': 'lint', 'command': 'flake8', 'depends_on': 'install'})
+        self.assertEqual(task.command, 'flake8')
+        self.assertEqual(task.name, 'lint')
+        self.assertEqual(task.depends_on, ['install'])
+
+    def test_parse_mapping_without_command(self):
+        self.assertRaises(TypeError, Task.parse, {'name': 'lint'})
+
+    def test_parse_timeouts(self):
+        task = Task.parse({'command': 'tox', 'timeout': 1800, 'inactivity_timeout': 2.5})
+        self.assertEqual(task.timeout, 1800)
+        self.assertEqual(task.inactivity_timeout, 2.5)
+        self.assertIsNone(Task.parse('tox').timeout)
+
+    def test_parse_retries(self):
+        task = Task.parse({'command': 'tox', 'retries': 2, 'retry_on_exit_codes': 1})
+        self.assertEqual(task.retries, 2)
+        self.assertEqual(task.retry_on_exit_codes, [1])
+        self.assertEqual(Task.parse('tox').retries, 0)
+
+    def test_parse_invalid_retries(self):
+        for retries in (-1, 1.5, 'twice', True):
+            self.assertRaises(TypeError, Task.parse, {'command': 'tox', 'retries': retries})
+        self.assertRaises(TypeError, Task.parse, {'command': 'tox', 'retry_on_exit_codes': 'a'})
+
+    def test_parse_split(self):
+        task = Task.parse({'command': 'py.test', 'split': {'count': 4, 'files': 'tests/*'}})
+        self.assertEqual(task.split.count, 4)
+        self.assertEqual(task.split.files, ['tests/*'])
+        self.assertIsNone(Task.parse('py.test').split)
+        self.assertRaises(TypeError, Task.parse, {'command': 'tox', 'split': 4})
+
+    def test_parse_invalid_timeout(self):
+        for timeout in (0, -1, '10m', True):
+            self.assertRaises(TypeError, Task.parse, {'command': 'tox', 'timeout': timeout})
+
+    def test_parse_tasks(self):
+        tasks = parse_tasks([
+            {'name': 'install', 'command': 'pip install -e .'},
+            {'name': 'lint', 'command': 'flake8', 'depends_on': ['install']},
+            'tox',
+        ])
+        self.assertEqual([task.name for task in tasks], ['install', 'lint', 'tox'])
+
+    def test_parse_tasks_duplicate_name(self):
+        self.assertRaises(TypeError, parse_tasks, [
+            {'name': 'test', 'command': 'tox'},
+            {'name': 'test', 'command': 'py.test'},
+        ])
+
+    def test_parse_tasks_duplicate_command(self):
+        tasks = parse_tasks(['tox', {'name': 'lint', 'command': 'tox -e flake8'}, 'tox',
+                             {'command': 'tox'}, {'name': 'tox #2', 'command': 'tox -e py27'}])
+        self.assertEqual([task.name for task in tasks],
+                         ['tox', 'lint', 'tox #3', 'tox #4', 'tox #2'])
+        self.assertEqual([task.command for task in tasks[2:4]], ['tox', 'tox'])
+
+    def test_parse_tasks_unknown_dependency(self):
+        self.assertRaises(TypeError, parse_tasks, [
+            {'name': 'lint', 'command': 'flake8', 'depends_on': ['install']},
+        ])
+
+    def test_parse_tasks_circular_dependency(self):
+        self.assertRaises(TypeError, parse_tasks, [
+            {'name': 'a', 'command': 'a', 'depends_on': ['c']},
+            {'name': 'b', 'command': 'b', 'depends_on': ['a']},
+            {'name': 'c', 'command': 'c', 'depends_on': ['b']},
+        ])
+
+
+class SelectTasksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tasks = parse_tasks([
+            {'name': 'install', 'command': 'pip install -e .', 'inputs': 'setup.py'},
+            {'name': 'lint', 'command': 'flake8', 'depends_on': 'install', 'inputs': '*.py'},
+            {'name': 'docs', 'command': 'make docs', 'depends_on': 'install',
+             'inputs': 'docs/*'},
+            {'name': 'package', 'command': 'python setup.py sdist', 'depends_on': 'docs',
+             'inputs': 'MANIFEST.in'},
+        ])
+
+    def test_dependents(self):
+        self.assertEqual(dependents(self.tasks, ['docs']), set(['docs', 'package']))
+        self.assertEqual(len(dependents(self.tasks, ['install'])), 4)
+
+    def test_dependencies(self):
+        self.assertEqual(dependencies(self.tasks, ['package']),
+                         set(['install', 'docs', 'package']))
+        self.assertEqual(dependencies(self.tasks, ['install']), set(['install']))
+
+    def test_select_tasks(self):
+        selected = select_tasks(self.tasks, set(['docs', 'package']))
+        self.assertEqual([task.name for task in selected], ['docs', 'package'])
+        self.assertEqual(selected[0].depends_on, [])
+        self.assertEqual(selected[1].depends_on, ['docs'])
+        self.assertEqual(self.tasks[2].depends_on, ['install'])
+
+    def test_affected_tasks(self):
+        affected = affected_tasks(self.tasks, ['docs/index.rst'])
+        self.assertEqual([task.name for task in affected], ['docs', 'package'])
+
+        affected = affected_tasks(self.tasks, ['frigg/runner.py'])
+        self.assertEqual([task.name for task in affected], ['lint'])
+
+        self.assertEqual(affected_tasks(self.tasks, ['README.rst']), [])
+
+    def test_affected_tasks_without_inputs(self):
+        tasks = parse_tasks(['tox', {'command': 'flake8', 'inputs': '*.py'}])
+        affected = affected_tasks(tasks, ['README.rst'])
+        self.assertEqual([task.name for task in affected], ['tox'])
+
+    def test_shard_tasks(self):
+        tasks = parse_tasks(['tox', 'flake8', 'isort', 'docs'])
+        durations = {'tox': 60, 'flake8': 20, 'isort': 30, 'docs': 10}
+        shards = [[task.name for task in shard_tasks(tasks, index, 2, durations)]
+                  for index in (1, 2)]
+        self.assertEqual(shards, [['tox'], ['flake8', 'isort', 'docs']])
+
+    def test_shard_tasks_keeps_dependencies_together(self):
+        shards = [[task.name for task in shard_tasks(self.tasks, index, 2)] for index in (1, 2)]
+        self.assertEqual(shards, [['install', 'lint', 'docs', 'package'], []])
+
+    def test_shard_tasks_without_durations(self):
+        tasks = parse_tasks(['a', 'b', 'c', 'd', 'e'])
+        shards = [[task.name for task in shard_tasks(tasks, index, 3, {'a': None})]
+                  for index in (1, 2, 3)]
+        self.assertEqual(shards, [['a', 'd'], ['b', 'e'], ['c']])
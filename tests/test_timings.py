@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from frigg_runner.timings import HISTORY_SIZE, TimingStore
+
+
+class TimingStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = TimingStore(self.directory)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_expected_without_history(self):
+        self.assertIsNone(self.store.expected('tox'))
+
+    def test_expected(self):
+        for duration in [3, 1, 2]:
+            self.store.record('tox', 'tox', duration, True)
+        self.store.record('tox', 'tox', 100, False)
+        self.store.record('flake8', 'flake8', 50, True)
+        self.assertEqual(self.store.expected('tox'), 2)
+
+        self.store.record('tox', 'tox', 4, True)
+        self.assertEqual(self.store.expected('tox'), 2.5)
+
+    def test_expected_uses_recent_runs(self):
+        self.store.record('tox', 'tox', 1000, True)
+        for _ in range(HISTORY_SIZE):
+            self.store.record('tox', 'tox', 1, True)
+        self.assertEqual(self.store.expected('tox'), 1)
+
+    def test_persisted(self):
+        self.store.record('tox', 'tox', 3, True)
+        self.store.close()
+        self.assertEqual(TimingStore(self.directory).expected('tox'), 3)
+
+    def test_flake_rate(self):
+        self.assertIsNone(self.store.flake_rate('tox'))
+        self.store.record('tox', 'tox', 1, True)
+        self.store.record('tox', 'tox', 1, False, attempt=1)
+        self.store.record('tox', 'tox', 1, True, attempt=2)
+        self.store.record('tox', 'tox', 1, True)
+        self.store.record('tox', 'tox', 1, True)
+        self.assertEqual(self.store.flake_rate('tox'), 0.25)
+
+    def test_adds_attempt_column(self):
+        os.makedirs(os.path.dirname(self.store.path))
+        connection = sqlite3.connect(self.store.path)
+        connection.execute('CREATE TABLE durations (task TEXT NOT NULL, command TEXT NOT NULL, '
+                           'duration REAL NOT NULL, success INTEGER NOT NULL, '
+                           'created REAL NOT NULL)')
+        connection.execute("INSERT INTO durations VALUES ('tox', 'tox', 3, 1, 0)")
+        connection.commit()
+        connection.close()
+
+        self.store.record('tox', 'tox', 5, True, attempt=2)
+        self.assertEqual(self.store.expected('tox'), 4)
+        self.assertEqual(self.store.flake_rate('tox'), 0.5)
+
+    def test_unusable_directory(self):
+        store = TimingStore('/dev/null')
+        self.assertIsNone(store.connect())
+        store.record('tox', 'tox', 3, True)
+        self.assertIsNone(store.expected('tox'))
@@ -1,11 +1,17 @@
 # -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
 import time
 import unittest
 
 import mock
 from invoke.runner import Result
 
-from frigg_runner.utils import exit, exit_build, newline, print_task, put_task_result, timeit
+from frigg_runner.process import ResourceUsage
+from frigg_runner.utils import (exit, exit_build, find_files, is_slower, matches, newline,
+                                print_task, put_flaky_task, put_skipped_task, put_task_resources,
+                                put_task_result, timeit)
 
 
 class UtilsTestCase(unittest.TestCase):
@@ -47,6 +53,78 @@ class UtilsTestCase(unittest.TestCase):
                                                                round(result.time, ndigits=2),
                                                                's'), fg=color)
 
+    @mock.patch('click.secho')
+    def test_put_cached_task_result(self, mock_secho):
+        result = Result(None, None, None, None)
+        result.time = 0
+        result.cached_time = 12.345
+        result.task = 'tox'
+
+        put_task_result(result, 'green', setup=True)
+        mock_secho.assert_called_once_with('  # tox (0s) (cached, 12.35s) (setup task)',
+                                           fg='green')
+
+    @mock.patch('click.secho')
+    def test_put_timed_out_task_result(self, mock_secho):
+        result = Result(None, None, -15, None)
+        result.time = 60.2
+        result.task = 'tox'
+        result.timeout = 60
+        result.timed_out = True
+
+        put_task_result(result, 'red')
+        mock_secho.assert_called_once_with('  # tox (60.2s) (timed out after 60s)', fg='red')
+
+    @mock.patch('click.secho')
+    def test_put_flaky_task(self, mock_secho):
+        result = Result(None, None, 0, None)
+        result.task = 'tox'
+        result.attempts = [{'time': 1.234, 'exit_code': 1}, {'time': 2, 'exit_code': 0}]
+
+        put_flaky_task(result, 0.25)
+        mock_secho.assert_called_once_with('  # tox passed on attempt 2 (1.23s, 2s), flake rate '
+                                           '25% in recent builds', fg='yellow')
+
+        mock_secho.reset_mock()
+        put_flaky_task(result, None)
+        mock_secho.assert_called_once_with('  # tox passed on attempt 2 (1.23s, 2s)',
+                                           fg='yellow')
+
+    @mock.patch('click.echo')
+    def test_put_task_resources(self, mock_echo):
+        result = Result(None, None, None, None)
+        result.time = 2
+        result.task = 'tox'
+        result.resources = ResourceUsage(1.234, 0.5, 20480, 8, 16)
+
+        put_task_resources(result)
+        mock_echo.assert_called_once_with('  # tox: 87% cpu (1.23s user, 0.5s sys), 20.0MB peak '
+                                          'rss, 8 blocks in, 16 blocks out')
+
+    @mock.patch('click.secho')
+    def test_put_task_result_expected_time(self, mock_secho):
+        result = Result(None, None, None, None)
+        result.time = 30
+        result.expected_time = 10.123
+        result.task = 'tox'
+
+        put_task_result(result, 'green')
+        mock_secho.assert_called_once_with('  # tox (30s) (expected 10.12s) (slower than usual)',
+                                           fg='green')
+
+    def test_is_slower(self):
+        self.assertTrue(is_slower(20, 10))
+        self.assertFalse(is_slower(12, 10))
+        self.assertFalse(is_slower(0.5, 0.1))
+
+    @mock.patch('click.secho')
+    def test_put_skipped_task(self, mock_secho):
+        result = Result(None, None, None, None)
+        result.task = 'tox'
+
+        put_skipped_task(result, setup=True)
+        mock_secho.assert_called_once_with('  # tox (skipped) (setup task)', fg='yellow')
+
     def test_exit_build(self):
         self.assertRaises(SystemExit, exit_build, False)
 
@@ -60,6 +138,25 @@ class UtilsTestCase(unittest.TestCase):
         except SystemExit as sys_exit:
             self.assertEqual(sys_exit.code, 1)
 
+    def test_matches(self):
+        self.assertTrue(matches('setup.py', ['*.py']))
+        self.assertTrue(matches('src/frigg/runner.py', ['src/*.py']))
+        self.assertFalse(matches('docs/index.rst', ['*.py', 'src/*']))
+
+    def test_find_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for path in ['setup.py', 'src/runner.py', 'README.rst', '.git/config.py',
+                         '.frigg-cache/results/key.py']:
+                path = os.path.join(directory, path)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                open(path, 'w').close()
+
+            self.assertEqual(find_files(directory, ['*.py']), ['setup.py', 'src/runner.py'])
+        finally:
+            shutil.rmtree(directory)
+
     def test_task_print(self):
         self.assertEqual(print_task('test'), ':  test')
         self.assertEqual(print_task(None), '')
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+from frigg_runner.watch import Watcher, changed_since
+
+
+class WatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write('setup.py', 'setup()')
+        self.write('.git/HEAD', 'ref: refs/heads/master')
+        self.watcher = Watcher(self.directory, interval=0.01, debounce=0.05)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        path = os.path.join(self.directory, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as file:
+            file.write(content)
+
+    def test_changes(self):
+        self.assertEqual(self.watcher.changes(), set())
+
+        self.write('setup.py', 'setup(name="frigg")')
+        self.write('src/runner.py', 'pass')
+        self.write('.git/HEAD', 'ref: refs/heads/develop')
+        self.assertEqual(self.watcher.changes(), set(['setup.py', 'src/runner.py']))
+        self.assertEqual(self.watcher.changes(), set())
+
+        os.remove(os.path.join(self.directory, 'setup.py'))
+        self.assertEqual(self.watcher.changes(), set(['setup.py']))
+
+    def test_changes_ignored_directories(self):
+        self.write('node_modules/left-pad/index.js', 'module.exports = 1')
+        self.write('.tox/py27/log/py27-0.log', 'ok')
+        self.write('src/runner.py', 'pass')
+        self.assertEqual(self.watcher.changes(), set(['src/runner.py']))
+
+    def test_wait_debounces_changes(self):
+        def write_files():
+            for number in range(3):
+                time.sleep(0.02)
+                self.write('file%s.py' % number, 'pass')
+
+        thread = threading.Thread(target=write_files)
+        thread.start()
+        changed = self.watcher.wait()
+        thread.join()
+        self.assertEqual(changed, set(['file0.py', 'file1.py', 'file2.py']))
+
+
+class ChangedSinceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.git('init', '-q')
+        self.write('setup.py', 'setup()')
+        self.write('src/runner.py', 'pass')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'Initial commit')
+        self.git('branch', 'base')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def git(self, *arguments):
+        subprocess.check_call(['git', '-c', 'user.name=frigg', '-c', 'user.email=frigg@localhost']
+                              + list(arguments), cwd=self.directory)
+
+    def write(self, path, content):
+        path = os.path.join(self.directory, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as file:
+            file.write(content)
+
+    def test_changed_since(self):
+        self.assertEqual(changed_since(self.directory, 'base'), set())
+
+        self.write('src/runner.py', 'pass\n')
+        self.git('commit', '-q', '-a', '-m', 'Change the runner')
+        self.write('setup.py', 'setup(name="frigg")')
+        self.write('docs/index.rst', 'frigg')
+        self.assertEqual(changed_since(self.directory, 'base'),
+                         set(['src/runner.py', 'setup.py', 'docs/index.rst']))
+
+    def test_changed_since_runner_files(self):
+        self.write('.frigg-cache/settings.json', '{}')
+        self.write('logs/tox.log', 'ok')
+        self.write('report.json', '{}')
+        self.write('setup.py', 'setup(name="frigg")')
+        self.assertEqual(changed_since(self.directory, 'base', exclude=['logs/', 'report.json']),
+                         set(['setup.py']))
+
+    def test_changed_since_subdirectory(self):
+        self.write('src/runner.py', 'pass\n')
+        self.write('README.rst', 'frigg')
+        self.assertEqual(changed_since(os.path.join(self.directory, 'src'), 'base'),
+                         set(['runner.py']))
+
+    def test_changed_since_unknown_revision(self):
+        self.assertRaises(ValueError, changed_since, self.directory, 'unknown')